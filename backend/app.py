@@ -5,15 +5,50 @@ from flask_cors import CORS
 from src.models import db, User
 from src.routes.auth import auth_bp
 from src.routes.admin import admin_bp
+from src.utils.breach_utils import init_breached_passwords
+from src.utils.json_utils import init_json_provider
+from src.utils.password_utils import check_password_hash_config
+from src.commands import maintenance_cli
+from src.audit import init_audit_log
+from src.stats import init_login_stats
+from src.credentials import init_credential_directory
+from src.sharding import init_user_shards
+from src.replicas import init_read_replicas
+from src.schema import ensure_schema
+from src.api_keys import init_api_key_usage
+from src.purge import init_user_purger
+from src.events import init_event_hub
+from src.maintenance import init_maintenance
 
 
 def create_app():
     app = Flask(__name__)
+    init_json_provider(app)  # Serializador JSON rápido y fechas ISO-8601 en todas las respuestas
     app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///db.sqlite3'
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
     app.config['SECRET_KEY'] = 'your_secret_key_here'  # Clave para manejar sesiones
+    app.config['BREACHED_PASSWORDS_PATH'] = 'breached_passwords.bin'  # Lista generada con `flask maintenance build-breach-list`
+    # Bases de datos de usuarios (una por shard); vacío = todos los usuarios en db.sqlite3.
+    # Tras cambiar la lista, ejecutar `flask maintenance rebalance-users`.
+    app.config['USER_SHARDS'] = []
+    # Réplicas de lectura por base de datos ('default' o 'users_<n>'), p. ej. {'default': ['sqlite:///replica.sqlite3']}
+    app.config['READ_REPLICAS'] = {}
+    app.config['REPLICA_STICKY_SECONDS'] = 5  # Lecturas al primario tras una escritura propia
+    app.config['USER_PURGE_INTERVAL'] = 60  # Segundos entre purgas de usuarios eliminados
+    app.config['MAINTENANCE_INTERVAL'] = 300  # Segundos entre pasadas de mantenimiento de SQLite (0 = desactivado)
+    app.config['CREDENTIAL_DIRECTORY'] = False  # Credenciales en memoria para /auth/login (~180 B por usuario)
 
+    check_password_hash_config(app)  # Coste de PBKDF2 reducido solo con TESTING
     db.init_app(app)
+    init_user_shards(app)
+    init_read_replicas(app)
+    ensure_schema(app)  # Crea las tablas nuevas en bases de datos existentes antes de consultarlas
+    init_breached_passwords(app)
+    init_audit_log(app)  # Registro de intentos de login escrito en lotes por un hilo de fondo
+    init_api_key_usage(app)  # Último uso de las API keys, escrito en lotes
+    init_user_purger(app)  # Borrado definitivo, en lotes pequeños, de los usuarios eliminados
+    init_event_hub(app)  # Cambios de cuentas enviados al panel de administración por /admin/events
+    init_maintenance(app)  # Checkpoints, ANALYZE y vacuum incremental de SQLite con poco tráfico
 
     
     CORS(app, resources={r"/*": {"origins": "http://localhost:3000"}}, supports_credentials=True)
@@ -31,6 +66,7 @@ def create_app():
     # Registrar blueprints
     app.register_blueprint(auth_bp, url_prefix='/auth')
     app.register_blueprint(admin_bp, url_prefix='/admin')
+    app.cli.add_command(maintenance_cli)
 
 # Crear el usuario administrador único si no existe
     with app.app_context():
@@ -43,6 +79,10 @@ def create_app():
             db.session.commit()
             print("Admin user created successfully!")
 
+    # Estadísticas de actividad de login, reconstruidas desde la base de datos
+    init_login_stats(app)
+    init_credential_directory(app)  # Solo si CREDENTIAL_DIRECTORY está activado
+
     return app
 
 if __name__ == '__main__':
@@ -0,0 +1,84 @@
+"""
+Memory benchmark: bytes per user held by the login credential directory.
+
+Compares CredentialDirectory's array-backed layout with a dict of `__slots__`
+records and with loaded ORM User instances (measured on a sample and
+extrapolated). Run from the backend directory:
+
+    python -m benchmarks.bench_credentials [--users 1000000] [--orm-sample 20000]
+"""
+import argparse
+import os
+import tracemalloc
+from flask import Flask
+from sqlalchemy import insert
+from src.models import db, User
+from src.credentials import CredentialDirectory
+
+
+class SlotsCredential:
+    __slots__ = ('id', 'password_hash', 'salt', 'is_admin', 'flags')
+
+    def __init__(self, id, password_hash, salt, is_admin, flags):
+        self.id = id
+        self.password_hash = password_hash
+        self.salt = salt
+        self.is_admin = is_admin
+        self.flags = flags
+
+
+def build_rows(count):
+    return [(i, f'user{i:07d}', os.urandom(32).hex(), os.urandom(16).hex(), False) for i in range(1, count + 1)]
+
+
+def measure(build):
+    tracemalloc.start()
+    start = tracemalloc.take_snapshot()
+    kept = build()
+    used = sum(stat.size_diff for stat in tracemalloc.take_snapshot().compare_to(start, 'filename'))
+    tracemalloc.stop()
+    del kept
+    return used
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--users', type=int, default=1_000_000)
+    parser.add_argument('--orm-sample', type=int, default=20_000)
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+    db.init_app(app)
+    rows = build_rows(args.users)
+    # Usernames are also held by the rows themselves; only the containers' copies are counted.
+
+    def directory():
+        credentials = CredentialDirectory(app)
+        for user_id, username, password_hash, salt, is_admin in rows:
+            credentials.put(user_id, ''.join(username), password_hash, salt, is_admin)
+        return credentials
+
+    def slots():
+        return {
+            ''.join(username): SlotsCredential(user_id, bytes.fromhex(password_hash), salt.encode(), is_admin, 0)
+            for user_id, username, password_hash, salt, is_admin in rows
+        }
+
+    def orm():
+        db.create_all()
+        db.session.execute(insert(User.__table__), [
+            {'id': user_id, 'username': username, 'password_hash': password_hash, 'salt': salt, 'is_admin': is_admin}
+            for user_id, username, password_hash, salt, is_admin in rows[:args.orm_sample]
+        ])
+        return User.query.all()
+
+    print(f'Memory per user with {args.users} users:')
+    print(f'  {"arrays":<14} {measure(directory) / args.users:7.0f} B')
+    print(f'  {"__slots__":<14} {measure(slots) / args.users:7.0f} B')
+    with app.app_context():
+        print(f'  {"ORM instances":<14} {measure(orm) / args.orm_sample:7.0f} B  (sample of {args.orm_sample})')
+
+
+if __name__ == '__main__':
+    main()
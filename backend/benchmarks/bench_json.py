@@ -0,0 +1,47 @@
+"""
+Microbenchmark: serialization of a large /admin/users payload.
+
+Compares Flask's default JSON provider with FastJSONProvider (orjson when
+installed, stdlib fallback otherwise). Run from the backend directory:
+
+    python -m benchmarks.bench_json [--users 100000] [--repeat 5]
+"""
+import argparse
+import timeit
+from datetime import datetime, timedelta
+from unittest.mock import patch
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+from src.utils import json_utils
+from src.utils.json_utils import FastJSONProvider
+
+
+def build_payload(count):
+    start = datetime(2024, 1, 1)
+    return [
+        {'id': i, 'username': f'user{i:07d}', 'last_login': start + timedelta(seconds=i * 37) if i % 5 else None}
+        for i in range(1, count + 1)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--users', type=int, default=100_000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    payload = build_payload(args.users)
+
+    def best_of(provider):
+        return min(timeit.repeat(lambda: provider.response(payload), number=1, repeat=args.repeat)) * 1000
+
+    print(f'Serializing {args.users} users, best of {args.repeat}:')
+    print(f'  {"flask default":<14} {best_of(DefaultJSONProvider(app)):9.1f} ms')
+    if json_utils.orjson is not None:
+        print(f'  {"fast (orjson)":<14} {best_of(FastJSONProvider(app)):9.1f} ms')
+    with patch.object(json_utils, 'orjson', None):
+        print(f'  {"fast (stdlib)":<14} {best_of(FastJSONProvider(app)):9.1f} ms')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""
+Gunicorn configuration for the backend. Start the server from this directory with:
+
+    gunicorn -c gunicorn.conf.py
+
+The application is loaded once in the master (preload_app) and forked into one worker
+per CPU core, so that the startup work (login statistics, credential directory) is
+done once and shared copy-on-write. Before each fork the master flushes and stops its
+background writers and empties its connection pools; each worker then opens its own
+pools and starts its own writers (see src/lifecycle.py).
+
+The state the workers must agree on is kept in memory the master maps before forking
+(src/utils/shared_memory.py): the login statistics of /admin/stats, the events streamed
+by /admin/events, whichever worker handled the change, and the read-your-writes pins of
+the read replica router. Every worker, including the ones replacing recycled workers,
+sees the same state. This needs preload_app: with --no-preload each worker would have
+its own copy.
+
+On SIGTERM the workers stop accepting connections, finish their requests within
+GRACEFUL_TIMEOUT seconds and flush their buffered writes (audit log, API key usage)
+before exiting. Workers are also recycled, one at a time, after MAX_REQUESTS requests
+(plus a random jitter) to bound memory growth.
+
+Each open /admin/events stream holds a worker thread, so a worker accepts at most
+EVENT_STREAMS_PER_WORKER of them (a quarter of its threads by default).
+
+Every setting can be overridden with the environment variable shown.
+"""
+import multiprocessing
+import os
+
+wsgi_app = 'wsgi:app'
+bind = os.environ.get('BIND', '0.0.0.0:5000')
+preload_app = True
+
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+# Hilos por worker: las conexiones a /admin/events ocupan un hilo mientras están abiertas
+# (con workers 'sync' el timeout cortaría esos streams). Al reciclarse, un worker gthread
+# puede cerrar conexiones ya aceptadas sin atenderlas: conviene un proxy delante que reintente.
+worker_class = os.environ.get('WORKER_CLASS', 'gthread')
+threads = int(os.environ.get('WORKER_THREADS', 8))
+# Streams de /admin/events por worker: como mucho un cuarto de los hilos, el resto queda
+# libre para logins y demás peticiones. Los clientes de más reciben 503 y reintentan.
+event_streams_per_worker = int(os.environ.get('EVENT_STREAMS_PER_WORKER', threads // 4))
+
+max_requests = int(os.environ.get('MAX_REQUESTS', 10_000))
+max_requests_jitter = int(os.environ.get('MAX_REQUESTS_JITTER', 1_000))  # Evita reciclar todos a la vez
+timeout = int(os.environ.get('WORKER_TIMEOUT', 30))
+graceful_timeout = int(os.environ.get('GRACEFUL_TIMEOUT', 30))
+keepalive = 5
+
+accesslog = os.environ.get('ACCESS_LOG', '-') or None  # ACCESS_LOG= lo desactiva
+
+
+def pre_fork(server, worker):
+    from src.lifecycle import prepare_fork
+    prepare_fork(server.app.wsgi())
+
+
+def post_fork(server, worker):
+    from src.events import limit_subscribers
+    from src.lifecycle import reinit_after_fork
+    app = server.app.wsgi()
+    reinit_after_fork(app)
+    limit_subscribers(app, event_streams_per_worker)
+
+
+def worker_exit(server, worker):
+    from src.lifecycle import drain
+    drain(server.app.wsgi())
@@ -0,0 +1,125 @@
+import threading
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import bindparam, update
+from src.models import db, User, ApiKey
+from src.utils.api_key_utils import ApiKeyUtils
+from src.utils.flush_utils import PeriodicFlusher
+
+SCOPES = ('read', 'write', 'admin')
+
+
+class ApiKeyUsage(PeriodicFlusher):
+    """
+    Batches API key `last_used_at` updates off the request path.
+
+    Authenticated requests only record the time in memory; the background thread writes
+    the latest time of every key used since the previous flush in one transaction.
+
+    Methods:
+    --------
+    record(api_key_id):
+        Notes that a key was just used.
+
+    flush():
+        Writes the pending last-used times to the database.
+    """
+
+    thread_name = 'api-key-usage-writer'
+
+    def __init__(self, app, flush_interval=30.0):
+        super().__init__(app, flush_interval)
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def record(self, api_key_id):
+        with self._lock:
+            self._pending[api_key_id] = datetime.now()
+
+    def flush(self):
+        """
+        Writes the pending last-used times to the database.
+
+        Returns:
+        --------
+        int:
+            The number of keys updated.
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        table = ApiKey.__table__
+        with self.app.app_context():
+            try:
+                db.session.execute(
+                    update(table).where(table.c.id == bindparam('key_pk')).values(last_used_at=bindparam('used_at')),
+                    [{'key_pk': key_pk, 'used_at': used_at} for key_pk, used_at in pending.items()],
+                )
+                db.session.commit()
+            finally:
+                db.session.remove()
+        return len(pending)
+
+
+def init_api_key_usage(app):
+    """
+    Starts the batched last-used writer for API keys.
+
+    Parameters:
+    -----------
+    app : Flask
+        The application to attach the writer to.
+    """
+    usage = ApiKeyUsage(app, flush_interval=app.config.get('API_KEY_USAGE_FLUSH_INTERVAL', 30.0))
+    app.extensions['api_key_usage'] = usage
+    usage.start()
+    return usage
+
+
+def authenticate_api_key(key, scope, admin=False):
+    """
+    Resolves an API key presented as a bearer token to the user it authenticates as.
+
+    The key row is found by its indexed public ID and the secret is checked with a single
+    SHA-256 digest, so verification costs the same for every request.
+
+    Parameters:
+    -----------
+    key : str
+        The full API key.
+    scope : str
+        The scope the route requires ('read' or 'write').
+    admin : bool, optional
+        Whether the route also requires the 'admin' scope and an admin user.
+
+    Returns:
+    --------
+    tuple:
+        (user, None) on success, or (None, message) describing why the key was rejected.
+    """
+    parsed = ApiKeyUtils.parse(key)
+    if parsed is None:
+        return None, 'Invalid API key'
+    key_id, secret = parsed
+
+    api_key = ApiKey.query.filter_by(key_id=key_id).first()
+    if api_key is None or not ApiKeyUtils.check_secret(api_key.key_hash, secret):
+        return None, 'Invalid API key'
+    if api_key.revoked_at is not None:
+        return None, 'API key has been revoked'
+    if api_key.expires_at is not None and api_key.expires_at <= datetime.now():
+        return None, 'API key has expired'
+    if not api_key.has_scope(scope) or (admin and not api_key.has_scope('admin')):
+        return None, 'API key does not grant the required scope'
+
+    user = User.get_active(api_key.user_id)
+    if user is None:
+        return None, 'User not found'
+    if admin and not user.is_admin:
+        return None, 'Forbidden: You are not authorized to access this resource'
+
+    usage = current_app.extensions.get('api_key_usage')
+    if usage is not None:
+        usage.record(api_key.id)
+    return user, None
@@ -0,0 +1,165 @@
+import collections
+import threading
+from datetime import datetime
+from flask import current_app, request
+from sqlalchemy import insert
+from src.models import db, AuthEvent
+from src.utils.flush_utils import PeriodicFlusher
+
+
+class AuditLog(PeriodicFlusher):
+    """
+    In-memory ring buffer of login events drained to the `auth_events` table by a
+    background thread.
+
+    Request handlers only append to the buffer, so recording an event never adds a
+    commit to the request. The writer thread inserts whatever has accumulated in a
+    single transaction every `flush_interval` seconds, or sooner once `batch_size`
+    events are waiting. A crash loses at most the events recorded since the last
+    flush; if the writer falls behind by more than `capacity` events the oldest are
+    discarded and counted in `dropped`.
+
+    Methods:
+    --------
+    record(user_id, username, outcome, ip=None):
+        Appends an event to the buffer.
+
+    flush():
+        Writes all buffered events to the database in one transaction.
+
+    start() / stop():
+        Start the background writer thread / stop it after a final flush.
+    """
+
+    thread_name = 'audit-log-writer'
+
+    def __init__(self, app, capacity=10_000, batch_size=500, flush_interval=1.0):
+        """
+        Initializes the audit log for an application.
+
+        Parameters:
+        -----------
+        app : Flask
+            The application whose database receives the events.
+        capacity : int, optional
+            Maximum number of buffered events, default is 10,000.
+        batch_size : int, optional
+            Number of buffered events that triggers an early flush, default is 500.
+        flush_interval : float, optional
+            Maximum seconds between flushes, default is 1.0.
+        """
+        super().__init__(app, flush_interval)
+        self.capacity = capacity
+        self.batch_size = batch_size
+        self.dropped = 0
+        self._buffer = collections.deque(maxlen=capacity)
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._buffer)
+
+    def record(self, user_id, username, outcome, ip=None):
+        """
+        Appends a login event to the buffer.
+
+        Parameters:
+        -----------
+        user_id : int or None
+            ID of the user the attempt resolved to.
+        username : str
+            The submitted username.
+        outcome : str
+            Result of the attempt.
+        ip : str, optional
+            Remote address of the client.
+        """
+        event = {
+            'user_id': user_id,
+            'username': username or '',
+            'outcome': outcome,
+            'ip': ip,
+            'created_at': datetime.now(),
+        }
+        with self._lock:
+            if len(self._buffer) == self.capacity:
+                self.dropped += 1  # deque(maxlen) discards the oldest event.
+            self._buffer.append(event)
+            pending = len(self._buffer)
+        if pending >= self.batch_size:
+            self.wake()
+
+    def flush(self):
+        """
+        Writes every buffered event to the database in a single transaction.
+
+        Returns:
+        --------
+        int:
+            The number of events written.
+        """
+        with self._flush_lock:
+            with self._lock:
+                batch = list(self._buffer)
+                self._buffer.clear()
+            if not batch:
+                return 0
+            with self.app.app_context():
+                try:
+                    db.session.execute(insert(AuthEvent.__table__), batch)
+                    db.session.commit()
+                except Exception:
+                    db.session.rollback()
+                    with self._lock:
+                        # Put back as much of the batch as fits so the next flush retries it.
+                        room = self.capacity - len(self._buffer)
+                        if room > 0:
+                            self._buffer.extendleft(reversed(batch[-room:]))
+                        self.dropped += max(len(batch) - room, 0)
+                    raise
+                finally:
+                    db.session.remove()
+            return len(batch)
+
+
+def init_audit_log(app):
+    """
+    Creates the application's audit log from its configuration and starts the writer.
+
+    Parameters:
+    -----------
+    app : Flask
+        The application to attach the audit log to.
+
+    Returns:
+    --------
+    AuditLog:
+        The started audit log.
+    """
+    audit_log = AuditLog(
+        app,
+        capacity=app.config.get('AUDIT_BUFFER_SIZE', 10_000),
+        batch_size=app.config.get('AUDIT_BATCH_SIZE', 500),
+        flush_interval=app.config.get('AUDIT_FLUSH_INTERVAL', 1.0),
+    )
+    app.extensions['audit_log'] = audit_log
+    audit_log.start()
+    return audit_log
+
+
+def record_auth_event(user_id, username, outcome):
+    """
+    Records a login attempt for the current request, if the audit log is enabled.
+
+    Parameters:
+    -----------
+    user_id : int or None
+        ID of the user the attempt resolved to.
+    username : str
+        The submitted username.
+    outcome : str
+        Result of the attempt.
+    """
+    audit_log = current_app.extensions.get('audit_log')
+    if audit_log is not None:
+        audit_log.record(user_id, username, outcome, request.remote_addr)
@@ -0,0 +1,70 @@
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from src.utils.breach_utils import BreachedPasswordList
+from src.sharding import rebalance_users
+from src.maintenance import sqlite_engines
+from src.schema import upgrade_users_tables
+
+maintenance_cli = AppGroup('maintenance', help='Offline maintenance tools for the backend.')
+
+
+@maintenance_cli.command('build-breach-list')
+@click.argument('source', type=click.Path(exists=True, dir_okay=False))
+@click.argument('dest', type=click.Path(dir_okay=False))
+@click.option('--prefix-width', default=8, show_default=True, help='SHA-1 bytes kept per entry.')
+@click.option('--chunk-size', default=5_000_000, show_default=True, help='Entries sorted in memory at once.')
+def build_breach_list(source, dest, prefix_width, chunk_size):
+    """
+    Builds the breached password list from a plain text dump.
+
+    SOURCE holds one plaintext password or SHA-1 hash (optionally ":count") per line.
+    DEST is the binary file to point BREACHED_PASSWORDS_PATH at.
+    """
+    count = BreachedPasswordList.build(source, dest, prefix_width=prefix_width, chunk_size=chunk_size)
+    click.echo(f'Wrote {count} entries to {dest}')
+
+
+@maintenance_cli.command('rebalance-users')
+@click.option('--source', 'sources', multiple=True, help='URI of a removed shard to drain (repeatable).')
+@click.option('--batch-size', default=1000, show_default=True, help='Users moved per transaction.')
+def rebalance_users_command(sources, batch_size):
+    """
+    Moves users to the shard their username maps to under the current USER_SHARDS.
+    """
+    counts = rebalance_users(current_app._get_current_object(), extra_sources=sources,
+                             batch_size=batch_size, log=click.echo)
+    click.echo(f"Scanned {counts['scanned']} users, moved {counts['moved']}, renumbered {counts['renumbered']}")
+    if counts['conflicts']:
+        click.echo(f"{counts['conflicts']} users were kept where they are: a different user has their username "
+                   "on the target shard (see the messages above)")
+
+
+@maintenance_cli.command('upgrade-users-table')
+def upgrade_users_table():
+    """
+    Adds the soft delete column and its indexes to users tables created before them.
+    The application also does this at startup.
+    """
+    upgraded = upgrade_users_tables()
+    for key in upgraded:
+        click.echo(f'Upgraded users table on {key}')
+    if not upgraded:
+        click.echo('Users tables are up to date')
+
+
+@maintenance_cli.command('enable-incremental-vacuum')
+def enable_incremental_vacuum():
+    """
+    Switches the SQLite databases to incremental auto-vacuum, so that the maintenance
+    scheduler can return free pages to the file system. Rewrites each database with a
+    full VACUUM: run it while the backend is stopped.
+    """
+    for key, engine in sqlite_engines():
+        with engine.connect() as conn:
+            if conn.exec_driver_sql('PRAGMA auto_vacuum').scalar() == 2:
+                click.echo(f'{key} already uses incremental auto-vacuum')
+                continue
+            conn.connection.driver_connection.executescript('PRAGMA auto_vacuum = INCREMENTAL; VACUUM;')
+            pages = conn.exec_driver_sql('PRAGMA page_count').scalar()
+        click.echo(f'Enabled incremental auto-vacuum on {key} ({pages} pages)')
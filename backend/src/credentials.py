@@ -0,0 +1,347 @@
+import threading
+from array import array
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import delete, func, select
+from src.models import db, User, CredentialChange
+from src.utils.flush_utils import PeriodicFlusher
+from src.utils.password_utils import PasswordUtils
+
+DIGEST_SIZE = 32  # PBKDF2-HMAC-SHA256 output.
+SALT_SIZE = 16  # Salts are 16 random bytes, stored as 32 hexadecimal characters.
+
+FLAG_ADMIN = 1
+FLAG_RESET_REQUIRED = 2  # Empty password hash.
+
+CHANGE_LOG_RETENTION = timedelta(hours=1)
+
+
+class CredentialDirectory(PeriodicFlusher):
+    """
+    Compact in-memory copy of every active user's login credentials, so that `/auth/login`
+    can verify a password without reading the users table.
+
+    Records are stored column-wise in flat arrays indexed by a slot number: user IDs in
+    an `array('q')`, digests and salts decoded from hexadecimal in two `bytearray`s, and
+    the admin/reset flags in a third. A dict maps each username to its slot; slots of
+    removed users are reused. With 1M users this takes about 180 bytes per user,
+    against about 290 for one `__slots__` object per user and 1.3 KB for ORM instances
+    (see benchmarks/bench_credentials.py). Users whose hash or salt is not in the
+    standard form are kept as plain tuples in a small overflow dict.
+
+    The directory is warmed with a streaming query at startup. Routes that change
+    credentials in this process update it immediately, and the background thread
+    applies the changes made by other processes every `sync_interval` seconds by
+    reading the credential_changes log (see `CredentialChange`). A worker forked from a
+    parent whose copy is too old for the log to bring it up to date (entries are kept
+    for CHANGE_LOG_RETENTION) reloads the directory instead. A successful
+    verification is still confirmed against the user's row, which the login loads by
+    primary key to record the login, so a stale entry can delay a login by at most one
+    sync interval but never accept an outdated password.
+
+    Methods:
+    --------
+    warm():
+        Loads every active user.
+
+    put(user_id, username, password_hash, salt, is_admin):
+        Adds or replaces a user's record.
+
+    remove(username):
+        Drops a user's record.
+
+    refresh(username, user):
+        Updates a record from the user's row, or removes it if the user is gone.
+
+    authenticate(username, password):
+        Verifies a login attempt.
+
+    flush():
+        Applies the credential changes logged since the last sync.
+
+    after_fork():
+        Starts the sync thread in a forked worker, reloading the directory if needed.
+    """
+
+    thread_name = 'credential-directory-sync'
+
+    def __init__(self, app, sync_interval=1.0):
+        """
+        Initializes an empty directory.
+
+        Parameters:
+        -----------
+        app : Flask
+            The application whose users are loaded.
+        sync_interval : float, optional
+            Seconds between syncs with the change log, default is 1.0.
+        """
+        super().__init__(app, sync_interval)
+        self._slots = {}  # username -> slot
+        self._ids = array('q')
+        self._digests = bytearray()
+        self._salts = bytearray()
+        self._flags = bytearray()
+        self._free = []
+        self._overflow = {}  # username -> (id, digest, salt, flags) for non-standard records
+        self._last_change = 0
+        self._synced_at = datetime.min  # When the log was last read up to _last_change.
+        self._next_prune = datetime.min
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._slots) + len(self._overflow)
+
+    def __contains__(self, username):
+        return username in self._slots or username in self._overflow
+
+    def warm(self):
+        """
+        Loads every active user with a streaming query, replacing any records already held.
+        Lookups keep using the previous records until the new ones are complete.
+        """
+        columns = (User.id, User.username, User.password_hash, User.salt, User.is_admin)
+        loaded = CredentialDirectory(self.app)
+        with self.app.app_context():
+            # Read the log position first: changes made while streaming are applied by the next sync.
+            synced_at = datetime.now()
+            last_change = db.session.scalar(select(func.max(CredentialChange.id))) or 0
+            rows = db.session.execute(
+                select(*columns).where(User.deleted_at.is_(None)).execution_options(yield_per=10_000)
+            )
+            for user_id, username, password_hash, salt, is_admin in rows:
+                loaded.put(user_id, username, password_hash, salt, is_admin)
+            db.session.remove()
+        with self._lock:
+            for name in ('_slots', '_ids', '_digests', '_salts', '_flags', '_free', '_overflow'):
+                setattr(self, name, getattr(loaded, name))
+            self._last_change, self._synced_at = last_change, synced_at
+
+    def put(self, user_id, username, password_hash, salt, is_admin):
+        """
+        Adds or replaces a user's record.
+
+        Parameters:
+        -----------
+        user_id : int
+            The user's ID.
+        username : str
+            The user's username.
+        password_hash : str
+            The hexadecimal password hash, or '' if a reset is required.
+        salt : str
+            The user's hexadecimal salt.
+        is_admin : bool
+            Whether the user is an administrator.
+        """
+        flags = (FLAG_ADMIN if is_admin else 0) | (0 if password_hash else FLAG_RESET_REQUIRED)
+        digest = _unhex(password_hash) if password_hash else bytes(DIGEST_SIZE)
+        raw_salt = _unhex(salt)
+        with self._lock:
+            if digest is None or len(digest) != DIGEST_SIZE or raw_salt is None or raw_salt.hex() != salt:
+                self._discard(username)
+                self._overflow[username] = (user_id, digest or b'', salt.encode('utf-8'), flags)
+                return
+            self._overflow.pop(username, None)
+            slot = self._slots.get(username)
+            if slot is None:
+                slot = self._free.pop() if self._free else self._grow()
+                self._slots[username] = slot
+            self._ids[slot] = user_id
+            self._digests[slot * DIGEST_SIZE:(slot + 1) * DIGEST_SIZE] = digest
+            self._salts[slot * SALT_SIZE:(slot + 1) * SALT_SIZE] = raw_salt
+            self._flags[slot] = flags
+
+    def remove(self, username):
+        """
+        Drops a user's record, if present.
+        """
+        with self._lock:
+            self._discard(username)
+            self._overflow.pop(username, None)
+
+    def refresh(self, username, user):
+        """
+        Updates a record from a user row, or removes it if the user no longer exists,
+        was deleted or was renamed.
+
+        Parameters:
+        -----------
+        username : str
+            The username the record is stored under.
+        user : User or None
+            The user's current row.
+        """
+        if user is None or user.deleted_at is not None or user.username != username:
+            self.remove(username)
+        else:
+            self.put(user.id, user.username, user.password_hash, user.salt, user.is_admin)
+
+    def lookup(self, username):
+        """
+        Returns (id, digest, salt, flags) for a username, or None. `salt` is the UTF-8
+        encoded hexadecimal salt used by PBKDF2.
+        """
+        with self._lock:
+            slot = self._slots.get(username)
+            if slot is None:
+                return self._overflow.get(username)
+            return (
+                self._ids[slot],
+                bytes(self._digests[slot * DIGEST_SIZE:(slot + 1) * DIGEST_SIZE]),
+                self._salts[slot * SALT_SIZE:(slot + 1) * SALT_SIZE].hex().encode('ascii'),
+                self._flags[slot],
+            )
+
+    def authenticate(self, username, password):
+        """
+        Verifies a login attempt. Failed attempts never touch the database.
+
+        Parameters:
+        -----------
+        username : str
+            The submitted username.
+        password : str
+            The submitted password.
+
+        Returns:
+        --------
+        tuple:
+            (user_id, user): the ID the username resolved to (or None), and the user's
+            row if the password is correct (otherwise None).
+        """
+        record = self.lookup(username)
+        if record is None:
+            return None, None
+        user_id, digest, salt, flags = record
+        if not PasswordUtils.check_digest(digest, password, salt):
+            return user_id, None
+
+        user = User.get_active(user_id)
+        if user is not None and user.username == username and _unhex(user.password_hash) == digest:
+            return user.id, user
+        # The record is stale (changed by another process since the last sync): the row wins.
+        self.refresh(username, user)
+        if user is None or user.username != username:
+            return None, None
+        return user.id, (user if user.check_password(password) else None)
+
+    def flush(self):
+        """
+        Applies the credential changes logged since the last sync, and prunes old log entries.
+
+        Returns:
+        --------
+        int:
+            The number of users reloaded.
+        """
+        reloaded = 0
+        synced_at = datetime.now()
+        with self.app.app_context():
+            try:
+                while True:
+                    changes = db.session.execute(
+                        select(CredentialChange.id, CredentialChange.username)
+                        .where(CredentialChange.id > self._last_change)
+                        .order_by(CredentialChange.id).limit(1000)
+                    ).all()
+                    if not changes:
+                        break
+                    usernames = {username for _, username in changes}
+                    users = {user.username: user for user in User.query.filter(User.username.in_(usernames))}
+                    for username in usernames:
+                        self.refresh(username, users.get(username))
+                    self._last_change = changes[-1].id
+                    reloaded += len(usernames)
+                self._synced_at = synced_at
+                self._prune()
+            finally:
+                db.session.remove()
+        return reloaded
+
+    def after_fork(self):
+        """
+        Starts the sync thread in a forked worker. If the parent last read the change log
+        too long ago, entries the worker needs to catch up may have been pruned since
+        (e.g. a worker recycled hours after the server started), so the directory is
+        reloaded from the users table first.
+        """
+        if datetime.now() - self._synced_at >= CHANGE_LOG_RETENTION / 2:
+            self.warm()
+        super().after_fork()
+
+    def _prune(self):
+        now = datetime.now()
+        if now < self._next_prune:
+            return
+        self._next_prune = now + CHANGE_LOG_RETENTION / 10
+        table = CredentialChange.__table__
+        db.session.execute(delete(table).where(table.c.changed_at < now - CHANGE_LOG_RETENTION))
+        db.session.commit()
+
+    def _grow(self):
+        slot = len(self._ids)
+        self._ids.append(0)
+        self._digests.extend(bytes(DIGEST_SIZE))
+        self._salts.extend(bytes(SALT_SIZE))
+        self._flags.append(0)
+        return slot
+
+    def _discard(self, username):
+        slot = self._slots.pop(username, None)
+        if slot is not None:
+            self._ids[slot] = 0
+            self._free.append(slot)
+
+
+def _unhex(value):
+    try:
+        return bytes.fromhex(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def init_credential_directory(app):
+    """
+    Creates, warms and starts the credential directory if CREDENTIAL_DIRECTORY is enabled.
+
+    Parameters:
+    -----------
+    app : Flask
+        The application to attach the directory to.
+
+    Returns:
+    --------
+    CredentialDirectory or None:
+        The directory, or None when disabled.
+    """
+    if not app.config.get('CREDENTIAL_DIRECTORY'):
+        return None
+    directory = CredentialDirectory(app, sync_interval=app.config.get('CREDENTIAL_SYNC_INTERVAL', 1.0))
+    directory.warm()
+    app.extensions['credential_directory'] = directory
+    directory.start()
+    return directory
+
+
+def get_credential_directory():
+    """
+    Returns the current application's credential directory, or None if it is not enabled.
+    """
+    return current_app.extensions.get('credential_directory')
+
+
+def refresh_credentials(username, user):
+    """
+    Updates the credential directory after a route changed a user's credentials.
+
+    Parameters:
+    -----------
+    username : str
+        The username the user had before the change.
+    user : User or None
+        The user's row after the change, or None if it was removed.
+    """
+    directory = current_app.extensions.get('credential_directory')
+    if directory is not None:
+        directory.refresh(username, user)
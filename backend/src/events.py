@@ -0,0 +1,293 @@
+import os
+import queue
+import struct
+import threading
+from flask import current_app
+from src.utils.flush_utils import PeriodicFlusher
+from src.utils.shared_memory import SharedLock, shared_array
+
+RESYNC = 'resync'  # Sent to a subscriber that fell behind, just before its stream is closed.
+FRAME_HEADER = struct.Struct('<qiI')  # Event sequence number, publishing process ID, body length.
+
+
+class Subscription:
+    """
+    One client's bounded queue of pending events.
+
+    Attributes:
+    -----------
+    dropped : bool
+        True once the subscriber fell behind and was removed from the hub.
+    """
+
+    __slots__ = ('_queue', 'dropped')
+
+    def __init__(self, maxsize):
+        self._queue = queue.Queue(maxsize)
+        self.dropped = False
+
+    def get(self, timeout=None):
+        """
+        Returns the next formatted event, or None if none arrived within `timeout` seconds.
+        """
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class EventHub(PeriodicFlusher):
+    """
+    Publish/subscribe hub for account change events, shared by the worker processes.
+
+    Each event is serialized once, as a server-sent event frame, and appended to the
+    bounded queue of every subscriber. Publishing never blocks: a subscriber whose queue
+    is full is dropped from the hub and its stream ends with a `resync` event, telling the
+    client to reload its state and reconnect. A slow client therefore costs the hub one
+    queue, and never holds up the routes that publish.
+
+    Events reach the subscribers of the publishing process at once. They are also written
+    to a ring of `buffer_size` frames in memory shared by every worker process forked from
+    the one that created the hub (see src/utils/shared_memory.py); each process's
+    background thread reads the frames published by the others every `poll_interval`
+    seconds and hands them to its own subscribers. Frame IDs are the events' sequence
+    numbers in the ring, the same in every process. A process that falls more than
+    `buffer_size` events behind sends `resync` to its subscribers.
+
+    Methods:
+    --------
+    subscribe():
+        Registers a new subscriber.
+
+    unsubscribe(subscription):
+        Removes a subscriber.
+
+    publish(event_type, data):
+        Sends an event to every subscriber, in every process.
+
+    flush():
+        Delivers the events published by other processes.
+    """
+
+    thread_name = 'event-hub'
+
+    def __init__(self, app, queue_size=256, max_subscribers=100, buffer_size=1024, frame_size=1024,
+                 poll_interval=0.1):
+        """
+        Initializes an empty hub.
+
+        Parameters:
+        -----------
+        app : Flask
+            The application whose JSON provider serializes the events.
+        queue_size : int, optional
+            Events buffered per subscriber before it is dropped, default is 256.
+        max_subscribers : int, optional
+            Maximum number of concurrent subscribers, default is 100.
+        buffer_size : int, optional
+            Events kept in the shared ring, default is 1024.
+        frame_size : int, optional
+            Bytes per event in the shared ring, default is 1024. Larger events only
+            reach the publishing process.
+        poll_interval : float, optional
+            Seconds between two reads of the shared ring, default is 0.1.
+        """
+        super().__init__(app, poll_interval)
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        self.buffer_size = buffer_size
+        self.frame_size = frame_size
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._sequence = shared_array('q', 1)  # Number of the last event written to the ring
+        self._frames = shared_array('B', buffer_size * frame_size)
+        self._ring = memoryview(self._frames).cast('B')
+        self._ring_lock = SharedLock()
+        self._read = 0  # Number of the last event this process read from the ring
+
+    def __len__(self):
+        return len(self._subscribers)
+
+    def subscribe(self):
+        """
+        Registers a new subscriber.
+
+        Returns:
+        --------
+        Subscription or None:
+            The subscription, or None if the hub already has `max_subscribers`.
+        """
+        with self._lock:
+            if len(self._subscribers) >= self.max_subscribers:
+                return None
+            subscription = Subscription(self.queue_size)
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def publish(self, event_type, data):
+        """
+        Sends an event to every subscriber, dropping the ones whose queue is full.
+
+        Parameters:
+        -----------
+        event_type : str
+            The SSE event name, e.g. 'user.registered'.
+        data : dict
+            The JSON-serializable payload.
+        """
+        body = f'event: {event_type}\ndata: {self.app.json.dumps(data)}\n\n'
+        number = self._write(body.encode('utf-8'))
+        self._deliver(body if number is None else f'id: {number}\n{body}')
+
+    def flush(self):
+        """
+        Hands the events other processes wrote to the shared ring to this process's subscribers.
+
+        Returns:
+        --------
+        int:
+            The number of events delivered.
+        """
+        last = self._sequence[0]
+        if not self._subscribers:
+            self._read = last  # Nobody to deliver to: skip ahead.
+            return 0
+        delivered = 0
+        pid = os.getpid()
+        while self._read < last:
+            number = self._read + 1
+            offset = (number % self.buffer_size) * self.frame_size
+            written, publisher, length = FRAME_HEADER.unpack_from(self._ring, offset)
+            body = bytes(self._ring[offset + FRAME_HEADER.size:offset + FRAME_HEADER.size + length])
+            if written != number or FRAME_HEADER.unpack_from(self._ring, offset)[0] != number:
+                # Overwritten before this process read it: some events are lost.
+                self._read = self._sequence[0]
+                self._resync()
+                return delivered
+            self._read = number
+            if publisher != pid:
+                self._deliver(f'id: {number}\n{body.decode("utf-8")}')
+                delivered += 1
+        return delivered
+
+    def after_fork(self):
+        """
+        Starts reading the shared ring from its current end in a forked worker.
+        """
+        self._read = self._sequence[0]
+        super().after_fork()
+
+    def _write(self, body):
+        """
+        Appends an event to the shared ring and returns its number, or None if it could not be.
+        """
+        if FRAME_HEADER.size + len(body) > self.frame_size:
+            self.app.logger.warning('Event of %d bytes only sent to this process: EVENT_FRAME_SIZE is %d',
+                                    len(body), self.frame_size)
+            return None
+        with self._ring_lock.hold() as acquired:
+            if not acquired:
+                self.app.logger.warning('Event only sent to this process: timed out waiting for the shared lock')
+                return None
+            number = self._sequence[0] + 1
+            offset = (number % self.buffer_size) * self.frame_size
+            # Readers compare the header before and after copying the body, so the slot is
+            # marked invalid while it is rewritten.
+            FRAME_HEADER.pack_into(self._ring, offset, 0, 0, 0)
+            self._ring[offset + FRAME_HEADER.size:offset + FRAME_HEADER.size + len(body)] = body
+            FRAME_HEADER.pack_into(self._ring, offset, number, os.getpid(), len(body))
+            self._sequence[0] = number
+        return number
+
+    def _deliver(self, frame):
+        with self._lock:
+            for subscription in list(self._subscribers):
+                try:
+                    subscription._queue.put_nowait(frame)
+                except queue.Full:
+                    subscription.dropped = True
+                    self._subscribers.discard(subscription)
+
+    def _resync(self):
+        with self._lock:
+            for subscription in self._subscribers:
+                subscription.dropped = True
+                try:
+                    subscription._queue.put_nowait(None)  # Wakes the stream up to send `resync`.
+                except queue.Full:
+                    pass
+            self._subscribers.clear()
+
+
+def format_event(event_type, data=''):
+    """
+    Formats a server-sent event frame without an ID.
+    """
+    return f'event: {event_type}\ndata: {data}\n\n'
+
+
+def init_event_hub(app):
+    """
+    Creates the application's event hub from its configuration and starts its thread.
+
+    Parameters:
+    -----------
+    app : Flask
+        The application to attach the hub to.
+
+    Returns:
+    --------
+    EventHub:
+        The new hub.
+    """
+    hub = EventHub(
+        app,
+        queue_size=app.config.get('EVENT_QUEUE_SIZE', 256),
+        max_subscribers=app.config.get('EVENT_MAX_SUBSCRIBERS', 100),
+        buffer_size=app.config.get('EVENT_BUFFER_SIZE', 1024),
+        frame_size=app.config.get('EVENT_FRAME_SIZE', 1024),
+        poll_interval=app.config.get('EVENT_POLL_INTERVAL', 0.1),
+    )
+    app.extensions['event_hub'] = hub
+    hub.start()
+    return hub
+
+
+def limit_subscribers(app, limit):
+    """
+    Lowers the application's maximum number of concurrent event stream subscribers.
+
+    Each open stream holds one of a threaded server's worker threads, so the production
+    server (gunicorn.conf.py) keeps the streams well below its thread count to leave
+    room for the other requests. A limit of 0 turns the stream off.
+
+    Parameters:
+    -----------
+    app : Flask
+        The application whose event hub is limited.
+    limit : int
+        The maximum number of subscribers in this process.
+    """
+    hub = app.extensions.get('event_hub')
+    if hub is not None:
+        hub.max_subscribers = min(hub.max_subscribers, max(limit, 0))
+
+
+def publish_event(event_type, **data):
+    """
+    Publishes an account change event, if the event hub is enabled.
+
+    Parameters:
+    -----------
+    event_type : str
+        The SSE event name.
+    **data :
+        The event payload.
+    """
+    hub = current_app.extensions.get('event_hub')
+    if hub is not None:
+        hub.publish(event_type, data)
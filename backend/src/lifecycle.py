@@ -0,0 +1,79 @@
+from src.models import db
+from src.utils.flush_utils import PeriodicFlusher
+
+
+def background_workers(app):
+    """
+    Returns the application's background writers (audit log, API key usage, purger, ...).
+    """
+    return [ext for ext in app.extensions.values() if isinstance(ext, PeriodicFlusher)]
+
+
+def engines(app):
+    """
+    Returns every SQLAlchemy engine the application holds: Flask-SQLAlchemy's binds,
+    the user shards and the read replicas.
+    """
+    with app.app_context():
+        found = list(db.engines.values())
+    shard_map = app.extensions.get('user_shards')
+    if shard_map is not None:
+        found.extend(engine for engine in shard_map.engines.values() if engine is not None)
+    router = app.extensions.get('read_replicas')
+    if router is not None:
+        found.extend(replica.engine for pool in router.replicas.values() for replica in pool)
+    return found
+
+
+def prepare_fork(app):
+    """
+    Readies a preloaded application to be forked into worker processes.
+
+    The background threads are stopped, which writes out their buffers in this process
+    so that no child inherits (and writes again) the same entries, and the connection
+    pools are emptied so that no SQLite connection is shared across processes. Safe to
+    call before every fork.
+
+    Parameters:
+    -----------
+    app : Flask
+        The preloaded application.
+    """
+    for worker in background_workers(app):
+        worker.stop()
+    for engine in engines(app):
+        engine.dispose()
+
+
+def reinit_after_fork(app):
+    """
+    Gives a forked worker process its own connection pools and background threads.
+    Background workers whose state the parent loaded too long ago to catch up from the
+    database refresh it before their thread starts (see `CredentialDirectory.after_fork`).
+
+    Parameters:
+    -----------
+    app : Flask
+        The application inherited from the parent process.
+    """
+    for engine in engines(app):
+        # close=False: connections inherited from the parent are left alone, never closed here.
+        engine.dispose(close=False)
+    for worker in background_workers(app):
+        worker.after_fork()
+
+
+def drain(app):
+    """
+    Flushes and stops the background writers of a worker that is shutting down.
+
+    Parameters:
+    -----------
+    app : Flask
+        The worker's application.
+    """
+    for worker in background_workers(app):
+        try:
+            worker.stop()
+        except Exception as e:
+            app.logger.warning('Could not stop %s: %s', worker.thread_name, e)
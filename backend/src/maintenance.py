@@ -0,0 +1,398 @@
+import collections
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from flask import current_app, g
+from sqlalchemy import event
+from src.models import db
+from src.sharding import DEFAULT_SHARD, get_shard_map
+from src.utils.flush_utils import PeriodicFlusher
+
+try:
+    import fcntl
+except ImportError:  # Windows: every process runs its own passes.
+    fcntl = None
+
+AUTO_VACUUM_MODES = {0: 'none', 1: 'full', 2: 'incremental'}
+
+
+class BackOff(Exception):
+    """
+    Raised between maintenance steps to end a run early.
+    """
+
+
+class MaintenanceScheduler(PeriodicFlusher):
+    """
+    Background thread that keeps the SQLite databases (the main one and every user shard)
+    compact and well planned.
+
+    Every `interval` seconds it runs a pass made of small steps, on each database:
+
+    - a passive WAL checkpoint, if the database is in WAL mode;
+    - `ANALYZE` every `analyze_interval` seconds, sampled with `analysis_limit` rows per
+      index so it stays short on large tables, and `PRAGMA optimize` otherwise;
+    - `PRAGMA incremental_vacuum`, `step_pages` pages at a time, until the freelist is
+      empty. It needs `auto_vacuum = INCREMENTAL`: new databases get it automatically,
+      existing ones with `flask maintenance enable-incremental-vacuum`.
+
+    Each step is its own short write, followed by a `pause`. The run stops, and the
+    remaining work waits for the next pass, as soon as the application looks busy:
+
+    - this process is handling more than `max_active_requests` requests;
+    - another connection, from any worker process, committed to the database since the
+      previous step (`PRAGMA data_version` changed);
+    - the database is locked by another writer. The scheduler's connection does not
+      wait for locks, so a step never queues behind the workers' writes.
+
+    A pass also stops after `budget` seconds.
+
+    With several worker processes, every one of them has a scheduler, but only one runs
+    each pass: a pass first takes an exclusive lock on `lock_file` (next to the first
+    database by default, or in the instance folder if that database has no absolute
+    path), which also records when the last pass ran. The others skip
+    the pass while the lock is taken or if a pass ran less than half an interval ago.
+
+    Methods:
+    --------
+    request_started() / request_finished():
+        Track the requests in progress.
+
+    flush():
+        Runs one maintenance pass.
+
+    report():
+        Returns the databases' current sizes and the recent runs.
+    """
+
+    thread_name = 'sqlite-maintenance'
+
+    def __init__(self, app, interval=300.0, max_active_requests=0, step_pages=500, pause=0.05,
+                 budget=2.0, analyze_interval=3600.0, analysis_limit=1000, history=20, lock_file=None):
+        """
+        Initializes the scheduler for an application.
+
+        Parameters:
+        -----------
+        app : Flask
+            The application whose databases are maintained.
+        interval : float, optional
+            Seconds between passes, default is 300.
+        max_active_requests : int, optional
+            Requests in progress above which the pass backs off, default is 0.
+        step_pages : int, optional
+            Pages released per incremental vacuum step, default is 500.
+        pause : float, optional
+            Seconds to sleep between steps, default is 0.05.
+        budget : float, optional
+            Maximum seconds of work per pass, default is 2.
+        analyze_interval : float, optional
+            Minimum seconds between two ANALYZE runs, default is 3600.
+        analysis_limit : int, optional
+            Rows sampled per index by ANALYZE, default is 1000.
+        history : int, optional
+            Number of runs kept for the report, default is 20.
+        lock_file : str, optional
+            File shared by the worker processes to elect the one running each pass,
+            default is the first database's path followed by '-maintenance.lock', or
+            'maintenance.lock' in the instance folder if that path is not absolute.
+        """
+        super().__init__(app, interval)
+        self.max_active_requests = max_active_requests
+        self.step_pages = step_pages
+        self.pause = pause
+        self.budget = budget
+        self.analyze_interval = analyze_interval
+        self.analysis_limit = analysis_limit
+        self.runs = collections.deque(maxlen=history)
+        self.lock_file = lock_file
+        self._active = 0
+        self._next_analyze = {}
+        self._lock = threading.Lock()
+
+    @property
+    def active_requests(self):
+        return self._active
+
+    def request_started(self):
+        with self._lock:
+            self._active += 1
+
+    def request_finished(self):
+        with self._lock:
+            self._active -= 1
+
+    def databases(self):
+        """
+        Returns (key, engine) for every SQLite file database the application writes to.
+        In-memory databases are skipped: their single connection is shared with requests.
+        """
+        with self.app.app_context():
+            engines = sqlite_engines()
+        return [(key, engine) for key, engine in engines if engine.url.database not in (None, '', ':memory:')]
+
+    def flush(self):
+        """
+        Runs one maintenance pass over every database, unless the thread is stopping.
+
+        Returns:
+        --------
+        dict or None:
+            The run's record: start time, duration, outcome ('completed', 'deferred',
+            'skipped' when another process has the pass, or 'failed'), steps taken and
+            the figures of each database.
+        """
+        if self._stopping.is_set():
+            return None  # No maintenance on the way out: shutdown must stay fast.
+        started = time.monotonic()
+        run = {'started_at': datetime.now(), 'outcome': 'completed', 'steps': 0, 'databases': {}}
+        deadline = started + self.budget
+        databases = self.databases()
+        try:
+            lock = self._claim_pass(databases[0][1]) if databases else False
+        except BackOff as e:
+            run.update(outcome='skipped', reason=str(e), duration=round(time.monotonic() - started, 4))
+            self.runs.appendleft(run)
+            return run
+        try:
+            for key, engine in databases:
+                run['databases'][key] = figures = {}
+                with engine.connect() as conn:
+                    busy_timeout = conn.exec_driver_sql('PRAGMA busy_timeout').scalar()
+                    conn.exec_driver_sql('PRAGMA busy_timeout = 0')
+                    try:
+                        self._maintain(key, conn, figures, run, deadline)
+                    except Exception as e:
+                        if _is_busy(e):
+                            raise BackOff('database locked by another connection') from e
+                        raise
+                    finally:
+                        conn.exec_driver_sql(f'PRAGMA busy_timeout = {int(busy_timeout)}')
+                        figures.update(database_figures(conn))
+        except BackOff as e:
+            run['outcome'] = 'deferred'
+            run['reason'] = str(e)
+        except Exception as e:
+            run['outcome'] = 'failed'
+            run['error'] = str(e)
+            self.app.logger.warning('SQLite maintenance failed: %s', e)
+        finally:
+            self._release_pass(lock, record=run['outcome'] != 'deferred')
+        run['duration'] = round(time.monotonic() - started, 4)
+        self.runs.appendleft(run)
+        return run
+
+    def _claim_pass(self, engine):
+        """
+        Takes the lock file shared by the worker processes, or raises BackOff if another
+        process holds it or ran a pass recently. Returns the open lock file, or False
+        where file locks are not available.
+        """
+        if fcntl is None:
+            return False
+        lock = open(self._lock_path(engine), 'a+')
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock.close()
+            raise BackOff('another process is running maintenance')
+        lock.seek(0)
+        try:
+            last_pass = float(lock.read() or 0)
+        except ValueError:
+            last_pass = 0
+        if time.time() - last_pass < self.flush_interval / 2:
+            lock.close()
+            raise BackOff('another process ran maintenance recently')
+        return lock
+
+    def _lock_path(self, engine):
+        """
+        Returns the lock file's path. A relative database path depends on each process's
+        working directory, so the default falls back to the instance folder, which all
+        the workers share.
+        """
+        if self.lock_file:
+            return self.lock_file
+        database = engine.url.database
+        if database and os.path.isabs(database):
+            return f'{database}-maintenance.lock'
+        os.makedirs(self.app.instance_path, exist_ok=True)
+        return os.path.join(self.app.instance_path, 'maintenance.lock')
+
+    @staticmethod
+    def _release_pass(lock, record):
+        """
+        Releases the lock file, first recording the time of a pass that did not back off
+        so the other processes skip theirs.
+        """
+        if lock is False:
+            return
+        try:
+            if record:
+                lock.seek(0)
+                lock.truncate()
+                lock.write(repr(time.time()))
+                lock.flush()
+        finally:
+            lock.close()  # Closing the file releases the lock.
+
+    def _maintain(self, key, conn, figures, run, deadline):
+        def pragma(name):
+            return conn.exec_driver_sql(f'PRAGMA {name}').scalar()
+
+        raw = conn.connection.driver_connection
+        conn.info['maintenance_data_version'] = pragma('data_version')
+
+        figures['journal_mode'] = pragma('journal_mode')
+        if figures['journal_mode'] == 'wal':
+            self._step(run, deadline, conn)
+            busy, log_pages, checkpointed = conn.exec_driver_sql('PRAGMA wal_checkpoint(PASSIVE)').one()
+            figures['checkpoint'] = {'busy': bool(busy), 'wal_pages': log_pages, 'checkpointed_pages': checkpointed}
+
+        self._step(run, deadline, conn)
+        if time.monotonic() >= self._next_analyze.get(key, 0):
+            raw.executescript(f'PRAGMA analysis_limit = {int(self.analysis_limit)}; ANALYZE;')
+            self._next_analyze[key] = time.monotonic() + self.analyze_interval
+            figures['analyzed'] = True
+        else:
+            raw.executescript('PRAGMA optimize;')
+
+        figures['auto_vacuum'] = AUTO_VACUUM_MODES.get(pragma('auto_vacuum'))
+        figures['vacuumed_pages'] = 0
+        if figures['auto_vacuum'] == 'incremental':
+            while (free := pragma('freelist_count')) > 0:
+                self._step(run, deadline, conn)
+                # executescript steps the pragma to completion; execute() would free one page.
+                raw.executescript(f'PRAGMA incremental_vacuum({int(self.step_pages)});')
+                figures['vacuumed_pages'] += min(free, self.step_pages)
+
+    def _step(self, run, deadline, conn):
+        """
+        Waits `pause` seconds after the previous step, then raises BackOff if the process
+        is busy, another connection wrote to the database in the meantime, the pass is
+        out of time or the thread is stopping.
+        """
+        if run['steps']:
+            time.sleep(self.pause)
+        if self._stopping.is_set():
+            raise BackOff('stopping')
+        if self._active > self.max_active_requests:
+            raise BackOff(f'{self._active} requests in progress')
+        # Changes only when another connection (any process) commits to this database.
+        data_version = conn.exec_driver_sql('PRAGMA data_version').scalar()
+        if data_version != conn.info['maintenance_data_version']:
+            raise BackOff('other connections are writing')
+        if time.monotonic() >= deadline:
+            raise BackOff('time budget exhausted')
+        run['steps'] += 1
+
+    def report(self):
+        """
+        Returns the current page counts of every database and the recent runs, newest first.
+        """
+        databases = {}
+        for key, engine in self.databases():
+            with engine.connect() as conn:
+                databases[key] = database_figures(conn)
+        return {
+            'interval': self.flush_interval,
+            'active_requests': self._active,
+            'databases': databases,
+            'runs': list(self.runs),
+        }
+
+
+def sqlite_engines():
+    """
+    Returns (key, engine) for the main SQLite database and every SQLite user shard.
+    """
+    engines = {DEFAULT_SHARD: db.engines[None]}
+    engines.update((key, engine) for key, engine in get_shard_map().engines.items() if engine is not None)
+    return [(key, engine) for key, engine in engines.items() if engine.dialect.name == 'sqlite']
+
+
+def database_figures(conn):
+    """
+    Returns the page size, page count and freelist size of a SQLite connection's database.
+    """
+    page_size, page_count, freelist_count = (
+        conn.exec_driver_sql(f'PRAGMA {name}').scalar() for name in ('page_size', 'page_count', 'freelist_count')
+    )
+    return {
+        'page_size': page_size,
+        'page_count': page_count,
+        'freelist_count': freelist_count,
+        'size_bytes': page_size * page_count,
+    }
+
+
+def _is_busy(error):
+    """
+    Returns True for the error SQLite raises when another connection holds the lock.
+    """
+    error = getattr(error, 'orig', error)
+    return isinstance(error, sqlite3.OperationalError) and 'database is locked' in str(error)
+
+
+def _use_incremental_auto_vacuum(dbapi_connection, connection_record):
+    # Only takes effect on a database without tables yet; existing ones need a VACUUM.
+    dbapi_connection.execute('PRAGMA auto_vacuum = INCREMENTAL')
+
+
+def init_maintenance(app):
+    """
+    Creates and starts the SQLite maintenance scheduler, unless MAINTENANCE_INTERVAL is 0.
+
+    New SQLite databases are created with incremental auto-vacuum, and the application
+    counts its requests in progress so the scheduler can back off.
+
+    Parameters:
+    -----------
+    app : Flask
+        The application to attach the scheduler to, after its databases are configured.
+
+    Returns:
+    --------
+    MaintenanceScheduler or None:
+        The started scheduler, or None when disabled.
+    """
+    interval = app.config.get('MAINTENANCE_INTERVAL', 300.0)
+    if not interval:
+        return None
+    scheduler = MaintenanceScheduler(
+        app,
+        interval=interval,
+        max_active_requests=app.config.get('MAINTENANCE_MAX_ACTIVE_REQUESTS', 0),
+        step_pages=app.config.get('MAINTENANCE_STEP_PAGES', 500),
+        pause=app.config.get('MAINTENANCE_PAUSE', 0.05),
+        budget=app.config.get('MAINTENANCE_BUDGET', 2.0),
+        analyze_interval=app.config.get('MAINTENANCE_ANALYZE_INTERVAL', 3600.0),
+        analysis_limit=app.config.get('MAINTENANCE_ANALYSIS_LIMIT', 1000),
+        lock_file=app.config.get('MAINTENANCE_LOCK_FILE'),
+    )
+    for _, engine in scheduler.databases():
+        event.listen(engine, 'connect', _use_incremental_auto_vacuum)
+
+    @app.before_request
+    def _track_request_started():
+        scheduler.request_started()
+        g._maintenance_tracked = True
+
+    @app.teardown_request
+    def _track_request_finished(exc):
+        if g.pop('_maintenance_tracked', False):
+            scheduler.request_finished()
+
+    app.extensions['sqlite_maintenance'] = scheduler
+    scheduler.start()
+    return scheduler
+
+
+def get_maintenance_scheduler():
+    """
+    Returns the current application's maintenance scheduler, or None if it is disabled.
+    """
+    return current_app.extensions.get('sqlite_maintenance')
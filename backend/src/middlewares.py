@@ -1,11 +1,22 @@
-from flask import request, jsonify
+from flask import g, request, jsonify
 from functools import wraps
 from src.models import User
-from src.utils.jwt_utils import decode_jwt, generate_jwt  # Asegúrate de importar las funciones adecuadas
+from src.utils.jwt_utils import decode_jwt, decode_scoped_token, generate_jwt  # Asegúrate de importar las funciones adecuadas
+from src.utils.api_key_utils import ApiKeyUtils
+from src.api_keys import authenticate_api_key
+
+
+def _required_scope():
+    """
+    Returns the API key scope a request needs: 'read' for safe methods, 'write' otherwise.
+    """
+    return 'read' if request.method in ('GET', 'HEAD', 'OPTIONS') else 'write'
+
 
 def login_required(f):
     """
     Middleware to ensure the user is authenticated using JWT before accessing a route.
+    Service accounts may present an API key ('Bearer uap_...') instead of a JWT.
 
     Parameters:
     -----------
@@ -28,11 +39,20 @@ def login_required(f):
 
         token = token.split(" ")[1]
 
+        if ApiKeyUtils.is_api_key(token):
+            user, error = authenticate_api_key(token, _required_scope())
+            if error:
+                return jsonify({'message': f'Unauthorized: {error}'}), 401
+            g.user_id = user.id
+            request.user = user
+            return f(*args, **kwargs)
+
         payload = decode_jwt(token)
         if not payload:
             return jsonify({'message': 'Invalid or expired token'}), 401
 
-        user = User.query.get(payload.get('user_id'))
+        g.user_id = payload.get('user_id')  # Used by the read replica router
+        user = User.get_active(payload.get('user_id'))
         if not user:
             return jsonify({'message': 'User not found'}), 404
 
@@ -46,6 +66,7 @@ def admin_required(f):
     """
     Middleware para asegurarse de que el usuario es un administrador.
     Decodifica el JWT, obtiene el user_id y verifica si el usuario es administrador.
+    También acepta API keys de cuentas de servicio con el scope 'admin'.
     """
     @wraps(f)
     def decorated_function(*args, **kwargs):
@@ -58,6 +79,14 @@ def admin_required(f):
 
         token = token.split(" ")[1]
 
+        if ApiKeyUtils.is_api_key(token):
+            user, error = authenticate_api_key(token, _required_scope(), admin=True)
+            if error:
+                return jsonify({'message': f'Forbidden: {error}'}), 403
+            g.user_id = user.id
+            request.user = user
+            return f(*args, **kwargs)
+
         try:
             payload = decode_jwt(token)
             if not payload:
@@ -67,7 +96,8 @@ def admin_required(f):
             if not user_id:
                 return jsonify({'message': 'User ID is missing in the token'}), 403
 
-            user = User.query.get(user_id)
+            g.user_id = user_id  # Used by the read replica router
+            user = User.get_active(user_id)
             if user and user.is_admin:
                 request.user = user
                 return f(*args, **kwargs)
@@ -76,4 +106,42 @@ def admin_required(f):
         except Exception as e:
             return jsonify({'message': 'Forbidden: Invalid token'}), 403
 
-    return decorated_function
\ No newline at end of file
+    return decorated_function
+
+def admin_or_scoped_token_required(scope):
+    """
+    Like `admin_required`, but the route can also be opened with a short-lived token for
+    `scope` (see `generate_scoped_token`) in the 'token' query parameter. Used by the
+    admin event stream, since browser EventSource clients cannot send headers.
+
+    Parameters:
+    -----------
+    scope : str
+        The scope the query token must have.
+
+    Returns:
+    --------
+    function
+        The decorator.
+    """
+    def decorator(f):
+        admin_view = admin_required(f)
+
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            token = request.args.get('token')
+            if token is None:
+                return admin_view(*args, **kwargs)
+            user_id = decode_scoped_token(token, scope)
+            if user_id is None:
+                return jsonify({'message': 'Forbidden: Invalid or expired token'}), 403
+            user = User.get_active(user_id)
+            if not (user and user.is_admin):
+                return jsonify({'message': 'Forbidden: You are not authorized to access this resource'}), 403
+            g.user_id = user_id
+            request.user = user
+            return f(*args, **kwargs)
+
+        return decorated_function
+
+    return decorator
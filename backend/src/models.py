@@ -1,9 +1,14 @@
 import os
 import re  # For password validation
+from datetime import datetime
+from flask import current_app, has_app_context
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event, insert, inspect, select, update
+from sqlalchemy.orm import Session
 from src.utils.password_utils import PasswordUtils
+from src.sharding import UserShardSession
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': UserShardSession})  # Users routed to their shard, see src/sharding.py
 
 class User(db.Model):
     """
@@ -25,12 +30,18 @@ class User(db.Model):
         Timestamp of the user's last login, nullable.
     is_admin : bool
         Indicates whether the user has administrative privileges, default is False.
+    deleted_at : datetime
+        When an admin deleted the user, nullable. Deleted users are rejected and hidden
+        at once; their rows are removed later by the background purger (src/purge.py).
 
     Methods:
     --------
     __init__(username, password, is_admin=False):
         Initializes a new User with a username, password, and optional admin status.
 
+    get_active(user_id):
+        Returns the user with the given ID unless it does not exist or was deleted.
+
     hash_password(password):
         Hashes a given password using the user's current salt.
 
@@ -47,6 +58,16 @@ class User(db.Model):
     salt = db.Column(db.String(64), nullable=False)
     last_login = db.Column(db.DateTime, nullable=True)
     is_admin = db.Column(db.Boolean, default=False)
+    deleted_at = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (
+        # Listings read only live users, in ID order, straight from this partial index.
+        db.Index('ix_user_active', 'id', 'username', 'last_login',
+                 sqlite_where=deleted_at.is_(None), postgresql_where=deleted_at.is_(None)),
+        # Lets the purger find the (few) deleted users without a table scan.
+        db.Index('ix_user_deleted', 'deleted_at',
+                 sqlite_where=deleted_at.isnot(None), postgresql_where=deleted_at.isnot(None)),
+    )
 
     def __init__(self, username, password, is_admin=False):
         """
@@ -100,6 +121,26 @@ class User(db.Model):
         """
         return PasswordUtils.check_password(self.password_hash, password, self.salt)
 
+    @classmethod
+    def get_active(cls, user_id):
+        """
+        Returns the user with the given ID, or None if it does not exist or was deleted.
+
+        Parameters:
+        -----------
+        user_id : int
+            The ID of the user.
+
+        Returns:
+        --------
+        User or None:
+            The user, if it is active.
+        """
+        user = cls.query.get(user_id)
+        if user is None or user.deleted_at is not None:
+            return None
+        return user
+
     @staticmethod
     def validate_password(password):
         """
@@ -131,3 +172,221 @@ class User(db.Model):
         if not re.search(r'[!@#$%^&*(),.?":{}|<>]', password):  # At least one special character.
             return False
         return True
+
+
+class AuthEvent(db.Model):
+    """
+    Append-only record of a login attempt, written in batches by the audit log.
+
+    Attributes:
+    -----------
+    id : int
+        Primary key for the event.
+    user_id : int
+        ID of the user the attempt resolved to, null when the username is unknown.
+    username : str
+        The username submitted with the attempt.
+    outcome : str
+        Result of the attempt: 'success', 'invalid_credentials' or 'reset_required'.
+    ip : str
+        Remote address the attempt came from, nullable.
+    created_at : datetime
+        Timestamp of the attempt.
+    """
+
+    __tablename__ = 'auth_events'
+    __table_args__ = (
+        db.Index('ix_auth_events_user_id_created_at', 'user_id', 'created_at'),
+        db.Index('ix_auth_events_username_created_at', 'username', 'created_at'),
+        db.Index('ix_auth_events_created_at', 'created_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, nullable=True)
+    username = db.Column(db.String(150), nullable=False)
+    outcome = db.Column(db.String(32), nullable=False)
+    ip = db.Column(db.String(45), nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False)
+
+    def to_dict(self):
+        """
+        Returns the event as a JSON-serializable dictionary.
+        """
+        return {
+            'id': self.id,
+            'user_id': self.user_id,
+            'username': self.username,
+            'outcome': self.outcome,
+            'ip': self.ip,
+            'created_at': self.created_at,
+        }
+
+
+class ChangeVersion(db.Model):
+    """
+    Monotonically increasing version number per table, used to build ETags.
+
+    Attributes:
+    -----------
+    name : str
+        Name of the versioned table, e.g. 'users'.
+    version : int
+        Incremented in the same transaction as every change to the table.
+    """
+
+    __tablename__ = 'change_versions'
+
+    name = db.Column(db.String(64), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+
+def get_change_version(name):
+    """
+    Returns the current version of a table, or 0 if it has never changed.
+
+    Parameters:
+    -----------
+    name : str
+        Name of the versioned table.
+
+    Returns:
+    --------
+    int:
+        The table's change version.
+    """
+    return db.session.scalar(select(ChangeVersion.version).where(ChangeVersion.name == name)) or 0
+
+
+@event.listens_for(Session, 'before_flush')
+def _bump_users_version(session, flush_context, instances):
+    """
+    Bumps the 'users' change version whenever a flush inserts, modifies or deletes a user,
+    so registration, deletion, password changes and last_login updates all invalidate ETags.
+    """
+    changed = any(isinstance(obj, User) for obj in session.new) \
+        or any(isinstance(obj, User) for obj in session.deleted) \
+        or any(isinstance(obj, User) and session.is_modified(obj) for obj in session.dirty)
+    if not changed:
+        return
+    bumped = session.execute(
+        update(ChangeVersion).where(ChangeVersion.name == 'users').values(version=ChangeVersion.version + 1)
+    )
+    if bumped.rowcount == 0:
+        session.execute(insert(ChangeVersion).values(name='users', version=1))
+
+
+class ApiKey(db.Model):
+    """
+    An admin-issued API key that lets a service account authenticate without a password.
+
+    Only the SHA-256 digest of the key's secret is stored. The public `key_id` is part of
+    the key itself and is used to find the row through a unique index.
+
+    Attributes:
+    -----------
+    id : int
+        Primary key for the API key.
+    key_id : str
+        Public identifier embedded in the key, unique.
+    key_hash : str
+        Hexadecimal SHA-256 digest of the key's secret.
+    user_id : int
+        ID of the (service account) user the key authenticates as.
+    name : str
+        Human-readable label for the key.
+    scopes : str
+        Space-separated scopes: 'read', 'write' and/or 'admin'.
+    created_at : datetime
+        When the key was issued.
+    expires_at : datetime
+        When the key stops being accepted, nullable for keys that never expire.
+    last_used_at : datetime
+        Approximate time of the last successful use, nullable.
+    revoked_at : datetime
+        When the key was revoked, nullable.
+    """
+
+    __tablename__ = 'api_keys'
+
+    id = db.Column(db.Integer, primary_key=True)
+    key_id = db.Column(db.String(16), unique=True, nullable=False, index=True)
+    key_hash = db.Column(db.String(64), nullable=False)
+    user_id = db.Column(db.Integer, nullable=False, index=True)
+    name = db.Column(db.String(150), nullable=False)
+    scopes = db.Column(db.String(64), nullable=False, default='read')
+    created_at = db.Column(db.DateTime, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=True)
+    last_used_at = db.Column(db.DateTime, nullable=True)
+    revoked_at = db.Column(db.DateTime, nullable=True)
+
+    def has_scope(self, scope):
+        """
+        Returns True if the key grants the given scope.
+        """
+        return scope in self.scopes.split()
+
+    def to_dict(self):
+        """
+        Returns the key's metadata (never its secret) as a JSON-serializable dictionary.
+        """
+        return {
+            'key_id': self.key_id,
+            'user_id': self.user_id,
+            'name': self.name,
+            'scopes': self.scopes.split(),
+            'created_at': self.created_at,
+            'expires_at': self.expires_at,
+            'last_used_at': self.last_used_at,
+            'revoked_at': self.revoked_at,
+        }
+
+
+class CredentialChange(db.Model):
+    """
+    Log of users whose login credentials changed, read by every process's credential
+    directory (src/credentials.py) to reload those users. Only written while
+    CREDENTIAL_DIRECTORY is enabled; the directories prune it.
+
+    Attributes:
+    -----------
+    id : int
+        Increasing position in the log.
+    username : str
+        The user whose credentials changed.
+    changed_at : datetime
+        When the change was flushed; old entries are pruned.
+    """
+
+    __tablename__ = 'credential_changes'
+    __table_args__ = {'sqlite_autoincrement': True}  # IDs are never reused after pruning.
+
+    id = db.Column(db.Integer, primary_key=True)
+    username = db.Column(db.String(150), nullable=False)
+    changed_at = db.Column(db.DateTime, nullable=False, index=True)
+
+
+CREDENTIAL_COLUMNS = ('username', 'password_hash', 'salt', 'is_admin', 'deleted_at')
+
+
+@event.listens_for(Session, 'before_flush')
+def _log_credential_changes(session, flush_context, instances):
+    """
+    Logs users that are created, deleted or given a new password, admin flag or deletion
+    mark, in the same transaction as the change. last_login updates are not logged.
+    Nothing is logged unless CREDENTIAL_DIRECTORY is enabled: only the directory reads
+    (and prunes) the log.
+    """
+    if not (has_app_context() and current_app.config.get('CREDENTIAL_DIRECTORY')):
+        return
+    usernames = {obj.username for obj in session.new if isinstance(obj, User)}
+    usernames.update(obj.username for obj in session.deleted if isinstance(obj, User))
+    for obj in session.dirty:
+        if isinstance(obj, User):
+            attrs = inspect(obj).attrs
+            if any(attrs[name].history.has_changes() for name in CREDENTIAL_COLUMNS):
+                usernames.add(obj.username)
+                usernames.update(attrs.username.history.deleted)  # Old name, if renamed.
+    if usernames:
+        now = datetime.now()
+        session.execute(insert(CredentialChange.__table__),
+                        [{'username': username, 'changed_at': now} for username in usernames])
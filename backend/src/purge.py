@@ -0,0 +1,110 @@
+import time
+from sqlalchemy import delete, select
+from src.models import db, User, ApiKey
+from src.sharding import get_shard_map
+from src.utils.flush_utils import PeriodicFlusher
+
+
+class UserPurger(PeriodicFlusher):
+    """
+    Background thread that hard-deletes users marked as deleted.
+
+    Deleting a user only sets `deleted_at`, which is a single-row update. This thread
+    later removes the rows, together with the API keys that belong to them, a few at a
+    time: each batch is its own short transaction and the thread sleeps `pause` seconds
+    between batches, so the database write lock is never held long enough to stall
+    logins. Authentication events are kept as audit history.
+
+    Methods:
+    --------
+    flush():
+        Purges every deleted user, batch by batch.
+
+    start() / stop():
+        Start the background thread / stop it.
+    """
+
+    thread_name = 'user-purger'
+
+    def __init__(self, app, interval=60.0, batch_size=100, pause=0.1):
+        """
+        Initializes the purger for an application.
+
+        Parameters:
+        -----------
+        app : Flask
+            The application whose deleted users are purged.
+        interval : float, optional
+            Seconds between purge runs, default is 60.
+        batch_size : int, optional
+            Users deleted per transaction, default is 100.
+        pause : float, optional
+            Seconds to sleep between batches, default is 0.1.
+        """
+        super().__init__(app, interval)
+        self.batch_size = batch_size
+        self.pause = pause
+        self.purged = 0
+
+    def flush(self):
+        """
+        Hard-deletes every user marked as deleted, on every shard.
+
+        Returns:
+        --------
+        int:
+            The number of users purged.
+        """
+        purged = 0
+        with self.app.app_context():
+            try:
+                for key in get_shard_map().keys:
+                    while not self._stopping.is_set():
+                        count = self._purge_batch(key)
+                        purged += count
+                        if count < self.batch_size:
+                            break
+                        time.sleep(self.pause)
+            finally:
+                db.session.remove()
+        self.purged += purged
+        return purged
+
+    def _purge_batch(self, shard_key):
+        table = User.__table__
+        user_ids = db.session.execute(
+            select(table.c.id).where(table.c.deleted_at.isnot(None)).limit(self.batch_size),
+            bind_arguments={'shard_id': shard_key},
+        ).scalars().all()
+        if not user_ids:
+            return 0
+        db.session.execute(delete(ApiKey.__table__).where(ApiKey.__table__.c.user_id.in_(user_ids)))
+        db.session.execute(delete(table).where(table.c.id.in_(user_ids)),
+                           bind_arguments={'shard_id': shard_key})
+        db.session.commit()
+        return len(user_ids)
+
+
+def init_user_purger(app):
+    """
+    Creates the application's user purger from its configuration and starts it.
+
+    Parameters:
+    -----------
+    app : Flask
+        The application to attach the purger to.
+
+    Returns:
+    --------
+    UserPurger:
+        The started purger.
+    """
+    purger = UserPurger(
+        app,
+        interval=app.config.get('USER_PURGE_INTERVAL', 60.0),
+        batch_size=app.config.get('USER_PURGE_BATCH_SIZE', 100),
+        pause=app.config.get('USER_PURGE_PAUSE', 0.1),
+    )
+    app.extensions['user_purger'] = purger
+    purger.start()
+    return purger
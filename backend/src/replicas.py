@@ -0,0 +1,217 @@
+import itertools
+import threading
+import time
+from functools import wraps
+from flask import current_app, g, has_app_context, has_request_context
+from sqlalchemy import event, text
+from src.utils.db_utils import make_engine
+from src.utils.flush_utils import PeriodicFlusher
+from src.utils.shared_memory import shared_array
+
+STICKY_SLOTS = 65536  # Users pinned to the primary are hashed into this many shared slots.
+
+
+class Replica:
+    """
+    A read replica engine and its health state.
+
+    Attributes:
+    -----------
+    engine : Engine
+        Engine connected to the replica.
+    healthy : bool
+        Result of the last health check.
+    """
+
+    __slots__ = ('engine', 'healthy')
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.healthy = True
+
+
+class ReplicaRouter(PeriodicFlusher):
+    """
+    Chooses a read replica for the SELECTs issued by read-only routes.
+
+    Replicas are configured per database: 'default' for the main database and the shard
+    keys ('users_0', ...) for sharded users. Each database's replicas are used round-robin.
+    A background thread pings every replica with `SELECT 1` each `health_interval`
+    seconds; requests only read the result, so a slow or unreachable replica never holds
+    one up. A replica that failed its last ping is skipped, and reads fall back to the
+    primary when no replica is healthy.
+
+    To give read-your-writes consistency, users whose rows were just written (and the
+    user who made the write) read from the primary for `sticky_seconds`, whichever
+    worker process serves their next request: the pins are kept in a table of
+    STICKY_SLOTS expiry times in memory shared by the workers forked from the process
+    that created the router (see src/utils/shared_memory.py). Users whose IDs share a
+    slot pin each other, which only sends a few more reads to the primary.
+
+    Methods:
+    --------
+    choose(key):
+        Returns a healthy replica engine for a database, or None to use the primary.
+
+    mark_written(user_ids):
+        Pins the given users to the primary for the sticky window.
+
+    is_sticky(user_id):
+        Returns True if the user wrote recently.
+
+    flush():
+        Runs the health checks of every replica.
+    """
+
+    thread_name = 'replica-health'
+
+    def __init__(self, app, replicas, sticky_seconds=5.0, health_interval=5.0):
+        """
+        Parameters:
+        -----------
+        app : Flask
+            The application the replicas belong to.
+        replicas : dict
+            Database key to list of replica engines.
+        sticky_seconds : float, optional
+            How long a user reads from the primary after a write, default is 5.
+        health_interval : float, optional
+            Seconds between two health checks of the replicas, default is 5.
+        """
+        super().__init__(app, health_interval)
+        self.replicas = {key: [Replica(engine) for engine in engines] for key, engines in replicas.items() if engines}
+        self.sticky_seconds = sticky_seconds
+        self._cycles = {key: itertools.cycle(range(len(pool))) for key, pool in self.replicas.items()}
+        self._sticky = shared_array('d', STICKY_SLOTS)  # Monotonic time each slot is pinned until
+        self._lock = threading.Lock()
+
+    def choose(self, key):
+        pool = self.replicas.get(key)
+        if not pool:
+            return None
+        for _ in range(len(pool)):
+            with self._lock:
+                replica = pool[next(self._cycles[key])]
+            if replica.healthy:
+                return replica.engine
+        return None
+
+    def flush(self):
+        """
+        Pings every replica and records which ones answered, unless the thread is stopping.
+        """
+        if self._stopping.is_set():
+            return
+        for pool in self.replicas.values():
+            for replica in pool:
+                try:
+                    with replica.engine.connect() as conn:
+                        conn.execute(text('SELECT 1'))
+                    if not replica.healthy:
+                        self.app.logger.info('Read replica %s is healthy again', replica.engine.url)
+                    replica.healthy = True
+                except Exception as e:
+                    if replica.healthy:
+                        self.app.logger.warning('Read replica %s failed its health check: %s', replica.engine.url, e)
+                    replica.healthy = False
+
+    def mark_written(self, user_ids):
+        # The monotonic clock is system-wide, so the times compare across processes. Two
+        # concurrent writes to a slot both store about the same time: no lock is needed.
+        until = time.monotonic() + self.sticky_seconds
+        for user_id in user_ids:
+            self._sticky[user_id % STICKY_SLOTS] = until
+
+    def is_sticky(self, user_id):
+        return self._sticky[user_id % STICKY_SLOTS] > time.monotonic()
+
+
+def init_read_replicas(app):
+    """
+    Creates the replica router from READ_REPLICAS, a dict of database key to replica URIs,
+    and starts its health checks; the first one runs right away in the background.
+
+    Parameters:
+    -----------
+    app : Flask
+        The application to configure.
+    """
+    configured = app.config.get('READ_REPLICAS') or {}
+    replicas = {key: [make_engine(app, uri) for uri in uris] for key, uris in configured.items()}
+    if not any(replicas.values()):
+        return
+    router = ReplicaRouter(
+        app,
+        replicas,
+        sticky_seconds=app.config.get('REPLICA_STICKY_SECONDS', 5.0),
+        health_interval=app.config.get('REPLICA_HEALTH_INTERVAL', 5.0),
+    )
+    app.extensions['read_replicas'] = router
+    router.start()
+    router.wake()
+
+
+def read_only(f):
+    """
+    Marks a route as read-only so its queries, including the middleware user lookup, may
+    be served by a read replica. Place it above `login_required`/`admin_required`.
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        g.read_only = True
+        return f(*args, **kwargs)
+
+    return decorated_function
+
+
+def replica_for(key):
+    """
+    Returns the replica engine a SELECT against database `key` should use, or None for the primary.
+
+    Parameters:
+    -----------
+    key : str
+        'default' or a user shard key.
+    """
+    if not has_request_context() or not g.get('read_only'):
+        return None
+    router = current_app.extensions.get('read_replicas')
+    if router is None:
+        return None
+    user_id = g.get('user_id')
+    if user_id is not None and router.is_sticky(user_id):
+        return None
+    return router.choose(key)
+
+
+def track_user_writes(session_class):
+    """
+    Registers session listeners that pin written users to the primary after each commit.
+
+    Parameters:
+    -----------
+    session_class : type
+        The session class whose flushes are tracked.
+    """
+    @event.listens_for(session_class, 'after_flush')
+    def _collect_written_users(session, flush_context):
+        written = session.info.setdefault('written_users', set())
+        for obj in itertools.chain(session.new, session.dirty, session.deleted):
+            if getattr(obj, '__tablename__', None) == 'user' and obj.id is not None:
+                written.add(obj.id)
+
+    @event.listens_for(session_class, 'after_commit')
+    def _mark_written_users(session):
+        written = session.info.pop('written_users', None)
+        if not written or not has_app_context():
+            return
+        router = current_app.extensions.get('read_replicas')
+        if router is None:
+            return
+        if has_request_context() and g.get('user_id') is not None:
+            written.add(g.user_id)
+        router.mark_written(written)
+
+    @event.listens_for(session_class, 'after_rollback')
+    def _forget_written_users(session):
+        session.info.pop('written_users', None)
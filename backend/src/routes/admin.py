@@ -1,6 +1,18 @@
-from flask import Blueprint, request, jsonify
-from src.models import db, User
-from src.middlewares import admin_required  # Middleware para autorización
+from datetime import datetime, timedelta
+from flask import Blueprint, Response, current_app, request, jsonify
+from src.models import db, User, AuthEvent, ApiKey
+from src.middlewares import admin_required, admin_or_scoped_token_required  # Middleware para autorización
+from src.stats import get_login_stats
+from src.utils.etag_utils import users_etag, not_modified, with_etag
+from src.sharding import list_users
+from src.replicas import read_only
+from src.api_keys import SCOPES
+from src.events import RESYNC, format_event, publish_event
+from src.credentials import refresh_credentials
+from src.maintenance import get_maintenance_scheduler
+from src.utils.api_key_utils import ApiKeyUtils
+from src.utils.jwt_utils import generate_scoped_token
+from src.utils.breach_utils import is_breached_password
 
 admin_bp = Blueprint('admin', __name__)
 
@@ -27,12 +39,22 @@ def register():
                        'a lowercase letter, a number, and a special character.'
         }), 400
 
+    # Reject passwords that appear in known data breaches
+    if is_breached_password(password):
+        return jsonify({'message': 'This password has appeared in a data breach. Please choose a different one.'}), 400
+
     # Create the new user with provided details
     new_user = User(username=username, password=password, is_admin=is_admin)
     
     # Add the new user to the database
     db.session.add(new_user)
     db.session.commit()
+
+    stats = get_login_stats()
+    if stats:
+        stats.user_registered()
+    refresh_credentials(new_user.username, new_user)
+    publish_event('user.registered', id=new_user.id, username=new_user.username, is_admin=new_user.is_admin)
     
     return jsonify({'message': 'User registered successfully'}), 201
 
@@ -47,10 +69,15 @@ def change_password(user_id):
     if not new_password:
         return jsonify({'message': 'New password is required'}), 400
 
-    user = User.query.get(user_id)
+    if is_breached_password(new_password):
+        return jsonify({'message': 'This password has appeared in a data breach. Please choose a different one.'}), 400
+
+    user = User.get_active(user_id)
     if user:
         user.password_hash, user.salt = user.hash_password(new_password)
         db.session.commit()
+        refresh_credentials(user.username, user)
+        publish_event('user.password_changed', id=user_id)
         return jsonify({'message': 'Password changed successfully'}), 200
     else:
         return jsonify({'message': 'User not found'}), 404
@@ -60,10 +87,12 @@ def change_password(user_id):
 @admin_bp.route('/reset_password/<int:user_id>', methods=['POST'])
 @admin_required  # Usando el middleware que verifica si es administrador
 def reset_password(user_id):
-    user = User.query.get(user_id)
+    user = User.get_active(user_id)
     if user:
         user.password_hash, user.salt = user.hash_password("")
         db.session.commit()
+        refresh_credentials(user.username, user)
+        publish_event('user.password_reset', id=user_id)
         return jsonify({'message': 'Password reset (blank) successfully'}), 200
     else:
         return jsonify({'message': 'User not found'}), 404
@@ -71,21 +100,276 @@ def reset_password(user_id):
 
 # Route to get all users (admin only)
 @admin_bp.route('/users', methods=['GET'])
+@read_only  # Puede leerse desde una réplica
 @admin_required  # Usando el middleware que verifica si es administrador
 def get_users():
-    users = User.query.all()
-    users_data = [{"id": user.id, "username": user.username, "last_login": user.last_login} for user in users]
-    return jsonify(users_data), 200
+    """
+    Returns all users, or a single page of them when `page` is given.
+
+    Query Parameters:
+    -----------------
+    - page: 1-based page number; omit to get every user.
+    - per_page: Users per page, default 100, at most 1000.
+    - after_id: Return the page of users following this ID instead of using an offset.
+
+    Responses carry a weak ETag derived from the users change version; a request whose
+    `If-None-Match` matches it is answered with 304 without querying the users.
+    """
+    page = request.args.get('page', type=int)
+    per_page = min(request.args.get('per_page', 100, type=int), 1000)
+    after_id = request.args.get('after_id', type=int)
+    if after_id is not None and page is None:
+        page = 1
+    if page is not None and (page < 1 or per_page < 1):
+        return jsonify({'message': 'page and per_page must be positive integers'}), 400
+
+    etag = users_etag(f'a{after_id}x{per_page}' if after_id is not None else
+                      f'p{page}x{per_page}' if page else 'all')
+    cached = not_modified(etag)
+    if cached:
+        return cached
+
+    # Users are read from every shard and merged by ID
+    rows = list_users([User.id, User.username, User.last_login], page=page, per_page=per_page,
+                      after_id=after_id, criteria=(User.deleted_at.is_(None),))
+    users_data = [{"id": row.id, "username": row.username, "last_login": row.last_login} for row in rows]
+    return with_etag(jsonify(users_data), etag), 200
 
 
 # Route to delete a user (admin only)
 @admin_bp.route('/delete_user/<int:user_id>', methods=['DELETE'])
 @admin_required  # Usando el middleware que verifica si es administrador
 def delete_user(user_id):
-    user = User.query.get(user_id)
+    """
+    Marks a user as deleted. The user is rejected and hidden from listings at once; the
+    row itself is removed later, in small batches, by the background purger.
+    """
+    user = User.get_active(user_id)
     if user:
-        db.session.delete(user)
+        last_login = user.last_login
+        user.deleted_at = datetime.now()
         db.session.commit()
+
+        stats = get_login_stats()
+        if stats:
+            stats.user_deleted(last_login)
+        refresh_credentials(user.username, user)
+        publish_event('user.deleted', id=user_id)
         return jsonify({'message': 'User deleted successfully'}), 200
     else:
         return jsonify({'message': 'User not found'}), 404
+
+
+# Route to query recent login attempts (admin only)
+@admin_bp.route('/auth-events', methods=['GET'])
+@admin_required  # Usando el middleware que verifica si es administrador
+def get_auth_events():
+    """
+    Returns recent login attempts, newest first.
+
+    Query Parameters:
+    -----------------
+    - user_id: Only events for this user ID.
+    - username: Only events for this submitted username.
+    - since / until: ISO-8601 bounds on the event timestamp.
+    - limit: Maximum number of events, default 100, between 1 and 1000.
+
+    Events still in the audit log's buffer are not listed; they are written within
+    AUDIT_FLUSH_INTERVAL seconds.
+    """
+    try:
+        since = datetime.fromisoformat(request.args['since']) if 'since' in request.args else None
+        until = datetime.fromisoformat(request.args['until']) if 'until' in request.args else None
+    except ValueError:
+        return jsonify({'message': 'since and until must be ISO-8601 timestamps'}), 400
+    limit = max(1, min(request.args.get('limit', 100, type=int), 1000))
+    user_id = request.args.get('user_id', type=int)
+    username = request.args.get('username')
+
+    # Only persisted events are listed; the writer thread is asked to flush the buffer
+    # now rather than doing it on this request.
+    audit_log = current_app.extensions.get('audit_log')
+    if audit_log is not None:
+        audit_log.wake()
+
+    query = AuthEvent.query
+    if user_id is not None:
+        query = query.filter(AuthEvent.user_id == user_id)
+    if username:
+        query = query.filter(AuthEvent.username == username)
+    if since:
+        query = query.filter(AuthEvent.created_at >= since)
+    if until:
+        query = query.filter(AuthEvent.created_at < until)
+    events = query.order_by(AuthEvent.created_at.desc(), AuthEvent.id.desc()).limit(limit).all()
+    return jsonify([event.to_dict() for event in events]), 200
+
+
+# Route to get login activity statistics (admin only)
+@admin_bp.route('/stats', methods=['GET'])
+@admin_required  # Usando el middleware que verifica si es administrador
+def get_stats():
+    """
+    Returns user totals, approximate active-user counts and login trends.
+
+    The figures are maintained incrementally by the login, register and delete routes,
+    so the response costs the same regardless of the number of users.
+    """
+    stats = get_login_stats()
+    if stats is None:
+        return jsonify({'message': 'Statistics are not enabled'}), 503
+    return jsonify(stats.snapshot()), 200
+
+
+# Route to get the SQLite maintenance report (admin only)
+@admin_bp.route('/maintenance', methods=['GET'])
+@admin_required  # Usando el middleware que verifica si es administrador
+def get_maintenance():
+    """
+    Returns the page size, page count and freelist size of each database, and the
+    recent maintenance runs (newest first) with their duration, outcome and figures.
+    """
+    scheduler = get_maintenance_scheduler()
+    if scheduler is None:
+        return jsonify({'message': 'Database maintenance is not enabled'}), 503
+    return jsonify(scheduler.report()), 200
+
+
+# Route to issue a token for the event stream (admin only)
+@admin_bp.route('/events/token', methods=['POST'])
+@admin_required  # Usando el middleware que verifica si es administrador
+def create_event_stream_token():
+    """
+    Returns a token that opens '/admin/events?token=...' for EVENT_TOKEN_LIFETIME seconds
+    (60 by default). Browser EventSource clients cannot send the Authorization header;
+    this token only opens the stream, so a leaked URL is worth little.
+    """
+    lifetime = current_app.config.get('EVENT_TOKEN_LIFETIME', 60)
+    token = generate_scoped_token(request.user.id, 'events', lifetime)
+    return jsonify({'token': token, 'expires_in': lifetime}), 200
+
+
+# Route to stream account changes to the admin dashboard (admin only)
+@admin_bp.route('/events', methods=['GET'])
+@admin_or_scoped_token_required('events')  # Cabecera Authorization o ?token= de /admin/events/token
+def stream_events():
+    """
+    Streams account changes as server-sent events, so dashboards can apply deltas
+    instead of re-fetching '/admin/users'.
+
+    Authenticate with the usual Authorization header or, from a browser EventSource,
+    with a token from POST '/admin/events/token' in the 'token' query parameter. The
+    token is checked when the stream opens; reconnecting after it expires needs a new one.
+
+    Events: 'user.registered' (id, username, is_admin), 'user.deleted' (id),
+    'user.password_changed' (id), 'user.password_reset' (id) and 'user.login'
+    (id, username, last_login). A comment line is sent every EVENT_HEARTBEAT seconds
+    while idle. A client that falls behind receives a 'resync' event and the stream
+    ends; it should reload '/admin/users' and reconnect.
+
+    Subscribe before loading the user list so that no change is missed in between.
+    """
+    hub = current_app.extensions.get('event_hub')
+    if hub is None:
+        return jsonify({'message': 'Event stream is not enabled'}), 503
+    subscription = hub.subscribe()
+    if subscription is None:
+        return jsonify({'message': 'Too many event stream subscribers'}), 503
+    heartbeat = current_app.config.get('EVENT_HEARTBEAT', 15.0)
+
+    def stream():
+        try:
+            yield 'retry: 5000\n\n'
+            while True:
+                frame = subscription.get(timeout=heartbeat)
+                if subscription.dropped:
+                    yield format_event(RESYNC)
+                    return
+                yield frame or ': keep-alive\n\n'
+        finally:
+            hub.unsubscribe(subscription)
+
+    return Response(stream(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+# Route to issue an API key for a service account (admin only)
+@admin_bp.route('/api-keys', methods=['POST'])
+@admin_required  # Usando el middleware que verifica si es administrador
+def create_api_key():
+    """
+    Issues an API key for a user. The key is only returned in this response.
+
+    POST Parameters:
+    ----------------
+    - user_id: The service account the key authenticates as.
+    - name: A label for the key.
+    - scopes: List of scopes ('read', 'write', 'admin'), default ['read'].
+    - expires_in_days: Optional lifetime of the key in days.
+    """
+    data = request.get_json()
+    user_id = data.get('user_id')
+    name = data.get('name')
+    scopes = data.get('scopes') or ['read']
+    expires_in_days = data.get('expires_in_days')
+
+    # bool es subclase de int: `true` no es un ID de usuario ni una duración.
+    if not name or not isinstance(user_id, int) or isinstance(user_id, bool):
+        return jsonify({'message': 'user_id and name are required'}), 400
+    if not isinstance(scopes, list) or any(scope not in SCOPES for scope in scopes):
+        return jsonify({'message': f'scopes must be a list of {", ".join(SCOPES)}'}), 400
+    if expires_in_days is not None and (not isinstance(expires_in_days, int) or isinstance(expires_in_days, bool)
+                                        or expires_in_days < 1):
+        return jsonify({'message': 'expires_in_days must be a positive integer'}), 400
+
+    user = User.get_active(user_id)
+    if not user:
+        return jsonify({'message': 'User not found'}), 404
+    if 'admin' in scopes and not user.is_admin:
+        return jsonify({'message': 'Only admin users can hold keys with the admin scope'}), 400
+
+    key_id, key, key_hash = ApiKeyUtils.generate()
+    now = datetime.now()
+    api_key = ApiKey(
+        key_id=key_id,
+        key_hash=key_hash,
+        user_id=user.id,
+        name=name,
+        scopes=' '.join(sorted(set(scopes))),
+        created_at=now,
+        expires_at=now + timedelta(days=expires_in_days) if expires_in_days else None,
+    )
+    db.session.add(api_key)
+    db.session.commit()
+
+    return jsonify({**api_key.to_dict(), 'key': key}), 201
+
+
+# Route to list API keys (admin only)
+@admin_bp.route('/api-keys', methods=['GET'])
+@admin_required  # Usando el middleware que verifica si es administrador
+def get_api_keys():
+    """
+    Lists API key metadata, optionally only for `user_id`. Secrets are never returned.
+    """
+    query = ApiKey.query
+    user_id = request.args.get('user_id', type=int)
+    if user_id is not None:
+        query = query.filter_by(user_id=user_id)
+    return jsonify([api_key.to_dict() for api_key in query.order_by(ApiKey.id)]), 200
+
+
+# Route to revoke an API key (admin only)
+@admin_bp.route('/api-keys/<key_id>', methods=['DELETE'])
+@admin_required  # Usando el middleware que verifica si es administrador
+def revoke_api_key(key_id):
+    """
+    Revokes an API key; it is rejected from the next request on.
+    """
+    api_key = ApiKey.query.filter_by(key_id=key_id).first()
+    if not api_key:
+        return jsonify({'message': 'API key not found'}), 404
+    if api_key.revoked_at is None:
+        api_key.revoked_at = datetime.now()
+        db.session.commit()
+    return jsonify({'message': 'API key revoked successfully'}), 200
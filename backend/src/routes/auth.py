@@ -1,8 +1,15 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, g, request, jsonify
 from src.models import db, User
 from datetime import datetime
 from src.utils.jwt_utils import generate_jwt, decode_jwt  # Asumimos que estas funciones están en jwt_utils
 from src.middlewares import login_required  # Importando middleware
+from src.utils.breach_utils import is_breached_password
+from src.audit import record_auth_event
+from src.stats import get_login_stats
+from src.events import publish_event
+from src.credentials import get_credential_directory, refresh_credentials
+from src.utils.etag_utils import users_etag, not_modified, with_etag
+from src.replicas import read_only
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -29,17 +36,37 @@ def login():
     - Verifies that the user exists and the password matches.
     - Updates the user's last login time.
     - Generates a JWT token for the logged-in user.
+    - Records the attempt and its outcome in the audit log and the login statistics.
     """
     data = request.get_json()
     username = data.get('username')
     password = data.get('password')
 
-    user = User.query.filter_by(username=username).first()
-    if user and user.check_password(password):
+    stats = get_login_stats()
+    directory = get_credential_directory()
+    if directory is not None:
+        # Verifica contra el directorio en memoria; solo un login correcto lee la fila
+        user_id, user = directory.authenticate(username, password)
+    else:
+        user = User.query.filter_by(username=username).first()
+        if user and user.deleted_at is not None:
+            user = None  # Borrado, pendiente de purga
+        user_id = user.id if user else None
+        if user and not user.check_password(password):
+            user = None
+    if user:
         if user.password_hash == "":
+            record_auth_event(user.id, username, 'reset_required')
+            if stats:
+                stats.login(user.id, success=False)
             return jsonify({'message': 'Account not secure. Password reset required.', 'success': False}), 403
+        first_login = user.last_login is None
         user.last_login = datetime.now()
         db.session.commit()
+        record_auth_event(user.id, username, 'success')
+        if stats:
+            stats.login(user.id, success=True, first_login=first_login)
+        publish_event('user.login', id=user.id, username=user.username, last_login=user.last_login)
         
         # Generate JWT token
         token = generate_jwt(user.id)
@@ -51,6 +78,9 @@ def login():
             'is_admin': user.is_admin
         }), 200
     else:
+        record_auth_event(user_id, username, 'invalid_credentials')
+        if stats:
+            stats.login(user_id, success=False)
         return jsonify({'message': 'Invalid credentials', 'success': False}), 401
 
 # Route for changing password (only for logged-in users)
@@ -72,7 +102,7 @@ def change_password():
 
     Behavior:
     ---------
-    - Retrieves the user ID from the decoded JWT token and updates the user's password in the database.
+    - Updates the password of the user authenticated by the middleware.
     - The password is hashed before being saved to the database.
     """
     data = request.get_json()
@@ -81,21 +111,9 @@ def change_password():
     if not new_password:
         return jsonify({'message': 'New password is required', 'success': False}), 400
 
-    # Get the token from the Authorization header
-    auth_header = request.headers.get('Authorization')
-    if not auth_header or not auth_header.startswith('Bearer '):
-        return jsonify({'message': 'Invalid token format', 'success': False}), 401
-
-    token = auth_header.split(' ')[1]
-    
     try:
-        # Decode the token to get the user_id
-        payload = decode_jwt(token)
-        if not payload or 'user_id' not in payload:
-            return jsonify({'message': 'Invalid token', 'success': False}), 401
-        
-        user_id = payload['user_id']
-        user = User.query.get(user_id)
+        # The middleware already authenticated the JWT (or API key) and loaded the user
+        user = request.user
         
         if not user:
             return jsonify({'message': 'User not found', 'success': False}), 404
@@ -108,9 +126,18 @@ def change_password():
                 'success': False
             }), 400
 
+        # Reject passwords that appear in known data breaches
+        if is_breached_password(new_password):
+            return jsonify({
+                'message': 'This password has appeared in a data breach. Please choose a different one.',
+                'success': False
+            }), 400
+
         # Update the password
         user.password_hash, user.salt = user.hash_password(new_password)
         db.session.commit()
+        refresh_credentials(user.username, user)
+        publish_event('user.password_changed', id=user.id)
         
         return jsonify({
             'message': 'Password changed successfully',
@@ -127,6 +154,7 @@ def change_password():
 
 # Route for getting the last login time of a user (only for logged-in users)
 @auth_bp.route('/last_login', methods=['GET'])
+@read_only  # Puede leerse desde una réplica
 @login_required  # Authentication middleware
 def get_last_login():
     """
@@ -142,7 +170,7 @@ def get_last_login():
     - Checks the decoded JWT token to find the logged-in user and retrieves their last login time.
     """
     user_id = decode_jwt(request.headers.get('Authorization'))  # Extract user ID from the token
-    user = User.query.get(user_id)
+    user = User.get_active(user_id)
     if user:
         return jsonify({'last_login': user.last_login}), 200
     return jsonify({'message': 'User not found'}), 404
@@ -161,6 +189,7 @@ def logout():
     return jsonify({'message': 'Logged out successfully'}), 200
 
 @auth_bp.route('/user-info', methods=['GET'])
+@read_only  # Puede leerse desde una réplica
 @login_required  # Authentication middleware
 def user_info():
     """
@@ -169,45 +198,34 @@ def user_info():
     Response:
     ---------
     - 200: Returns the user's information (username, isAdmin, lastLogin).
+    - 304: Not modified, if `If-None-Match` matches the current ETag.
     - 404: 'User not found' if no user exists for the decoded JWT token.
 
     Behavior:
     ---------
-    - Uses decode_jwt to extract user ID and fetch user details from the database.
+    - Uses the user ID authenticated by the middleware to fetch user details from the database.
     """
-    # Obtiene el token del encabezado Authorization
-    auth_header = request.headers.get('Authorization')
-    if not auth_header:
-        return jsonify({'message': 'Authorization header missing'}), 401
-
-    # Valida que el formato del token sea 'Bearer <token>'
-    if not auth_header.startswith('Bearer '):
-        return jsonify({'message': 'Invalid token format'}), 401
-
-    # Extrae el token real
-    token = auth_header.split(' ')[1]
-
     try:
-        # Decodifica el token para obtener el user_id
-        decoded_data = decode_jwt(token)
-        if not decoded_data:
-            return jsonify({'message': 'Invalid or expired token'}), 401
+        # El middleware ya validó el token (JWT o API key) y resolvió el user_id
+        user_id = g.user_id
 
-        user_id = decoded_data.get('user_id')  # Asegúrate de usar el campo correcto
-        if not user_id:
-            return jsonify({'message': 'Token missing user_id'}), 401
+        # Responde 304 si el cliente ya tiene la versión actual
+        etag = users_etag(f'u{user_id}')
+        cached = not_modified(etag)
+        if cached:
+            return cached
 
         # Busca al usuario en la base de datos
-        user = User.query.get(user_id)
+        user = User.get_active(user_id)
         if not user:
             return jsonify({'message': 'User not found'}), 404
 
         # Respuesta exitosa con información del usuario
-        return jsonify({
+        return with_etag(jsonify({
             'username': user.username,
             'isAdmin': user.is_admin,
-            'lastLogin': user.last_login.strftime('%Y-%m-%d %H:%M:%S') if user.last_login else None
-        }), 200
+            'lastLogin': user.last_login
+        }), etag), 200
 
     except Exception as e:
         return jsonify({'message': 'Error decoding token', 'error': str(e)}), 401
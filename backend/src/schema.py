@@ -0,0 +1,52 @@
+from sqlalchemy import inspect, text
+from src.models import db, User
+from src.sharding import get_shard_map
+
+
+def ensure_schema(app):
+    """
+    Brings the database up to date with the models before the application queries it.
+
+    Tables added since the database was created (auth_events, api_keys, ...) are
+    created, and the users table of every shard gets the columns and indexes added to
+    it since (see `upgrade_users_tables`). Other existing tables are left as they are.
+
+    Parameters:
+    -----------
+    app : Flask
+        The application, after its databases and user shards are configured.
+    """
+    with app.app_context():
+        db.create_all()
+        upgrade_users_tables()
+
+
+def upgrade_users_tables():
+    """
+    Adds the soft delete column and its partial indexes to users tables created before
+    them, on every shard. Tables already up to date are not touched.
+
+    Returns:
+    --------
+    list:
+        The keys of the shards whose users table was changed.
+    """
+    table = User.__table__
+    upgraded = []
+    for key, engine in get_shard_map().engines.items():
+        engine = engine or db.engines[None]
+        inspector = inspect(engine)
+        if not inspector.has_table(table.name):
+            continue
+        columns = {column['name'] for column in inspector.get_columns(table.name)}
+        indexes = {index['name'] for index in inspector.get_indexes(table.name)}
+        missing = [index for index in table.indexes if index.name not in indexes]
+        if 'deleted_at' in columns and not missing:
+            continue
+        with engine.begin() as conn:
+            if 'deleted_at' not in columns:
+                conn.execute(text(f'ALTER TABLE "{table.name}" ADD COLUMN deleted_at DATETIME'))
+            for index in missing:
+                index.create(conn)
+        upgraded.append(key)
+    return upgraded
@@ -0,0 +1,496 @@
+import hashlib
+import heapq
+import itertools
+from flask import current_app
+from flask_sqlalchemy.session import Session as FlaskSession
+from sqlalchemy import event, func, inspect, select
+from sqlalchemy.ext.horizontal_shard import ShardedSession
+from sqlalchemy.sql import operators
+from sqlalchemy.sql.elements import BinaryExpression, BindParameter, BooleanClauseList, Grouping
+from src.utils.db_utils import make_engine
+from src.replicas import replica_for, track_user_writes
+
+DEFAULT_SHARD = 'default'  # The application's main database.
+SHARDED_TABLE = 'user'
+NUM_BUCKETS = 256  # Fixed forever: a user's bucket is part of their ID.
+BUCKET_SHIFT = 40  # IDs are (bucket << 40) | sequence, which stays below 2**53 for JavaScript clients.
+
+
+def username_bucket(username):
+    """
+    Returns the fixed bucket a username hashes to.
+
+    Parameters:
+    -----------
+    username : str
+        The username to hash.
+
+    Returns:
+    --------
+    int:
+        A bucket number between 0 and NUM_BUCKETS - 1.
+    """
+    digest = hashlib.blake2b(username.encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big') % NUM_BUCKETS
+
+
+def id_bucket(user_id):
+    """
+    Returns the bucket encoded in a user ID. IDs created before sharding fall in bucket 0.
+    """
+    return int(user_id) >> BUCKET_SHIFT
+
+
+def jump_hash(key, num_buckets):
+    """
+    Jump consistent hash (Lamping & Veach): maps a key to one of `num_buckets` shards so that
+    going from N to N + 1 shards only moves about 1 / (N + 1) of the keys.
+    """
+    b, j = -1, 0
+    while j < num_buckets:
+        b = j
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        j = int((b + 1) * ((1 << 31) / ((key >> 33) + 1)))
+    return b
+
+
+class ShardMap:
+    """
+    Maps users to the database binds that hold them.
+
+    A username hashes to one of NUM_BUCKETS fixed buckets; buckets are assigned to the
+    configured shards with a jump consistent hash. Every user ID carries its bucket in
+    the high bits, so a user can be found from either the username or the ID alone.
+
+    Methods:
+    --------
+    for_username(username):
+        Returns the shard holding a username.
+
+    for_id(user_id):
+        Returns the shard holding a user ID.
+
+    id_range(bucket):
+        Returns the inclusive range of IDs available to a bucket.
+    """
+
+    def __init__(self, engines):
+        """
+        Parameters:
+        -----------
+        engines : dict
+            Shard key to SQLAlchemy engine, in a stable order.
+        """
+        self.engines = dict(engines)
+        self.keys = list(self.engines)
+
+    def for_bucket(self, bucket):
+        return self.keys[jump_hash(bucket, len(self.keys))]
+
+    def for_username(self, username):
+        return self.for_bucket(username_bucket(username))
+
+    def for_id(self, user_id):
+        return self.for_bucket(id_bucket(user_id))
+
+    @staticmethod
+    def id_range(bucket):
+        return (bucket << BUCKET_SHIFT) + 1, ((bucket + 1) << BUCKET_SHIFT) - 1
+
+
+UNSHARDED = ShardMap({DEFAULT_SHARD: None})  # None: the default Flask-SQLAlchemy bind.
+
+
+def get_shard_map():
+    """
+    Returns the current application's shard map; a single default shard when sharding is off.
+    """
+    return current_app.extensions.get('user_shards', UNSHARDED)
+
+
+def _is_sharded(mapper):
+    return mapper is not None and mapper.local_table.name == SHARDED_TABLE
+
+
+def _criteria(statement):
+    """
+    Yields (column name, value) for the `users column == literal` comparisons that every
+    row of a statement must satisfy: the top-level AND terms of its WHERE clause.
+    Comparisons under OR or NOT, or on other tables' columns, do not pin a shard.
+    """
+    whereclause = getattr(statement, 'whereclause', None)
+    if whereclause is None:
+        return
+    for element in _conjuncts(whereclause):
+        if isinstance(element, BinaryExpression) and element.operator is operators.eq \
+                and isinstance(element.right, BindParameter) \
+                and getattr(getattr(element.left, 'table', None), 'name', None) == SHARDED_TABLE:
+            yield element.left.name, element.right.effective_value
+
+
+def _conjuncts(clause):
+    while isinstance(clause, Grouping):
+        clause = clause.element
+    if isinstance(clause, BooleanClauseList) and clause.operator is operators.and_:
+        for term in clause.clauses:
+            yield from _conjuncts(term)
+    else:
+        yield clause
+
+
+class UserShardSession(ShardedSession, FlaskSession):
+    """
+    Session that routes the users table to its shard and everything else to the default bind.
+
+    Lookups by username or ID go to a single shard; other user queries fan out to every
+    shard and their results are concatenated. With sharding off, every query goes to the
+    default bind exactly as with the stock Flask-SQLAlchemy session. SELECTs issued by
+    read-only routes may be sent to a replica of the chosen database (see src/replicas.py).
+    """
+
+    def __init__(self, db, **kwargs):
+        super().__init__(
+            shard_chooser=self._shard_chooser,
+            identity_chooser=self._identity_chooser,
+            execute_chooser=self._execute_chooser,
+            db=db,
+            **kwargs,
+        )
+
+    def get_bind(self, mapper=None, *, shard_id=None, instance=None, clause=None, bind=None, **kw):
+        if bind is not None:
+            return bind
+        if shard_id is None:
+            if mapper is None and instance is None:
+                shard_id = DEFAULT_SHARD
+            else:
+                shard_id = self._choose_shard_and_assign(mapper, instance, clause=clause)
+        if clause is not None and getattr(clause, 'is_select', False):
+            replica = replica_for(shard_id)  # Only inside routes marked @read_only.
+            if replica is not None:
+                return replica
+        if shard_id == DEFAULT_SHARD:
+            if self.bind is not None:  # Session joined to an external connection, e.g. a test transaction.
+                return self.bind
+            return FlaskSession.get_bind(self, mapper, clause, **kw)
+        return get_shard_map().engines[shard_id]
+
+    def _choose_shard_and_assign(self, mapper, instance, **kw):
+        if mapper is not None:
+            mapper = inspect(mapper)
+        elif instance is not None:
+            mapper = inspect(instance).mapper
+        return super()._choose_shard_and_assign(mapper, instance, **kw)
+
+    @staticmethod
+    def _shard_chooser(mapper, instance, clause=None, **kw):
+        if not _is_sharded(mapper):
+            return DEFAULT_SHARD
+        shard_map = get_shard_map()
+        if instance is not None and instance.username is not None:
+            return shard_map.for_username(instance.username)
+        return shard_map.keys[0]
+
+    @staticmethod
+    def _identity_chooser(mapper, primary_key, **kw):
+        if not _is_sharded(mapper):
+            return [DEFAULT_SHARD]
+        return [get_shard_map().for_id(primary_key[0])]
+
+    @staticmethod
+    def _execute_chooser(orm_context):
+        if not _is_sharded(orm_context.bind_mapper):
+            return [DEFAULT_SHARD]
+        shard_map = get_shard_map()
+        if len(shard_map.keys) == 1:
+            return shard_map.keys
+        for name, value in _criteria(orm_context.statement):
+            if name == 'username' and value is not None:
+                return [shard_map.for_username(value)]
+            if name == 'id' and value is not None:
+                return [shard_map.for_id(value)]
+        return shard_map.keys
+
+
+track_user_writes(UserShardSession)
+
+
+@event.listens_for(UserShardSession, 'before_flush')
+def _assign_user_ids(session, flush_context, instances):
+    """
+    Gives new users an ID inside their username's bucket when sharding is on.
+
+    The next ID is one past the highest ID already used by the bucket on its shard, found
+    with a primary-key range lookup; SQLite serializes writers, so concurrent registrations
+    in the same bucket can only collide on the unique primary key and fail, never overwrite.
+    """
+    shard_map = get_shard_map()
+    if shard_map is UNSHARDED:
+        return
+    next_ids = {}
+    for obj in session.new:
+        if not _is_sharded(inspect(type(obj))) or obj.id is not None:
+            continue
+        bucket = username_bucket(obj.username)
+        if bucket not in next_ids:
+            low, high = ShardMap.id_range(bucket)
+            table = obj.__table__
+            current = session.execute(
+                select(func.max(table.c.id)).where(table.c.id.between(low, high)),
+                bind_arguments={'shard_id': shard_map.for_bucket(bucket)},
+            ).scalar()
+            next_ids[bucket] = (current or low - 1) + 1
+        obj.id = next_ids[bucket]
+        next_ids[bucket] += 1
+
+
+def init_user_shards(app):
+    """
+    Enables user sharding when USER_SHARDS lists more than one database URI.
+
+    Each URI becomes the shard 'users_<n>' and the users table is created in it. The
+    engines are kept out of SQLALCHEMY_BINDS so that `db.create_all()` and the other
+    models never see them.
+
+    Parameters:
+    -----------
+    app : Flask
+        The application to configure, after `db.init_app(app)`.
+    """
+    from src.models import User
+    uris = app.config.get('USER_SHARDS') or []
+    if len(uris) < 2:
+        return
+    engines = {f'users_{n}': make_engine(app, uri) for n, uri in enumerate(uris)}
+    for engine in engines.values():
+        User.__table__.create(engine, checkfirst=True)
+    app.extensions['user_shards'] = ShardMap(engines)
+
+
+def list_users(columns, page=None, per_page=100, after_id=None, criteria=()):
+    """
+    Returns user rows ordered by ID across every shard.
+
+    Each shard is asked for at most the rows the requested page could need, and the
+    per-shard results (already ordered) are merged, so pagination is exact regardless of
+    how the users are spread.
+
+    Parameters:
+    -----------
+    columns : list
+        User columns to select; the first one must be `User.id`.
+    page : int, optional
+        1-based page number; all rows are returned when omitted.
+    per_page : int, optional
+        Rows per page, default is 100.
+    after_id : int, optional
+        Keyset cursor: only rows with a greater ID, without an offset.
+    criteria : tuple, optional
+        Extra WHERE clauses, e.g. to leave out deleted users.
+
+    Returns:
+    --------
+    list:
+        The selected rows.
+    """
+    from src.models import db
+    id_column = columns[0]
+    statement = select(*columns).where(*criteria).order_by(id_column)
+    if after_id is not None:
+        statement = statement.where(id_column > after_id)
+    keys = get_shard_map().keys
+    skip = 0
+    if page is not None:
+        skip = 0 if after_id is not None else (page - 1) * per_page
+        if len(keys) == 1:
+            # A single database applies the offset itself instead of returning the skipped rows.
+            statement, skip = statement.offset(skip), 0
+        statement = statement.limit(skip + per_page)
+
+    streams = [
+        db.session.execute(statement, bind_arguments={'shard_id': key}).all()
+        for key in keys
+    ]
+    merged = heapq.merge(*streams, key=lambda row: row[0]) if len(streams) > 1 else streams[0]
+    if page is None:
+        return list(merged)
+    return list(itertools.islice(merged, skip, skip + per_page))
+
+
+def count_users(*criteria):
+    """
+    Counts users matching the given criteria across every shard.
+    """
+    from src.models import db, User
+    statement = select(func.count(User.id)).where(*criteria)
+    return sum(db.session.execute(statement).scalars())
+
+
+def rebalance_users(app, extra_sources=(), batch_size=1000, log=print):
+    """
+    Moves every user to the shard its username maps to under the current USER_SHARDS.
+
+    Run after changing the number of shards. The current shards, the default database
+    (where users live while sharding is off) and any `extra_sources` (URIs of shards that
+    were removed from the configuration) are scanned in ID order. Users found on the wrong
+    shard are copied to the right one and then deleted from the source, one batch per
+    transaction pair. If the target already holds an identical copy of the user (left by
+    an interrupted run), only the source row is deleted, so the tool can safely be re-run.
+    If it holds a different user with the same username (e.g. the admin created at
+    startup once sharding was on), nothing is deleted: the source row is kept, reported
+    as a conflict and left for an administrator to resolve.
+
+    Users created before sharding have IDs outside their username's bucket; they are given
+    a new ID in that bucket when moved, which invalidates their current tokens. The rows
+    that refer to users by ID (see `_renumber_references`) follow the new IDs.
+
+    Parameters:
+    -----------
+    app : Flask
+        The application whose configuration defines the shards.
+    extra_sources : iterable of str, optional
+        Additional database URIs to drain.
+    batch_size : int, optional
+        Users moved per transaction, default is 1000.
+    log : callable, optional
+        Receives progress messages.
+
+    Returns:
+    --------
+    dict:
+        Counts of 'scanned', 'moved', 'renumbered' and 'conflicts' (users kept on their
+        source because a different user has their username on the target).
+    """
+    from sqlalchemy import delete, insert, update
+    from src.models import db, User, ChangeVersion
+
+    table = User.__table__
+    counts = {'scanned': 0, 'moved': 0, 'renumbered': 0, 'conflicts': 0}
+    with app.app_context():
+        shard_map = app.extensions.get('user_shards', UNSHARDED)
+        targets = {key: engine or db.engines[None] for key, engine in shard_map.engines.items()}
+        sources = list(targets.items())
+        if DEFAULT_SHARD not in targets:
+            sources.append((DEFAULT_SHARD, db.engines[None]))
+        sources += [(uri, make_engine(app, uri)) for uri in extra_sources]
+        for engine in targets.values():
+            table.create(engine, checkfirst=True)
+
+        next_ids = {}
+        for source_key, source in sources:
+            if not inspect(source).has_table(table.name):
+                continue
+            last_id = 0
+            while True:
+                with source.connect() as conn:
+                    rows = conn.execute(
+                        select(table).where(table.c.id > last_id).order_by(table.c.id).limit(batch_size)
+                    ).mappings().all()
+                if not rows:
+                    break
+                last_id = rows[-1]['id']
+                counts['scanned'] += len(rows)
+
+                moves = {}
+                for row in rows:
+                    bucket = username_bucket(row['username'])
+                    target_key = shard_map.for_bucket(bucket)
+                    renumber = shard_map is not UNSHARDED and id_bucket(row['id']) != bucket
+                    if target_key == source_key and not renumber:
+                        continue
+                    moves.setdefault(target_key, []).append((bucket, renumber, dict(row)))
+
+                for target_key, batch in moves.items():
+                    target = targets[target_key]
+                    renumbered = {}  # old ID -> new ID
+                    if target_key == source_key:
+                        # Right shard, pre-sharding ID: renumber in place.
+                        with target.begin() as conn:
+                            for bucket, _, row in batch:
+                                new_id = _next_bucket_id(conn, table, next_ids, target_key, bucket)
+                                conn.execute(update(table).where(table.c.id == row['id']).values(id=new_id))
+                                renumbered[row['id']] = new_id
+                        _renumber_references(renumbered)
+                        counts['renumbered'] += len(batch)
+                        continue
+                    moved_ids = []
+                    with target.begin() as conn:
+                        present = {
+                            copy['username']: copy for copy in conn.execute(
+                                select(table).where(table.c.username.in_([row['username'] for _, _, row in batch]))
+                            ).mappings()
+                        }
+                        to_insert = []
+                        for bucket, renumber, row in batch:
+                            copy = present.get(row['username'])
+                            if copy is not None and not _same_user(copy, row):
+                                counts['conflicts'] += 1
+                                log(f"{source_key}: kept user {row['id']} ('{row['username']}'): "
+                                    f"{target_key} has a different user with that username")
+                                continue
+                            moved_ids.append(row['id'])
+                            if copy is not None:  # Copied by an interrupted run.
+                                if copy['id'] != row['id']:
+                                    renumbered[row['id']] = copy['id']
+                                continue
+                            if renumber:
+                                new_id = _next_bucket_id(conn, table, next_ids, target_key, bucket)
+                                renumbered[row['id']] = new_id
+                                row = {**row, 'id': new_id}
+                                counts['renumbered'] += 1
+                            to_insert.append(row)
+                        if to_insert:
+                            conn.execute(insert(table), to_insert)
+                    # References follow before the source rows go, so a re-run can finish an interrupted move.
+                    _renumber_references(renumbered)
+                    if moved_ids:
+                        with source.begin() as conn:
+                            conn.execute(delete(table).where(table.c.id.in_(moved_ids)))
+                    counts['moved'] += len(moved_ids)
+                log(f'{source_key}: scanned up to id {last_id}, moved {counts["moved"]} so far')
+
+        if counts['moved']:
+            with db.engines[None].begin() as conn:
+                conn.execute(update(ChangeVersion.__table__).where(ChangeVersion.name == 'users')
+                             .values(version=ChangeVersion.version + 1))
+    return counts
+
+
+def _same_user(copy, row):
+    """
+    Returns True if a user row on the target shard is a copy of the source row, ignoring the ID.
+    """
+    return all(copy[name] == value for name, value in row.items() if name != 'id')
+
+
+def _renumber_references(renumbered):
+    """
+    Points the rows that refer to users by ID (login audit events and API keys) at the
+    users' new IDs, in one transaction.
+
+    Parameters:
+    -----------
+    renumbered : dict
+        Old user ID to new user ID.
+    """
+    from sqlalchemy import bindparam, update
+    from src.models import db, ApiKey, AuthEvent
+
+    if not renumbered:
+        return
+    params = [{'old_id': old_id, 'new_id': new_id} for old_id, new_id in renumbered.items()]
+    with db.engines[None].begin() as conn:
+        for table in (AuthEvent.__table__, ApiKey.__table__):
+            conn.execute(
+                update(table).where(table.c.user_id == bindparam('old_id')).values(user_id=bindparam('new_id')),
+                params,
+            )
+
+
+def _next_bucket_id(conn, table, next_ids, shard_key, bucket):
+    if (shard_key, bucket) not in next_ids:
+        low, high = ShardMap.id_range(bucket)
+        current = conn.execute(select(func.max(table.c.id)).where(table.c.id.between(low, high))).scalar()
+        next_ids[(shard_key, bucket)] = (current or low - 1) + 1
+    next_ids[(shard_key, bucket)] += 1
+    return next_ids[(shard_key, bucket)] - 1
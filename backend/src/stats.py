@@ -0,0 +1,321 @@
+import contextlib
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import func, select
+from src.models import db, User, AuthEvent
+from src.utils.hll import HyperLogLog
+from src.utils.shared_memory import SharedLock, shared_array
+from src.sharding import count_users
+
+HOURLY_WINDOW = 24  # Hours of login counts kept at hourly resolution.
+DAILY_WINDOW = 30  # Days of login counts and distinct-user sketches kept.
+SKETCH_PRECISION = 12
+SKETCH_SIZE = 1 << SKETCH_PRECISION  # Bytes of HyperLogLog registers per day.
+
+
+class LoginStats:
+    """
+    Incrementally maintained login activity figures for the admin dashboard.
+
+    Routes update the counters as users are registered, deleted and log in, so
+    reading them never scans the users table. Activity is kept in fixed-size
+    windows: login counts per hour for the last day, and per day (together with a
+    HyperLogLog sketch of the distinct users who logged in) for the last 30 days.
+    `snapshot()` therefore costs the same no matter how many users exist.
+
+    The figures are kept in fixed-size rings (one slot per hour and per day, reused as
+    time moves on) in memory shared by every worker process forked from the one that
+    created them (see src/utils/shared_memory.py), so all workers, including recycled
+    ones, update and report the same figures. They are rebuilt by `warm()` from the
+    users and auth_events tables at startup.
+
+    Methods:
+    --------
+    warm():
+        Rebuilds the figures from the database.
+
+    user_registered():
+        Counts a newly registered user.
+
+    user_deleted(last_login):
+        Removes a deleted user from the totals.
+
+    login(user_id, success, first_login=False):
+        Records a login attempt.
+
+    snapshot():
+        Returns the current figures as a JSON-serializable dictionary.
+    """
+
+    def __init__(self, app):
+        """
+        Initializes empty statistics for an application.
+
+        Parameters:
+        -----------
+        app : Flask
+            The application whose database is used by `warm()`.
+        """
+        self.app = app
+        hours, days = HOURLY_WINDOW + 1, DAILY_WINDOW + 1
+        self._totals = shared_array('q', 2)  # [total users, never logged in]
+        self._hour_keys = shared_array('q', hours)  # Hour number held by each slot
+        self._hour_counts = shared_array('q', hours * 2)  # [success, failure] per slot
+        self._day_keys = shared_array('q', days)  # Date ordinal held by each slot
+        self._day_counts = shared_array('q', days * 2)
+        self._day_sketches = shared_array('B', days * SKETCH_SIZE)  # HyperLogLog registers per slot
+        self._sketches = memoryview(self._day_sketches).cast('B')
+        self._lock = SharedLock()
+
+    @property
+    def total_users(self):
+        return self._totals[0]
+
+    @property
+    def never_logged_in(self):
+        return self._totals[1]
+
+    def warm(self):
+        """
+        Rebuilds the figures from the database.
+
+        Totals come from the users table. Distinct-user sketches are seeded from each
+        user's last login, so days before a user's most recent login are undercounted
+        until live traffic fills them in. Login counts are rebuilt from auth_events.
+        """
+        now = datetime.now()
+        first_day = now.date() - timedelta(days=DAILY_WINDOW - 1)
+        first_hour = now.replace(minute=0, second=0, microsecond=0) - timedelta(hours=HOURLY_WINDOW - 1)
+        since = datetime.combine(first_day, datetime.min.time())
+
+        with self.app.app_context():
+            active = User.deleted_at.is_(None)
+            total = count_users(active)
+            never = count_users(active, User.last_login.is_(None))
+            recent = db.session.execute(
+                select(User.id, User.last_login).where(active, User.last_login >= since)
+                .execution_options(yield_per=10_000)
+            )
+            daily = {}
+            for user_id, last_login in recent:
+                self._day(daily, last_login.date())[2].add(user_id)
+
+            hour_key = func.strftime('%Y-%m-%d %H:00:00', AuthEvent.created_at)
+            day_key = func.strftime('%Y-%m-%d', AuthEvent.created_at)
+            hourly = {}
+            for hour, outcome, count in db.session.execute(
+                select(hour_key, AuthEvent.outcome, func.count())
+                .where(AuthEvent.created_at >= first_hour).group_by(hour_key, AuthEvent.outcome)
+            ):
+                bucket = hourly.setdefault(datetime.fromisoformat(hour), [0, 0])
+                bucket[0 if outcome == 'success' else 1] += count
+            for day, outcome, count in db.session.execute(
+                select(day_key, AuthEvent.outcome, func.count())
+                .where(AuthEvent.created_at >= since).group_by(day_key, AuthEvent.outcome)
+            ):
+                bucket = self._day(daily, datetime.fromisoformat(day).date())
+                bucket[0 if outcome == 'success' else 1] += count
+            db.session.remove()
+
+        with self._lock.hold() as acquired:
+            if not acquired:
+                raise RuntimeError('Login statistics are locked by another process')
+            self._totals[0], self._totals[1] = total, never
+            for keys in (self._hour_keys, self._day_keys):
+                keys[:] = [0] * len(keys)
+            for hour, (success, failure) in hourly.items():
+                slot = self._hour_slot(hour)
+                self._hour_counts[2 * slot:2 * slot + 2] = [success, failure]
+            for day, (success, failure, sketch) in daily.items():
+                slot = self._day_slot(day)
+                self._day_counts[2 * slot:2 * slot + 2] = [success, failure]
+                self._sketches[slot * SKETCH_SIZE:(slot + 1) * SKETCH_SIZE] = sketch.registers
+
+    def user_registered(self):
+        """
+        Counts a newly registered user, who has not logged in yet.
+        """
+        with self._update() as acquired:
+            if acquired:
+                self._totals[0] += 1
+                self._totals[1] += 1
+
+    def user_deleted(self, last_login):
+        """
+        Removes a deleted user from the totals.
+
+        Parameters:
+        -----------
+        last_login : datetime or None
+            The deleted user's last login.
+        """
+        with self._update() as acquired:
+            if acquired:
+                self._totals[0] -= 1
+                if last_login is None:
+                    self._totals[1] -= 1
+
+    def login(self, user_id, success, first_login=False):
+        """
+        Records a login attempt in the current hourly and daily buckets.
+
+        Parameters:
+        -----------
+        user_id : int or None
+            ID of the user the attempt resolved to.
+        success : bool
+            Whether the attempt succeeded.
+        first_login : bool, optional
+            True if this is the user's first successful login.
+        """
+        now = datetime.now()
+        outcome = 0 if success else 1
+        with self._update() as acquired:
+            if not acquired:
+                return
+            self._hour_counts[2 * self._hour_slot(now) + outcome] += 1
+            slot = self._day_slot(now.date())
+            self._day_counts[2 * slot + outcome] += 1
+            if success:
+                self._sketch(slot).add(user_id)
+                if first_login:
+                    self._totals[1] -= 1
+
+    def snapshot(self):
+        """
+        Returns the current figures as a JSON-serializable dictionary.
+
+        Returns:
+        --------
+        dict:
+            Totals, approximate distinct active users for today, the last 7 days and the
+            last 30 days, and login counts per hour and per day.
+        """
+        now = datetime.now()
+        today = now.date()
+        current_hour = now.replace(minute=0, second=0, microsecond=0)
+        days = [today - timedelta(days=i) for i in range(DAILY_WINDOW - 1, -1, -1)]
+        hours = [current_hour - timedelta(hours=i) for i in range(HOURLY_WINDOW - 1, -1, -1)]
+        # Only copy under the lock (a few KiB of registers per day); the estimates and
+        # unions are computed after releasing it, so logins are not held up meanwhile. If
+        # the lock times out the figures are read anyway, possibly mid-update.
+        with self._update():
+            total_users, never_logged_in = self._totals
+            daily = []
+            for day in days:
+                slot = day.toordinal() % len(self._day_keys)
+                if self._day_keys[slot] != day.toordinal():
+                    daily.append(None)
+                    continue
+                sketch = HyperLogLog(SKETCH_PRECISION, bytearray(self._sketch(slot).registers))
+                daily.append((self._day_counts[2 * slot], self._day_counts[2 * slot + 1], sketch))
+            hourly = []
+            for hour in hours:
+                slot = _hour_number(hour) % len(self._hour_keys)
+                matches = self._hour_keys[slot] == _hour_number(hour)
+                hourly.append(tuple(self._hour_counts[2 * slot:2 * slot + 2]) if matches else (0, 0))
+
+        sketches = [bucket[2] for bucket in daily if bucket]
+        week_sketches = [bucket[2] for bucket in daily[-7:] if bucket]
+        return {
+            'total_users': total_users,
+            'never_logged_in': never_logged_in,
+            'active_users': {
+                'today': daily[-1][2].count() if daily[-1] else 0,
+                'last_7_days': HyperLogLog.union(week_sketches).count(),
+                'last_30_days': HyperLogLog.union(sketches).count(),
+            },
+            'logins': {
+                'last_24_hours': {
+                    'success': sum(bucket[0] for bucket in hourly),
+                    'failure': sum(bucket[1] for bucket in hourly),
+                },
+                'hourly': [
+                    {'hour': hour, 'success': bucket[0], 'failure': bucket[1]}
+                    for hour, bucket in zip(hours, hourly)
+                ],
+                'daily': [
+                    {
+                        'date': day,
+                        'success': bucket[0] if bucket else 0,
+                        'failure': bucket[1] if bucket else 0,
+                        'active_users': bucket[2].count() if bucket else 0,
+                    }
+                    for day, bucket in zip(days, daily)
+                ],
+            },
+        }
+
+    @contextlib.contextmanager
+    def _update(self):
+        """
+        Holds the shared lock, yielding False (and logging it) if it timed out.
+        """
+        with self._lock.hold() as acquired:
+            if not acquired:
+                self.app.logger.warning('Login statistics: timed out waiting for the shared lock')
+            yield acquired
+
+    def _hour_slot(self, time):
+        """
+        Returns the ring slot of the hour containing `time`, clearing it if it held an older hour.
+        """
+        key = _hour_number(time)
+        slot = key % len(self._hour_keys)
+        if self._hour_keys[slot] != key:
+            self._hour_keys[slot] = key
+            self._hour_counts[2 * slot:2 * slot + 2] = [0, 0]
+        return slot
+
+    def _day_slot(self, day):
+        """
+        Returns the ring slot of a date, clearing it if it held an older day.
+        """
+        key = day.toordinal()
+        slot = key % len(self._day_keys)
+        if self._day_keys[slot] != key:
+            self._day_keys[slot] = key
+            self._day_counts[2 * slot:2 * slot + 2] = [0, 0]
+            self._sketches[slot * SKETCH_SIZE:(slot + 1) * SKETCH_SIZE] = bytes(SKETCH_SIZE)
+        return slot
+
+    def _sketch(self, slot):
+        return HyperLogLog(SKETCH_PRECISION, self._sketches[slot * SKETCH_SIZE:(slot + 1) * SKETCH_SIZE])
+
+    @staticmethod
+    def _day(daily, day):
+        bucket = daily.get(day)
+        if bucket is None:
+            bucket = daily[day] = [0, 0, HyperLogLog(SKETCH_PRECISION)]
+        return bucket
+
+
+def _hour_number(time):
+    return time.toordinal() * 24 + time.hour
+
+
+def init_login_stats(app):
+    """
+    Creates the application's login statistics and warms them from the database.
+
+    Parameters:
+    -----------
+    app : Flask
+        The application to attach the statistics to.
+
+    Returns:
+    --------
+    LoginStats:
+        The warmed statistics.
+    """
+    stats = LoginStats(app)
+    stats.warm()
+    app.extensions['login_stats'] = stats
+    return stats
+
+
+def get_login_stats():
+    """
+    Returns the current application's login statistics, or None if they are not enabled.
+    """
+    return current_app.extensions.get('login_stats')
@@ -0,0 +1,88 @@
+import hashlib
+import hmac
+import secrets
+
+KEY_PREFIX = 'uap_'
+
+
+class ApiKeyUtils:
+    """
+    A utility class for generating and verifying service-account API keys.
+
+    Keys look like 'uap_<key_id>_<secret>'. The secret carries 256 bits of randomness, so
+    a single SHA-256 digest is enough to store it safely: unlike passwords, there is no
+    dictionary to guess from, and a slow KDF such as PBKDF2 would only add latency to
+    every request.
+
+    Methods:
+    --------
+    generate():
+        Creates a new key and returns its public ID, full value and stored digest.
+
+    parse(key):
+        Splits a presented key into its ID and secret.
+
+    hash_secret(secret):
+        Returns the digest stored for a secret.
+
+    check_secret(stored_hash, secret):
+        Verifies a secret against a stored digest in constant time.
+    """
+
+    @staticmethod
+    def generate():
+        """
+        Creates a new API key.
+
+        Returns:
+        --------
+        tuple:
+            (key_id, key, key_hash): the public ID, the full key to hand to the client once,
+            and the digest to store.
+        """
+        key_id = secrets.token_hex(6)
+        secret = secrets.token_urlsafe(32)
+        return key_id, f'{KEY_PREFIX}{key_id}_{secret}', ApiKeyUtils.hash_secret(secret)
+
+    @staticmethod
+    def is_api_key(token):
+        """
+        Returns True if a bearer token has the API key format rather than being a JWT.
+        """
+        return token.startswith(KEY_PREFIX)
+
+    @staticmethod
+    def parse(key):
+        """
+        Splits a presented key into its ID and secret.
+
+        Parameters:
+        -----------
+        key : str
+            The full API key.
+
+        Returns:
+        --------
+        tuple or None:
+            (key_id, secret), or None if the key is malformed.
+        """
+        if not key.startswith(KEY_PREFIX):
+            return None
+        key_id, _, secret = key[len(KEY_PREFIX):].partition('_')
+        if len(key_id) != 12 or not secret:
+            return None
+        return key_id, secret
+
+    @staticmethod
+    def hash_secret(secret):
+        """
+        Returns the hexadecimal SHA-256 digest of a key secret.
+        """
+        return hashlib.sha256(secret.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def check_secret(stored_hash, secret):
+        """
+        Verifies a key secret against a stored digest in constant time.
+        """
+        return hmac.compare_digest(stored_hash, ApiKeyUtils.hash_secret(secret))
@@ -0,0 +1,241 @@
+import hashlib
+import heapq
+import mmap
+import os
+import re
+import struct
+import tempfile
+from flask import current_app
+
+_MAGIC = b'BRPWLST1'
+_HEADER = struct.Struct('>8sI4x')  # magic, prefix width, padding to 16 bytes
+_SHA1_LINE = re.compile(r'^([0-9A-Fa-f]{40})(?::\d+)?$')
+
+
+class BreachedPasswordList:
+    """
+    A read-only, memory-mapped list of breached password hashes.
+
+    The file holds a 16-byte header followed by sorted, de-duplicated SHA-1
+    prefixes of a fixed width. Lookups binary-search the mapping directly, so
+    only the few pages touched by a search are ever paged in, regardless of how
+    many entries the list contains.
+
+    Methods:
+    --------
+    contains(password):
+        Returns True if the password's SHA-1 prefix appears in the list.
+
+    build(source_path, dest_path, prefix_width=8, chunk_size=5_000_000):
+        Builds a list file from a plain text dump.
+
+    close():
+        Releases the memory mapping and the underlying file.
+    """
+
+    def __init__(self, path):
+        """
+        Opens and maps a list file created by `BreachedPasswordList.build`.
+
+        Parameters:
+        -----------
+        path : str
+            Path to the binary list file.
+
+        Raises:
+        -------
+        ValueError:
+            If the file does not have a valid header or a consistent size.
+        """
+        self._file = open(path, 'rb')
+        size = os.fstat(self._file.fileno()).st_size
+        if size < _HEADER.size:
+            self._file.close()
+            raise ValueError(f'{path} is not a breached password list')
+
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.prefix_width = _HEADER.unpack_from(self._mm, 0)
+        if magic != _MAGIC or not 1 <= self.prefix_width <= 20 \
+                or (size - _HEADER.size) % self.prefix_width:
+            self.close()
+            raise ValueError(f'{path} is not a breached password list')
+
+        self.count = (size - _HEADER.size) // self.prefix_width
+        if hasattr(self._mm, 'madvise') and hasattr(mmap, 'MADV_RANDOM'):
+            self._mm.madvise(mmap.MADV_RANDOM)  # Binary search gains nothing from readahead.
+
+    def __len__(self):
+        return self.count
+
+    def contains(self, password):
+        """
+        Checks whether a plaintext password appears in the list.
+
+        Parameters:
+        -----------
+        password : str
+            The plaintext password to look up.
+
+        Returns:
+        --------
+        bool:
+            True if the password's SHA-1 prefix is in the list, False otherwise.
+        """
+        return self.contains_digest(hashlib.sha1(password.encode('utf-8')).digest())
+
+    def contains_digest(self, digest):
+        """
+        Checks whether a raw SHA-1 digest appears in the list.
+
+        Parameters:
+        -----------
+        digest : bytes
+            The 20-byte SHA-1 digest to look up.
+
+        Returns:
+        --------
+        bool:
+            True if the digest's prefix is in the list, False otherwise.
+        """
+        width = self.prefix_width
+        key = digest[:width]
+        mm = self._mm
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            offset = _HEADER.size + mid * width
+            entry = mm[offset:offset + width]
+            if entry < key:
+                lo = mid + 1
+            elif entry > key:
+                hi = mid
+            else:
+                return True
+        return False
+
+    def close(self):
+        """
+        Releases the memory mapping and closes the file.
+        """
+        self._mm.close()
+        self._file.close()
+
+    @staticmethod
+    def build(source_path, dest_path, prefix_width=8, chunk_size=5_000_000):
+        """
+        Builds a sorted list file from a plain text dump.
+
+        Each line of the dump is either a plaintext password or a 40-character
+        hexadecimal SHA-1 hash, optionally followed by ":<count>" as in the
+        Have I Been Pwned downloads. The dump is sorted in chunks of
+        `chunk_size` entries that are spilled to temporary run files and merged,
+        so building from a dump of hundreds of millions of lines stays within a
+        bounded amount of memory.
+
+        Parameters:
+        -----------
+        source_path : str
+            Path to the plain text dump.
+        dest_path : str
+            Path of the binary list file to write.
+        prefix_width : int, optional
+            Number of SHA-1 bytes kept per entry, default is 8.
+        chunk_size : int, optional
+            Number of entries sorted in memory at once, default is 5,000,000.
+
+        Returns:
+        --------
+        int:
+            The number of distinct entries written.
+        """
+        if not 1 <= prefix_width <= 20:
+            raise ValueError('prefix_width must be between 1 and 20')
+
+        with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(dest_path))) as tmp_dir:
+            runs = []
+            chunk = []
+            with open(source_path, 'r', encoding='utf-8', errors='surrogateescape') as source:
+                for line in source:
+                    line = line.rstrip('\r\n')
+                    if not line:
+                        continue
+                    match = _SHA1_LINE.match(line)
+                    if match:
+                        digest = bytes.fromhex(match.group(1))
+                    else:
+                        digest = hashlib.sha1(line.encode('utf-8', 'surrogateescape')).digest()
+                    chunk.append(digest[:prefix_width])
+                    if len(chunk) >= chunk_size:
+                        runs.append(BreachedPasswordList._write_run(tmp_dir, chunk))
+                        chunk = []
+            if chunk or not runs:
+                runs.append(BreachedPasswordList._write_run(tmp_dir, chunk))
+
+            readers = [open(run, 'rb') for run in runs]
+            try:
+                count = 0
+                previous = None
+                tmp_dest = dest_path + '.tmp'
+                with open(tmp_dest, 'wb') as dest:
+                    dest.write(_HEADER.pack(_MAGIC, prefix_width))
+                    streams = [BreachedPasswordList._read_run(reader, prefix_width) for reader in readers]
+                    for entry in heapq.merge(*streams):
+                        if entry != previous:
+                            dest.write(entry)
+                            previous = entry
+                            count += 1
+                os.replace(tmp_dest, dest_path)  # Never leave a half-written list in place.
+            finally:
+                for reader in readers:
+                    reader.close()
+        return count
+
+    @staticmethod
+    def _write_run(tmp_dir, chunk):
+        chunk.sort()
+        fd, run_path = tempfile.mkstemp(dir=tmp_dir, suffix='.run')
+        with os.fdopen(fd, 'wb') as run:
+            run.write(b''.join(chunk))
+        return run_path
+
+    @staticmethod
+    def _read_run(reader, prefix_width):
+        buffer_size = prefix_width * 65536
+        while True:
+            block = reader.read(buffer_size)
+            if not block:
+                return
+            for offset in range(0, len(block), prefix_width):
+                yield block[offset:offset + prefix_width]
+
+
+def init_breached_passwords(app):
+    """
+    Loads the breached password list configured in BREACHED_PASSWORDS_PATH, if any.
+
+    Parameters:
+    -----------
+    app : Flask
+        The application to attach the list to.
+    """
+    path = app.config.get('BREACHED_PASSWORDS_PATH')
+    if path and os.path.exists(path):
+        app.extensions['breached_passwords'] = BreachedPasswordList(path)
+
+
+def is_breached_password(password):
+    """
+    Checks a password against the application's breached password list.
+
+    Parameters:
+    -----------
+    password : str
+        The plaintext password to check.
+
+    Returns:
+    --------
+    bool:
+        True if a list is loaded and contains the password, False otherwise.
+    """
+    breached = current_app.extensions.get('breached_passwords')
+    return breached is not None and breached.contains(password)
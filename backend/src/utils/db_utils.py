@@ -0,0 +1,35 @@
+import os
+from sqlalchemy import create_engine, make_url
+from sqlalchemy.pool import StaticPool
+
+
+def make_engine(app, uri, **options):
+    """
+    Creates an engine with the same SQLite conventions Flask-SQLAlchemy applies to its binds.
+
+    Relative SQLite paths are resolved inside the application's instance folder and
+    in-memory databases share a single connection across threads.
+
+    Parameters:
+    -----------
+    app : Flask
+        The application whose instance folder is used.
+    uri : str
+        The database URI.
+    **options :
+        Extra keyword arguments for `create_engine`.
+
+    Returns:
+    --------
+    Engine:
+        The new engine.
+    """
+    url = make_url(uri)
+    if url.drivername.startswith('sqlite'):
+        if url.database in (None, '', ':memory:'):
+            options.setdefault('poolclass', StaticPool)
+            options.setdefault('connect_args', {'check_same_thread': False})
+        elif not os.path.isabs(url.database):
+            os.makedirs(app.instance_path, exist_ok=True)
+            url = url.set(database=os.path.join(app.instance_path, url.database))
+    return create_engine(url, **options)
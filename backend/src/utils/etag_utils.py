@@ -0,0 +1,59 @@
+from flask import current_app, request
+from src.models import get_change_version
+
+
+def users_etag(*parts):
+    """
+    Builds a weak ETag for a response derived from the users table.
+
+    Parameters:
+    -----------
+    *parts : object
+        Extra values that distinguish the representation (user ID, page, ...).
+
+    Returns:
+    --------
+    str:
+        The opaque ETag value, without quotes or the weak prefix.
+    """
+    return '-'.join(['users', str(get_change_version('users'))] + [str(part) for part in parts])
+
+
+def not_modified(etag):
+    """
+    Answers a conditional GET when the client already holds the current representation.
+
+    Parameters:
+    -----------
+    etag : str
+        The current ETag of the resource.
+
+    Returns:
+    --------
+    Response or None:
+        An empty 304 response if `If-None-Match` matches the ETag, None otherwise.
+    """
+    if request.if_none_match.contains_weak(etag):
+        return with_etag(current_app.response_class(status=304), etag)
+    return None
+
+
+def with_etag(response, etag):
+    """
+    Attaches a weak ETag to a response and asks clients to revalidate before reuse.
+
+    Parameters:
+    -----------
+    response : Response
+        The response to tag.
+    etag : str
+        The ETag value.
+
+    Returns:
+    --------
+    Response:
+        The same response.
+    """
+    response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
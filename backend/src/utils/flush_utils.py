@@ -0,0 +1,99 @@
+import atexit
+import threading
+
+
+class PeriodicFlusher:
+    """
+    Base class for in-memory buffers that a background thread writes out periodically.
+
+    Subclasses implement `flush()`; the thread calls it every `flush_interval` seconds,
+    or as soon as `wake()` is called, and once more when stopped so buffered writes are
+    not lost on a clean shutdown.
+
+    Methods:
+    --------
+    flush():
+        Writes out the buffered data. Implemented by subclasses.
+
+    wake():
+        Asks the thread to flush now instead of waiting for the interval.
+
+    start():
+        Starts the background thread.
+
+    stop():
+        Stops the background thread after a final flush.
+
+    after_fork():
+        Starts a new thread in a forked child process.
+    """
+
+    thread_name = 'periodic-flusher'
+
+    def __init__(self, app, flush_interval=1.0):
+        """
+        Parameters:
+        -----------
+        app : Flask
+            The application the flushed data belongs to.
+        flush_interval : float, optional
+            Maximum seconds between flushes, default is 1.0.
+        """
+        self.app = app
+        self.flush_interval = flush_interval
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def flush(self):
+        raise NotImplementedError
+
+    def wake(self):
+        self._wakeup.set()
+
+    def start(self):
+        """
+        Starts the background thread and registers a final flush at exit.
+        """
+        if self._thread is not None:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name=self.thread_name, daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def stop(self):
+        """
+        Stops the background thread, flushing any remaining data.
+        """
+        if self._thread is None:
+            return
+        self._stopping.set()
+        self._wakeup.set()
+        self._thread.join()
+        self._thread = None
+
+    def after_fork(self):
+        """
+        Starts a new background thread in a forked child. Threads do not survive `fork()`,
+        so the parent's thread is forgotten rather than joined. The parent should stop the
+        thread before forking (see `src.lifecycle.prepare_fork`), otherwise its buffered
+        data is copied into the child and written twice.
+        """
+        self._thread = None
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self.start()
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                self.app.logger.warning('%s flush failed: %s', self.thread_name, e)
+        try:
+            self.flush()
+        except Exception as e:
+            self.app.logger.warning('Final %s flush failed: %s', self.thread_name, e)
@@ -0,0 +1,113 @@
+import dataclasses
+import decimal
+import json
+import uuid
+from datetime import date, datetime
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson  # Optional: much faster serializer, used when installed.
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+
+
+def _default(obj):
+    """
+    Serializes the types the standard library encoder does not handle.
+
+    Datetimes are written as ISO-8601 with second precision (e.g. "2024-11-05T14:03:27"),
+    the same format orjson produces with OPT_OMIT_MICROSECONDS, so responses look the same
+    whichever serializer is active.
+
+    Parameters:
+    -----------
+    obj : object
+        The value the encoder could not serialize.
+
+    Returns:
+    --------
+    object:
+        A JSON-serializable representation of the value.
+
+    Raises:
+    -------
+    TypeError:
+        If the value has no known representation.
+    """
+    if isinstance(obj, datetime):
+        return obj.isoformat(timespec='seconds')
+    if isinstance(obj, date):
+        return obj.isoformat()
+    if isinstance(obj, (decimal.Decimal, uuid.UUID)):
+        return str(obj)
+    if dataclasses.is_dataclass(obj) and not isinstance(obj, type):
+        return dataclasses.asdict(obj)
+    if hasattr(obj, '__html__'):
+        return str(obj.__html__())
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """
+    Flask JSON provider that serializes responses with orjson when it is installed,
+    falling back to the standard library otherwise.
+
+    Keys are not sorted (the payloads are built from ordered dicts already) and
+    datetimes are always rendered as ISO-8601 by `_default`.
+
+    Methods:
+    --------
+    dumps(obj, **kwargs):
+        Serializes an object to a JSON string.
+
+    loads(s, **kwargs):
+        Deserializes a JSON string or bytes.
+
+    response(*args, **kwargs):
+        Builds a JSON response, encoding straight to bytes when orjson is available.
+    """
+
+    sort_keys = False
+    default = staticmethod(_default)
+
+    def _orjson_options(self, pretty=False):
+        options = orjson.OPT_OMIT_MICROSECONDS | orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            options |= orjson.OPT_SORT_KEYS
+        if pretty:
+            options |= orjson.OPT_INDENT_2
+        return options
+
+    def dumps(self, obj, **kwargs):
+        if orjson is not None and not kwargs:
+            return orjson.dumps(obj, default=_default, option=self._orjson_options()).decode('utf-8')
+        kwargs.setdefault('default', _default)
+        kwargs.setdefault('ensure_ascii', self.ensure_ascii)
+        kwargs.setdefault('sort_keys', self.sort_keys)
+        return json.dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        if orjson is not None and not kwargs:
+            return orjson.loads(s)
+        return json.loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        if orjson is None:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        pretty = (self.compact is None and self._app.debug) or self.compact is False
+        body = orjson.dumps(obj, default=_default, option=self._orjson_options(pretty) | orjson.OPT_APPEND_NEWLINE)
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+
+def init_json_provider(app):
+    """
+    Installs FastJSONProvider as the application's JSON provider.
+
+    Parameters:
+    -----------
+    app : Flask
+        The application to configure.
+    """
+    app.json_provider_class = FastJSONProvider
+    app.json = FastJSONProvider(app)
@@ -1,5 +1,5 @@
 import jwt
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from flask import current_app
 
 def generate_jwt(user_id):
@@ -40,3 +40,39 @@ def decode_jwt(token):
         return None  # El token ha expirado
     except jwt.InvalidTokenError:
         return None  # El token no es válido
+
+def generate_scoped_token(user_id, scope, lifetime):
+    """
+    Generates a short-lived token that only opens the endpoints of one scope, e.g. the
+    admin event stream, for clients that must put it in a URL (browser EventSource
+    cannot send an Authorization header).
+
+    The user goes in 'sub' rather than 'user_id', so `decode_jwt` callers (the
+    login_required and admin_required middlewares) reject it.
+
+    Args:
+    - user_id (int): The ID of the user.
+    - scope (str): What the token is for, e.g. 'events'.
+    - lifetime (float): Seconds until it expires.
+
+    Returns:
+    - str: The token.
+    """
+    payload = {
+        'sub': str(user_id),
+        'scope': scope,
+        'exp': datetime.now(timezone.utc) + timedelta(seconds=lifetime)  # Aware: PyJWT reads naive times as UTC
+    }
+    return jwt.encode(payload, current_app.config['SECRET_KEY'], algorithm='HS256')
+
+def decode_scoped_token(token, scope):
+    """
+    Returns the user ID of a valid, unexpired token for `scope`, else None.
+    """
+    try:
+        payload = jwt.decode(token, current_app.config['SECRET_KEY'], algorithms=["HS256"])
+    except jwt.InvalidTokenError:
+        return None
+    if payload.get('scope') != scope or not str(payload.get('sub', '')).isdigit():
+        return None
+    return int(payload['sub'])
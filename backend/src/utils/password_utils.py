@@ -1,5 +1,9 @@
 import hashlib
+import hmac
 import os
+from flask import current_app, has_app_context
+
+PBKDF2_ITERATIONS = 100_000  # Production cost; stored hashes depend on it.
 
 class PasswordUtils:
     """
@@ -13,8 +17,32 @@ class PasswordUtils:
 
     check_password(stored_password_hash, password, salt):
         Verifies whether a provided password matches a stored hash using the same salt.
+
+    check_digest(stored_digest, password, salt):
+        Like check_password, for a digest and salt held as bytes.
+
+    iterations():
+        Returns the PBKDF2 iteration count to use.
     """
 
+    @staticmethod
+    def iterations():
+        """
+        Returns the PBKDF2 iteration count to use.
+
+        The PASSWORD_HASH_ITERATIONS setting is only honoured by applications with TESTING
+        enabled, so test suites can hash passwords cheaply; every other application always
+        uses PBKDF2_ITERATIONS.
+
+        Returns:
+        --------
+        int:
+            The iteration count.
+        """
+        if has_app_context() and current_app.testing:
+            return current_app.config.get('PASSWORD_HASH_ITERATIONS', PBKDF2_ITERATIONS)
+        return PBKDF2_ITERATIONS
+
     @staticmethod
     def hash_password(password, salt=None):
         """
@@ -39,7 +67,7 @@ class PasswordUtils:
         if salt is None:
             salt = os.urandom(16).hex()  # Generate a random 16-byte salt in hexadecimal format.
         return hashlib.pbkdf2_hmac(
-            'sha256', password.encode('utf-8'), salt.encode('utf-8'), 100_000
+            'sha256', password.encode('utf-8'), salt.encode('utf-8'), PasswordUtils.iterations()
         ).hex(), salt  # Return the hashed password and the salt.
 
     @staticmethod
@@ -67,3 +95,44 @@ class PasswordUtils:
         """
         hashed = PasswordUtils.hash_password(password, salt)[0]  # Hash the input password with the provided salt.
         return hashed == stored_password_hash  # Compare the newly hashed password with the stored hash.
+
+    @staticmethod
+    def check_digest(stored_digest, password, salt):
+        """
+        Validates a password against a raw digest, for callers that keep hashes as bytes.
+
+        Parameters:
+        -----------
+        stored_digest : bytes
+            The stored hash, decoded from hexadecimal.
+        password : str
+            The password to validate.
+        salt : bytes
+            The user's salt, UTF-8 encoded.
+
+        Returns:
+        --------
+        bool:
+            True if the password matches the stored digest, False otherwise.
+        """
+        digest = hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), salt, PasswordUtils.iterations())
+        return hmac.compare_digest(digest, stored_digest)
+
+
+def check_password_hash_config(app):
+    """
+    Refuses to start an application that lowers the password hashing cost outside of tests.
+
+    Parameters:
+    -----------
+    app : Flask
+        The application to check.
+
+    Raises:
+    -------
+    RuntimeError:
+        If PASSWORD_HASH_ITERATIONS is below PBKDF2_ITERATIONS and TESTING is not enabled.
+    """
+    iterations = app.config.get('PASSWORD_HASH_ITERATIONS', PBKDF2_ITERATIONS)
+    if iterations < PBKDF2_ITERATIONS and not app.testing:
+        raise RuntimeError('PASSWORD_HASH_ITERATIONS below the production cost requires TESTING')
@@ -0,0 +1,54 @@
+import contextlib
+import multiprocessing
+
+
+def shared_array(typecode, size):
+    """
+    Returns a zeroed ctypes array in memory shared with the processes forked afterwards.
+
+    The production server loads the application in its master process and forks the
+    workers from it (preload_app in gunicorn.conf.py), including the ones that replace
+    recycled workers later. Arrays created while the application is set up are
+    therefore the same memory in every worker. An application loaded separately by
+    each process (e.g. without preload_app) gets arrays of its own.
+
+    Parameters:
+    -----------
+    typecode : str
+        An `array` module type code, e.g. 'q' for 64-bit integers or 'B' for bytes.
+    size : int
+        Number of elements.
+    """
+    return multiprocessing.RawArray(typecode, size)
+
+
+class SharedLock:
+    """
+    A lock shared with the processes forked after its creation, like `shared_array`.
+
+    `hold()` gives up after `timeout` seconds instead of waiting forever, so a worker
+    killed in the middle of a critical section cannot block the others for good; the
+    caller skips its update instead.
+    """
+
+    def __init__(self, timeout=1.0):
+        """
+        Parameters:
+        -----------
+        timeout : float, optional
+            Seconds to wait for the lock, default is 1.
+        """
+        self.timeout = timeout
+        self._lock = multiprocessing.Lock()
+
+    @contextlib.contextmanager
+    def hold(self):
+        """
+        Holds the lock for the body of a `with` statement, yielding False if it timed out.
+        """
+        acquired = self._lock.acquire(timeout=self.timeout)
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                self._lock.release()
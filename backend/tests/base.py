@@ -0,0 +1,88 @@
+from flask_testing import TestCase
+from sqlalchemy import event
+from src.models import db
+
+TEST_PASSWORD_HASH_ITERATIONS = 1  # Honoured only because test apps set TESTING.
+
+
+def _enable_sqlite_savepoints(engine):
+    """
+    Lets SQLAlchemy emit BEGIN itself on SQLite. pysqlite's own transaction handling
+    does not cooperate with SAVEPOINT, which the per-test rollback relies on.
+    """
+    @event.listens_for(engine, 'connect')
+    def _connect(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(engine, 'begin')
+    def _begin(conn):
+        conn.exec_driver_sql('BEGIN')
+
+
+class DatabaseTestCase(TestCase):
+    """
+    Base class for tests that use the database.
+
+    Subclasses build their application in `make_app()`. By default the application and
+    its schema are created once per test class, and every test runs inside a transaction
+    on a single connection that is rolled back afterwards: commits made by the test or
+    the code under test only release a SAVEPOINT. Extensions a test installs on the
+    shared application are removed again after it.
+
+    Tests that need real commits, e.g. to copy the database file or to use engines other
+    than the default one, set `transactional = False`; they get a new application for
+    every test and create and drop their own schema.
+
+    Password hashing runs with TEST_PASSWORD_HASH_ITERATIONS. Since every test process
+    only uses in-memory or temporary databases, the suite can run in parallel with
+    `pytest -n auto` (pytest-xdist).
+    """
+
+    transactional = True
+
+    def make_app(self):
+        raise NotImplementedError
+
+    def create_app(self):
+        cls = type(self)
+        app = cls.__dict__.get('_app')
+        if app is not None:
+            return app
+        app = self.make_app()
+        app.config['TESTING'] = True
+        app.config['PASSWORD_HASH_ITERATIONS'] = TEST_PASSWORD_HASH_ITERATIONS
+        if cls.transactional:
+            with app.app_context():
+                _enable_sqlite_savepoints(db.engine)
+                db.create_all()
+            cls._app = app
+        return app
+
+    @classmethod
+    def tearDownClass(cls):
+        app = cls.__dict__.get('_app')
+        if app is not None:
+            with app.app_context():
+                db.engine.dispose()
+            cls._app = None
+        super().tearDownClass()
+
+    def setUp(self):
+        if not self.transactional:
+            return
+        self._extensions = dict(self.app.extensions)
+        self._connection = db.engine.connect()
+        self._transaction = self._connection.begin()
+        db.session.remove()
+        self._session_options = dict(db.session.session_factory.kw)
+        db.session.configure(bind=self._connection, join_transaction_mode='create_savepoint')
+
+    def tearDown(self):
+        if not self.transactional:
+            return
+        db.session.remove()
+        db.session.session_factory.kw = self._session_options
+        self._transaction.rollback()
+        self._connection.close()
+        self.app.extensions.clear()
+        self.app.extensions.update(self._extensions)
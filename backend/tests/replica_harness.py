@@ -0,0 +1,50 @@
+import sqlite3
+import threading
+
+
+class LaggedReplica:
+    """
+    Local stand-in for an asynchronously replicated SQLite database.
+
+    The replica file only receives the primary's contents when `sync()` is called, or every
+    `lag` seconds once `start()` has been called, so tests (and local runs pointing
+    READ_REPLICAS at the replica file) can observe replication lag deterministically.
+    Copies use sqlite3's online backup API, which is safe while both files are in use.
+    """
+
+    def __init__(self, primary_path, replica_path, lag=None):
+        self.primary_path = primary_path
+        self.replica_path = replica_path
+        self.lag = lag
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def sync(self):
+        """
+        Copies the primary's current contents to the replica.
+        """
+        source = sqlite3.connect(self.primary_path)
+        dest = sqlite3.connect(self.replica_path)
+        try:
+            source.backup(dest)
+        finally:
+            dest.close()
+            source.close()
+
+    def start(self):
+        """
+        Replicates every `lag` seconds in a background thread.
+        """
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name='lagged-replica', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._stopping.set()
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stopping.wait(self.lag):
+            self.sync()
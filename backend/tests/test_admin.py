@@ -1,15 +1,20 @@
+import json
 import unittest
 from flask import Flask, jsonify
-from flask_testing import TestCase
-from src.models import db, User
+from tests.base import DatabaseTestCase
+from src.models import db, User, ApiKey
+from src.audit import AuditLog
+from src.purge import UserPurger
+from src.events import EventHub
+from src.stats import LoginStats
 from src.routes.admin import admin_bp  # Ensure the admin blueprint is correctly imported
 from datetime import datetime, timedelta
 import jwt
 from unittest.mock import patch
 
-class TestAdminRoutes(TestCase):
+class TestAdminRoutes(DatabaseTestCase):
     
-    def create_app(self):
+    def make_app(self):
         """
         This method sets up the Flask app and configures it for testing.
         It creates an in-memory SQLite database for testing purposes.
@@ -26,9 +31,9 @@ class TestAdminRoutes(TestCase):
     def setUp(self):
         """
         This method runs before each test.
-        It initializes the database, creates a test user with admin privileges, and generates a JWT token.
+        It starts the test transaction, creates a test user with admin privileges, and generates a JWT token.
         """
-        db.create_all()
+        super().setUp()
 
         # Create a test admin user
         user = User(username='admin', password='password', is_admin=True)
@@ -41,10 +46,9 @@ class TestAdminRoutes(TestCase):
     def tearDown(self):
         """
         This method runs after each test.
-        It cleans up the database by removing all data and closing the session.
+        It rolls back everything the test wrote and closes the session.
         """
-        db.session.remove()
-        db.drop_all()
+        super().tearDown()
 
     def generate_jwt(self, user_id):
         """
@@ -63,6 +67,29 @@ class TestAdminRoutes(TestCase):
         response = self.client.get('/admin/users', headers=headers)  # Access the protected admin route
         self.assert200(response)  # Should return 200 OK status
 
+    def test_get_users_conditional(self):
+        """
+        This test checks that '/admin/users' answers a matching If-None-Match with 304
+        and sends a new ETag once the users table changes.
+        """
+        headers = {'Authorization': f'Bearer {self.token}'}
+
+        response = self.client.get('/admin/users', headers=headers)
+        etag = response.headers['ETag']
+        self.assertTrue(etag.startswith('W/'))
+
+        response = self.client.get('/admin/users', headers={**headers, 'If-None-Match': etag})
+        self.assertStatus(response, 304)
+
+        self.client.post('/admin/register', json={'username': 'new_user', 'password': 'Password1!'}, headers=headers)
+        response = self.client.get('/admin/users', headers={**headers, 'If-None-Match': etag})
+        self.assert200(response)
+        self.assertNotEqual(response.headers['ETag'], etag)
+        self.assertEqual(len(response.json), 2)
+
+        response = self.client.get('/admin/users?page=2&per_page=1', headers=headers)
+        self.assertEqual([user['username'] for user in response.json], ['new_user'])
+
     def test_register_user(self):
         """
         This test simulates the registration of a new user by an admin.
@@ -84,6 +111,20 @@ class TestAdminRoutes(TestCase):
         self.assertIsNotNone(new_user)
         self.assertEqual(new_user.username, 'new_user')
 
+    def test_register_user_breached_password(self):
+        """
+        Negative test: Attempt to register a user with a password found in the breached password list.
+        It checks if a 400 Bad Request error is returned and no user is created.
+        """
+        headers = {'Authorization': f'Bearer {self.token}'}
+
+        with patch('src.routes.admin.is_breached_password', return_value=True):
+            response = self.client.post('/admin/register', json={'username': 'new_user', 'password': 'Password1!'},
+                                        headers=headers)
+        self.assertStatus(response, 400)
+        self.assertIn('data breach', response.json['message'])
+        self.assertIsNone(User.query.filter_by(username='new_user').first())
+
     def test_change_password(self):
         """
         This test simulates changing the password of a user by an admin.
@@ -126,20 +167,41 @@ class TestAdminRoutes(TestCase):
     def test_delete_user(self):
         """
         This test simulates deleting a user by an admin.
-        It checks if the user is successfully removed from the database.
+        It checks that the user is rejected and hidden at once, and removed from the
+        database, together with its API keys, by the purger.
         """
         headers = {'Authorization': f'Bearer {self.token}'}
 
         user = User(username='user_to_delete', password='Password1!', is_admin=False)
-        db.session.add(user)
+        other = User(username='other_to_delete', password='Password1!', is_admin=False)
+        db.session.add_all([user, other])
+        db.session.commit()
+        user_id, other_id = user.id, other.id
+        db.session.add(ApiKey(key_id='deadbeef0000', key_hash='x', user_id=user_id, name='svc', scopes='read',
+                              created_at=datetime.now()))
         db.session.commit()
+        user_token = self.generate_jwt(user_id)
 
-        response = self.client.delete(f'/admin/delete_user/{user.id}', headers=headers)  # Request to delete the user
+        response = self.client.delete(f'/admin/delete_user/{user_id}', headers=headers)  # Request to delete the user
         self.assertStatus(response, 200)  # Should return status 200 (OK)
+        self.client.delete(f'/admin/delete_user/{other_id}', headers=headers)
 
         # Verify the user was deleted
-        deleted_user = User.query.get(user.id)
-        self.assertIsNone(deleted_user)
+        self.assertIsNone(User.get_active(user_id))
+        response = self.client.get('/admin/users', headers=headers)
+        self.assertEqual([row['username'] for row in response.json], ['admin'])
+        response = self.client.get('/admin/users', headers={'Authorization': f'Bearer {user_token}'})
+        self.assert403(response)
+        response = self.client.delete(f'/admin/delete_user/{user_id}', headers=headers)
+        self.assert404(response)
+
+        purger = UserPurger(self.app, batch_size=1, pause=0)
+        self.assertEqual(purger.flush(), 2)
+        db.session.expire_all()
+        self.assertIsNone(User.query.get(user_id))
+        self.assertIsNone(User.query.get(other_id))
+        self.assertEqual(ApiKey.query.filter_by(user_id=user_id).count(), 0)
+        self.assertEqual(purger.flush(), 0)
 
     def test_reset_password_user_not_found(self):
         """
@@ -173,5 +235,130 @@ class TestAdminRoutes(TestCase):
         response = self.client.post('/admin/reset_password/', headers=headers)  # Missing user ID in the URL
         self.assert404(response)  # Should return status 404 (Not Found)
 
+    def test_get_auth_events(self):
+        """
+        This test records login events in the audit buffer and queries them through the admin route.
+        It checks that only persisted events are listed, without flushing the buffer on the request,
+        and that they are filtered by user.
+        """
+        headers = {'Authorization': f'Bearer {self.token}'}
+
+        audit_log = AuditLog(self.app)
+        self.app.extensions['audit_log'] = audit_log
+        audit_log.record(1, 'admin', 'success', '127.0.0.1')
+        audit_log.record(2, 'other', 'invalid_credentials', '127.0.0.1')
+        audit_log.record(1, 'admin', 'invalid_credentials', '127.0.0.1')
+
+        response = self.client.get('/admin/auth-events?user_id=1', headers=headers)
+        self.assert200(response)
+        self.assertEqual(response.json, [])
+        self.assertEqual(len(audit_log), 3)
+        self.assertTrue(audit_log._wakeup.is_set())  # The writer thread is asked to flush
+
+        audit_log.flush()
+        response = self.client.get('/admin/auth-events?user_id=1', headers=headers)
+        self.assertEqual([event['outcome'] for event in response.json], ['invalid_credentials', 'success'])
+
+        # A negative limit would mean "no limit" to SQLite
+        response = self.client.get('/admin/auth-events?limit=-1', headers=headers)
+        self.assertEqual(len(response.json), 1)
+
+        response = self.client.get('/admin/auth-events?since=not-a-date', headers=headers)
+        self.assert400(response)
+
+    def test_event_stream(self):
+        """
+        This test checks that '/admin/events' streams account changes and ends a stream
+        that fell behind with a 'resync' event.
+        """
+        headers = {'Authorization': f'Bearer {self.token}'}
+        hub = EventHub(self.app, queue_size=2)
+        self.app.extensions['event_hub'] = hub
+
+        response = self.client.get('/admin/events', headers=headers, buffered=False)
+        self.assert200(response)
+        self.assertEqual(response.mimetype, 'text/event-stream')
+        stream = iter(response.response)
+        self.assertEqual(next(stream), b'retry: 5000\n\n')
+
+        self.client.post('/admin/register', json={'username': 'streamed', 'password': 'Password1!'}, headers=headers)
+        frame = next(stream).decode().splitlines()
+        self.assertEqual(frame[1], 'event: user.registered')
+        self.assertEqual(json.loads(frame[2][len('data: '):])['username'], 'streamed')
+
+        for user_id in (1, 2, 3):
+            hub.publish('user.deleted', {'id': user_id})
+        self.assertEqual(next(stream), b'event: resync\ndata: \n\n')
+        self.assertRaises(StopIteration, next, stream)
+        response.close()
+        self.assertEqual(len(hub), 0)
+
+    def test_event_stream_token(self):
+        """
+        This test checks that a token from '/admin/events/token' opens the event stream from
+        the query string (as EventSource must), and is not accepted anywhere else.
+        """
+        self.app.extensions['event_hub'] = EventHub(self.app)
+        response = self.client.post('/admin/events/token', headers={'Authorization': f'Bearer {self.token}'})
+        self.assert200(response)
+        stream_token = response.json['token']
+
+        response = self.client.get(f'/admin/events?token={stream_token}', buffered=False)
+        self.assert200(response)
+        self.assertEqual(next(iter(response.response)), b'retry: 5000\n\n')
+        response.close()
+
+        self.assert403(self.client.get('/admin/events?token=invalid'))
+        self.assert403(self.client.get(f'/admin/events?token={self.token}'))  # A login JWT is not a stream token
+        self.assert403(self.client.get('/admin/users', headers={'Authorization': f'Bearer {stream_token}'}))
+
+    def test_get_stats(self):
+        """
+        This test checks that '/admin/stats' reports totals maintained by the register route.
+        """
+        headers = {'Authorization': f'Bearer {self.token}'}
+
+        stats = LoginStats(self.app)
+        stats.warm()
+        self.app.extensions['login_stats'] = stats
+
+        self.client.post('/admin/register', json={'username': 'new_user', 'password': 'Password1!'}, headers=headers)
+        response = self.client.get('/admin/stats', headers=headers)
+        self.assert200(response)
+        self.assertEqual(response.json['total_users'], 2)
+        self.assertEqual(response.json['never_logged_in'], 2)
+
+    def test_api_key_lifecycle(self):
+        """
+        This test issues an admin API key, uses it in place of a JWT and revokes it.
+        It checks that the key is accepted by admin_required until it is revoked.
+        """
+        headers = {'Authorization': f'Bearer {self.token}'}
+        admin = User.query.filter_by(username='admin').first()
+
+        response = self.client.post('/admin/api-keys', headers=headers,
+                                    json={'user_id': admin.id, 'name': 'reporting', 'scopes': ['read', 'admin']})
+        self.assertStatus(response, 201)
+        key = response.json['key']
+        key_headers = {'Authorization': f'Bearer {key}'}
+
+        self.assert200(self.client.get('/admin/users', headers=key_headers))
+        # The key lacks the 'write' scope
+        self.assertStatus(self.client.delete('/admin/delete_user/999', headers=key_headers), 403)
+
+        self.client.delete(f"/admin/api-keys/{response.json['key_id']}", headers=headers)
+        response = self.client.get('/admin/users', headers=key_headers)
+        self.assertStatus(response, 403)
+        self.assertIn('revoked', response.json['message'])
+
+    def test_api_key_rejects_booleans(self):
+        """
+        This test checks that JSON booleans are not taken as a user ID or a lifetime.
+        """
+        headers = {'Authorization': f'Bearer {self.token}'}
+        for body in ({'user_id': True, 'name': 'sync'},
+                     {'user_id': User.query.filter_by(username='admin').first().id, 'name': 'sync', 'expires_in_days': True}):
+            self.assert400(self.client.post('/admin/api-keys', headers=headers, json=body))
+
 if __name__ == '__main__':
     unittest.main()
@@ -1,14 +1,15 @@
 import unittest
 from flask import Flask
-from flask_testing import TestCase
-from src.models import db, User
+from tests.base import DatabaseTestCase
+from src.models import db, User, ApiKey
+from src.utils.api_key_utils import ApiKeyUtils
 from src.routes.auth import auth_bp
 from datetime import datetime
 from src.utils.jwt_utils import generate_jwt, decode_jwt  # JWT utils
 from unittest.mock import patch
 
-class TestAuthRoutes(TestCase):
-    def create_app(self):
+class TestAuthRoutes(DatabaseTestCase):
+    def make_app(self):
         """
         Set up the Flask application for testing.
         """
@@ -23,10 +24,10 @@ class TestAuthRoutes(TestCase):
     def setUp(self):
         """
         Set up the test environment before each test.
-        - Creates an in-memory database.
+        - Starts the test transaction.
         - Adds a test user to the database with all required fields.
         """
-        db.create_all()
+        super().setUp()
 
         # Crear un usuario de prueba con el constructor adecuado
         self.user = User(
@@ -48,8 +49,7 @@ class TestAuthRoutes(TestCase):
         """
         Clean up the test environment after each test.
         """
-        db.session.remove()
-        db.drop_all()
+        super().tearDown()
 
     def generate_auth_header(self, user_id):
         """
@@ -76,6 +76,19 @@ class TestAuthRoutes(TestCase):
         self.assertEqual(response.status_code, 401)
         self.assertIn('Invalid credentials', response.json['message'])
 
+    def test_deleted_user_rejected(self):
+        """
+        Test that a deleted user can neither log in nor use a token issued before the deletion.
+        """
+        headers = self.generate_auth_header(self.user.id)
+        self.user.deleted_at = datetime.now()
+        db.session.commit()
+
+        response = self.client.post('/login', json={'username': 'testuser', 'password': 'Test1234!'})
+        self.assertEqual(response.status_code, 401)
+        response = self.client.get('/user-info', headers=headers)
+        self.assertEqual(response.status_code, 404)
+
     def test_change_password_success(self):
         """
         Test that a user can successfully change their password.
@@ -128,6 +141,36 @@ class TestAuthRoutes(TestCase):
         self.assertEqual(response.json['username'], 'testuser')
         self.assertIn('isAdmin', response.json)
 
+    def test_user_info_not_modified(self):
+        """
+        Test that user-info answers a matching If-None-Match with 304 until the user changes.
+        """
+        headers = self.generate_auth_header(self.user.id)
+        etag = self.client.get('/user-info', headers=headers).headers['ETag']
+
+        response = self.client.get('/user-info', headers={**headers, 'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+
+        self.client.post('/login', json={'username': 'testuser', 'password': 'Test1234!'})
+        response = self.client.get('/user-info', headers={**headers, 'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+
+    def test_user_info_with_api_key(self):
+        """
+        Test that a service account API key is accepted in place of a JWT.
+        """
+        key_id, key, key_hash = ApiKeyUtils.generate()
+        db.session.add(ApiKey(key_id=key_id, key_hash=key_hash, user_id=self.user.id, name='svc',
+                              scopes='read', created_at=datetime.now()))
+        db.session.commit()
+
+        response = self.client.get('/user-info', headers={'Authorization': f'Bearer {key}'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['username'], 'testuser')
+
+        response = self.client.get('/user-info', headers={'Authorization': f'Bearer {key}x'})
+        self.assertEqual(response.status_code, 401)
+
     def test_user_info_invalid_token(self):
         """
         Test that it returns an error if the token is invalid.
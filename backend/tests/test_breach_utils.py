@@ -0,0 +1,51 @@
+import hashlib
+import os
+import tempfile
+import unittest
+from src.utils.breach_utils import BreachedPasswordList
+
+
+class TestBreachedPasswordList(unittest.TestCase):
+
+    def setUp(self):
+        """
+        Writes a small dump mixing plaintext passwords and HIBP-style hash lines.
+        """
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.source = os.path.join(self.tmp_dir.name, 'dump.txt')
+        self.dest = os.path.join(self.tmp_dir.name, 'breached.bin')
+        hashed = hashlib.sha1(b'Summer2024!').hexdigest().upper()
+        with open(self.source, 'w', encoding='utf-8') as dump:
+            dump.write('Password1!\nqwerty\n\nPassword1!\n')
+            dump.write(f'{hashed}:1532\n')
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_build_and_lookup(self):
+        """
+        Built entries are de-duplicated and found by both plaintext and hash lines.
+        """
+        count = BreachedPasswordList.build(self.source, self.dest, chunk_size=2)
+        self.assertEqual(count, 3)
+
+        breached = BreachedPasswordList(self.dest)
+        try:
+            self.assertEqual(len(breached), 3)
+            self.assertTrue(breached.contains('Password1!'))
+            self.assertTrue(breached.contains('qwerty'))
+            self.assertTrue(breached.contains('Summer2024!'))
+            self.assertFalse(breached.contains('Tr0ub4dor&3-horse'))
+        finally:
+            breached.close()
+
+    def test_invalid_file(self):
+        """
+        Files without the list header are rejected.
+        """
+        with self.assertRaises(ValueError):
+            BreachedPasswordList(self.source)
+
+
+if __name__ == '__main__':
+    unittest.main()
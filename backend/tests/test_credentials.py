@@ -0,0 +1,110 @@
+import unittest
+from datetime import datetime
+from unittest.mock import patch
+from flask import Flask
+from src.models import db, User, CredentialChange
+from src.routes.auth import auth_bp
+from src.credentials import CredentialDirectory
+from tests.base import DatabaseTestCase
+
+
+class TestCredentialDirectory(DatabaseTestCase):
+
+    def make_app(self):
+        """
+        Set up a Flask application with the auth routes and an in-memory database.
+        """
+        app = Flask(__name__)
+        app.config['SECRET_KEY'] = 'test_secret_key'
+        app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+        app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+        app.config['CREDENTIAL_DIRECTORY'] = True  # Turns on the credential change log
+        app.register_blueprint(auth_bp)
+        db.init_app(app)
+        return app
+
+    def setUp(self):
+        super().setUp()
+        self.alice = User(username='alice', password='Password1!')
+        deleted = User(username='gone', password='Password1!')
+        deleted.deleted_at = datetime.now()
+        db.session.add_all([self.alice, deleted])
+        db.session.commit()
+        self.directory = CredentialDirectory(self.app)
+        self.directory.warm()
+
+    def test_warm_loads_active_users(self):
+        self.assertEqual(len(self.directory), 1)
+        self.assertIn('alice', self.directory)
+        self.assertNotIn('gone', self.directory)
+
+    def test_authenticate(self):
+        """
+        A correct password returns the user's row; failed attempts do not read the users table.
+        """
+        user_id, user = self.directory.authenticate('alice', 'Password1!')
+        self.assertEqual(user_id, self.alice.id)
+        self.assertIs(user, self.alice)
+        with patch.object(User, 'get_active') as get_active:
+            self.assertEqual(self.directory.authenticate('alice', 'Wrong1!'), (self.alice.id, None))
+            self.assertEqual(self.directory.authenticate('nobody', 'Password1!'), (None, None))
+            get_active.assert_not_called()
+
+    def test_changes_from_other_processes(self):
+        """
+        A password changed elsewhere is never accepted in its old form, and the new one
+        works once the change log has been applied.
+        """
+        self.alice.password_hash, self.alice.salt = self.alice.hash_password('NewPassword1!')
+        db.session.commit()
+
+        self.assertEqual(self.directory.authenticate('alice', 'Password1!'), (self.alice.id, None))
+        self.assertEqual(self.directory.flush(), 1)
+        self.assertIs(self.directory.authenticate('alice', 'NewPassword1!')[1], self.alice)
+
+        self.alice.deleted_at = datetime.now()
+        db.session.commit()
+        self.directory.flush()
+        self.assertNotIn('alice', self.directory)
+
+    def test_change_log_off_without_directory(self):
+        """
+        With CREDENTIAL_DIRECTORY disabled nothing reads the change log, so nothing is written to it.
+        """
+        before = CredentialChange.query.count()
+        self.app.config['CREDENTIAL_DIRECTORY'] = False
+        try:
+            db.session.add(User(username='bob', password='Password1!'))
+            db.session.commit()
+        finally:
+            self.app.config['CREDENTIAL_DIRECTORY'] = True
+        self.assertEqual(CredentialChange.query.count(), before)
+
+    def test_overflow_records(self):
+        """
+        Salts that do not round-trip through the compact layout are kept as they are.
+        """
+        self.directory.put(99, 'legacy', self.alice.hash_password('Password1!')[0].upper(), self.alice.salt.upper(),
+                           False)
+        self.assertEqual(self.directory.lookup('legacy')[2], self.alice.salt.upper().encode())
+        self.directory.put(99, 'legacy', *self.alice.hash_password('Password1!'), False)
+        self.assertEqual(self.directory.lookup('legacy')[2], self.alice.salt.encode())
+        self.assertEqual(len(self.directory), 2)
+
+    def test_login_route_uses_directory(self):
+        self.app.extensions['credential_directory'] = self.directory
+        response = self.client.post('/login', json={'username': 'alice', 'password': 'Password1!'})
+        self.assertEqual(response.status_code, 200)
+        headers = {'Authorization': f"Bearer {response.json['token']}"}
+        response = self.client.post('/login', json={'username': 'gone', 'password': 'Password1!'})
+        self.assertEqual(response.status_code, 401)
+
+        # Changes made by this process's routes apply at once, without a sync
+        response = self.client.post('/change_password', json={'new_password': 'NewPassword1!'}, headers=headers)
+        self.assertEqual(response.status_code, 200)
+        response = self.client.post('/login', json={'username': 'alice', 'password': 'NewPassword1!'})
+        self.assertEqual(response.status_code, 200)
+
+
+if __name__ == '__main__':
+    unittest.main()
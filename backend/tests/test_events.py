@@ -0,0 +1,83 @@
+import os
+import unittest
+from flask import Flask
+from src.events import EventHub, limit_subscribers
+
+
+class TestEventHub(unittest.TestCase):
+
+    def setUp(self):
+        self.hub = EventHub(Flask(__name__), queue_size=2, max_subscribers=2)
+
+    def test_publish_reaches_every_subscriber(self):
+        first, second = self.hub.subscribe(), self.hub.subscribe()
+        self.hub.publish('user.deleted', {'id': 7})
+        frame = 'id: 1\nevent: user.deleted\ndata: {"id": 7}\n\n'  # Flask's default JSON provider
+        self.assertEqual(first.get(timeout=0), frame)
+        self.assertEqual(second.get(timeout=0), frame)
+        self.assertIsNone(first.get(timeout=0))
+
+    def test_slow_subscriber_is_dropped(self):
+        """
+        A subscriber whose queue is full is removed without affecting the others.
+        """
+        slow, fast = self.hub.subscribe(), self.hub.subscribe()
+        for i in range(3):
+            self.hub.publish('user.deleted', {'id': i})
+            fast.get(timeout=0)
+        self.assertTrue(slow.dropped)
+        self.assertFalse(fast.dropped)
+        self.assertEqual(len(self.hub), 1)
+
+    def test_subscriber_limit(self):
+        subscriptions = [self.hub.subscribe(), self.hub.subscribe()]
+        self.assertIsNone(self.hub.subscribe())
+        self.hub.unsubscribe(subscriptions[0])
+        self.assertIsNotNone(self.hub.subscribe())
+
+    def test_limit_subscribers(self):
+        app = self.hub.app
+        app.extensions['event_hub'] = self.hub
+        limit_subscribers(app, 1)
+        self.assertIsNotNone(self.hub.subscribe())
+        self.assertIsNone(self.hub.subscribe())
+        limit_subscribers(app, 10)  # Never raises the configured maximum
+        self.assertEqual(self.hub.max_subscribers, 1)
+
+    @unittest.skipUnless(hasattr(os, 'fork'), 'requires fork()')
+    def test_events_from_other_processes(self):
+        """
+        Events published by another worker process reach this process's subscribers,
+        once, with the same ID; this process's own events are not delivered twice.
+        """
+        subscription = self.hub.subscribe()
+        self.hub.publish('user.deleted', {'id': 1})
+        pid = os.fork()
+        if pid == 0:
+            self.hub.publish('user.registered', {'id': 2})
+            os._exit(0)
+        os.waitpid(pid, 0)
+
+        self.assertEqual(subscription.get(timeout=0), 'id: 1\nevent: user.deleted\ndata: {"id": 1}\n\n')
+        self.assertEqual(self.hub.flush(), 1)
+        self.assertEqual(subscription.get(timeout=0), 'id: 2\nevent: user.registered\ndata: {"id": 2}\n\n')
+        self.assertEqual(self.hub.flush(), 0)
+
+    @unittest.skipUnless(hasattr(os, 'fork'), 'requires fork()')
+    def test_process_behind_the_ring_resyncs(self):
+        hub = EventHub(Flask(__name__), buffer_size=4)
+        subscription = hub.subscribe()
+        pid = os.fork()
+        if pid == 0:
+            for i in range(6):
+                hub.publish('user.deleted', {'id': i})
+            os._exit(0)
+        os.waitpid(pid, 0)
+
+        hub.flush()
+        self.assertTrue(subscription.dropped)
+        self.assertEqual(len(hub), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
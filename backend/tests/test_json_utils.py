@@ -0,0 +1,39 @@
+import unittest
+from datetime import datetime
+from unittest.mock import patch
+from flask import Flask, jsonify
+from src.utils import json_utils
+from src.utils.json_utils import init_json_provider
+
+
+class TestFastJSONProvider(unittest.TestCase):
+
+    def setUp(self):
+        """
+        Builds a bare app using the fast JSON provider.
+        """
+        self.app = Flask(__name__)
+        init_json_provider(self.app)
+        self.payload = {'id': 1, 'last_login': datetime(2024, 11, 5, 14, 3, 27, 123456)}
+
+    def test_datetime_is_iso8601(self):
+        """
+        Datetimes are serialized as ISO-8601 with second precision.
+        """
+        with self.app.app_context():
+            response = jsonify(self.payload)
+        self.assertEqual(response.get_json()['last_login'], '2024-11-05T14:03:27')
+
+    def test_stdlib_fallback_matches(self):
+        """
+        The standard library fallback produces the same document as orjson.
+        """
+        with self.app.app_context():
+            fast = jsonify(self.payload).get_json()
+            with patch.object(json_utils, 'orjson', None):
+                fallback = jsonify(self.payload).get_json()
+        self.assertEqual(fast, fallback)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+import os
+import tempfile
+import unittest
+from datetime import timedelta
+from flask import Flask
+from src.models import db, AuthEvent, CredentialChange, User
+from src.audit import init_audit_log
+from src.credentials import init_credential_directory
+from src.lifecycle import prepare_fork, reinit_after_fork, drain
+from tests.base import DatabaseTestCase
+
+
+class TestForkLifecycle(DatabaseTestCase):
+
+    transactional = False  # Parent and child processes share a file database.
+
+    def make_app(self):
+        """
+        Set up a Flask application backed by a file database, with the audit log writer.
+        """
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        app = Flask(__name__)
+        app.config['SECRET_KEY'] = 'test_secret_key'
+        app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(self.tmp_dir.name, 'db.sqlite3')}"
+        app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+        app.config['AUDIT_FLUSH_INTERVAL'] = 60
+        db.init_app(app)
+        return app
+
+    def setUp(self):
+        db.create_all()
+        self.audit_log = init_audit_log(self.app)
+
+    def tearDown(self):
+        self.audit_log.stop()
+        db.session.remove()
+        db.drop_all()
+        db.engine.dispose()
+        self.tmp_dir.cleanup()
+
+    def audit_count(self):
+        return db.session.query(AuthEvent).count()
+
+    def test_prepare_fork_flushes_and_empties_pools(self):
+        self.audit_log.record(1, 'alice', 'success')
+        self.assertEqual(self.audit_count(), 0)
+
+        prepare_fork(self.app)
+        self.assertIsNone(self.audit_log._thread)
+        self.assertEqual(db.engine.pool.checkedin(), 0)
+        self.assertEqual(self.audit_count(), 1)
+
+    @unittest.skipUnless(hasattr(os, 'fork'), 'requires fork()')
+    def test_forked_worker(self):
+        """
+        A forked worker starts its own writer, and flushes it when drained.
+        """
+        self.audit_log.record(1, 'alice', 'success')
+        prepare_fork(self.app)
+
+        pid = os.fork()
+        if pid == 0:
+            status = 1
+            try:
+                reinit_after_fork(self.app)
+                if self.audit_log._thread.is_alive():
+                    self.audit_log.record(2, 'bob', 'failure')
+                    drain(self.app)
+                    status = 0
+            finally:
+                os._exit(status)
+        _, status = os.waitpid(pid, 0)
+        self.assertEqual(os.waitstatus_to_exitcode(status), 0)
+        self.assertEqual(self.audit_count(), 2)  # The parent's entry was not written again.
+
+    @unittest.skipUnless(hasattr(os, 'fork'), 'requires fork()')
+    def test_recycled_worker_reloads_credentials(self):
+        """
+        A worker forked long after the parent loaded its credential directory, once the
+        change log has been pruned, still knows the users registered in the meantime.
+        """
+        self.app.config['CREDENTIAL_DIRECTORY'] = True
+        directory = init_credential_directory(self.app)
+        prepare_fork(self.app)
+
+        # Registered by another worker two hours later; the log entry is pruned since.
+        db.session.add(User(username='bob', password='Password1!'))
+        db.session.commit()
+        db.session.query(CredentialChange).delete()
+        db.session.commit()
+        db.session.remove()
+        directory._synced_at -= timedelta(hours=2)
+
+        pid = os.fork()
+        if pid == 0:
+            status = 1
+            try:
+                reinit_after_fork(self.app)
+                with self.app.app_context():
+                    if directory.authenticate('bob', 'Password1!')[1] is not None:
+                        status = 0
+                drain(self.app)
+            finally:
+                os._exit(status)
+        _, status = os.waitpid(pid, 0)
+        self.assertEqual(os.waitstatus_to_exitcode(status), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
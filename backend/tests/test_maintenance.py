@@ -0,0 +1,148 @@
+import fcntl
+import os
+import sqlite3
+import tempfile
+import threading
+import unittest
+from flask import Flask
+from sqlalchemy import create_engine, delete, insert
+from src.models import db, User
+from src.routes.admin import admin_bp
+from src.maintenance import MaintenanceScheduler, init_maintenance
+from src.utils.jwt_utils import generate_jwt
+from tests.base import DatabaseTestCase
+
+
+class TestMaintenanceScheduler(DatabaseTestCase):
+
+    transactional = False  # Maintenance runs on file databases, outside any test transaction.
+
+    def make_app(self):
+        """
+        Set up a Flask application with the admin routes, a file database and the
+        maintenance scheduler (whose own thread waits an hour before its first pass).
+        """
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        app = Flask(__name__, instance_path=os.path.join(self.tmp_dir.name, 'instance'))
+        app.config['SECRET_KEY'] = 'test_secret_key'
+        app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(self.tmp_dir.name, 'db.sqlite3')}"
+        app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+        app.config['MAINTENANCE_INTERVAL'] = 3600
+        app.register_blueprint(admin_bp, url_prefix='/admin')
+        db.init_app(app)
+        init_maintenance(app)
+        return app
+
+    def setUp(self):
+        db.create_all()
+        self.scheduler = self.app.extensions['sqlite_maintenance']
+        admin = User(username='admin', password='Password1!', is_admin=True)
+        db.session.add(admin)
+        db.session.commit()
+        self.headers = {'Authorization': f'Bearer {generate_jwt(admin.id)}'}
+
+        # Leave about a thousand free pages behind, as a bulk purge would.
+        table = User.__table__
+        db.session.execute(insert(table), [
+            {'id': i, 'username': f'user{i}', 'password_hash': os.urandom(32).hex(), 'salt': os.urandom(16).hex()}
+            for i in range(2, 20_002)
+        ])
+        db.session.commit()
+        db.session.execute(delete(table).where(table.c.id > 1))
+        db.session.commit()
+        db.session.remove()
+
+    def tearDown(self):
+        self.scheduler.stop()
+        db.session.remove()
+        db.drop_all()
+        db.engine.dispose()
+        self.tmp_dir.cleanup()
+
+    def make_scheduler(self, **options):
+        return MaintenanceScheduler(self.app, pause=0, **options)
+
+    def test_new_databases_use_incremental_vacuum(self):
+        run = self.make_scheduler(step_pages=100).flush()
+        figures = run['databases']['default']
+        self.assertEqual(run['outcome'], 'completed')
+        self.assertEqual(figures['auto_vacuum'], 'incremental')
+        self.assertTrue(figures['analyzed'])
+        self.assertGreater(figures['vacuumed_pages'], 500)
+        self.assertEqual(figures['freelist_count'], 0)
+        self.assertGreater(run['steps'], 5)  # One step per 100 pages.
+
+    def test_backs_off_while_requests_are_in_progress(self):
+        scheduler = self.make_scheduler()
+        scheduler.request_started()
+        run = scheduler.flush()
+        self.assertEqual(run['outcome'], 'deferred')
+        self.assertEqual(run['steps'], 0)
+        self.assertGreater(run['databases']['default']['freelist_count'], 500)
+
+        scheduler.request_finished()
+        self.assertEqual(scheduler.flush()['outcome'], 'completed')
+
+    def test_time_budget(self):
+        run = self.make_scheduler(budget=0).flush()
+        self.assertEqual(run['outcome'], 'deferred')
+        self.assertEqual(run['reason'], 'time budget exhausted')
+
+    def test_one_process_runs_each_pass(self):
+        """
+        Schedulers of other worker processes skip a pass that is running or just ran.
+        """
+        lock_file = f"{db.engine.url.database}-maintenance.lock"
+        with open(lock_file, 'a') as other_worker:
+            fcntl.flock(other_worker, fcntl.LOCK_EX)
+            run = self.make_scheduler().flush()
+        self.assertEqual((run['outcome'], run['reason']), ('skipped', 'another process is running maintenance'))
+
+        self.assertEqual(self.make_scheduler().flush()['outcome'], 'completed')
+        run = self.make_scheduler().flush()
+        self.assertEqual((run['outcome'], run['reason']), ('skipped', 'another process ran maintenance recently'))
+
+    def test_lock_file_without_database_path(self):
+        """
+        In-memory and relative database paths put the lock file in the instance folder.
+        """
+        scheduler = self.make_scheduler()
+        expected = os.path.join(self.app.instance_path, 'maintenance.lock')
+        for uri in ('sqlite://', 'sqlite:///:memory:', 'sqlite:///relative.db'):
+            lock = scheduler._claim_pass(create_engine(uri))
+            self.assertEqual(lock.name, expected)
+            scheduler._release_pass(lock, record=False)
+        self.assertEqual(scheduler._lock_path(db.engine), f'{db.engine.url.database}-maintenance.lock')
+
+    def test_backs_off_when_other_processes_write(self):
+        """
+        A database locked or written to by another connection defers the pass, without waiting.
+        """
+        other = sqlite3.connect(db.engine.url.database, isolation_level=None, check_same_thread=False)
+        other.execute('BEGIN IMMEDIATE')
+        run = self.make_scheduler().flush()
+        other.execute('ROLLBACK')
+        self.assertEqual((run['outcome'], run['reason']), ('deferred', 'database locked by another connection'))
+        self.assertLess(run['duration'], 1)
+
+        writer = threading.Timer(0.05, other.execute, ["UPDATE user SET last_login = CURRENT_TIMESTAMP"])
+        writer.start()
+        run = MaintenanceScheduler(self.app, pause=0.5, step_pages=100).flush()
+        writer.join()
+        other.close()
+        self.assertEqual((run['outcome'], run['reason']), ('deferred', 'other connections are writing'))
+
+    def test_report_endpoint(self):
+        self.scheduler.flush()
+        response = self.client.get('/admin/maintenance', headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        report = response.json
+        self.assertEqual(report['active_requests'], 1)  # The report's own request.
+        self.assertEqual(report['databases']['default']['freelist_count'], 0)
+        self.assertEqual(len(report['runs']), 1)
+        self.assertIn('duration', report['runs'][0])
+        self.assertEqual(self.scheduler.active_requests, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
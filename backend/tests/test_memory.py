@@ -0,0 +1,197 @@
+import gc
+import json
+import os
+import tempfile
+import tracemalloc
+import unittest
+import warnings
+from datetime import datetime, timedelta
+from flask import Flask
+from sqlalchemy import insert
+from src.models import db, User
+from src.routes.admin import admin_bp
+from src.routes.auth import auth_bp
+from src.credentials import CredentialDirectory
+from src.utils.jwt_utils import generate_jwt
+from src.utils.password_utils import PasswordUtils
+from tests.base import TEST_PASSWORD_HASH_ITERATIONS
+
+# Set MEMORY_TESTS=1 to run, or MEMORY_TESTS=record to rewrite the budgets from this run.
+MODE = os.environ.get('MEMORY_TESTS', '')
+USERS = int(os.environ.get('MEMORY_TEST_USERS', 100_000))
+BUDGETS_PATH = os.path.join(os.path.dirname(__file__), 'memory_budgets.json')
+HEADROOM = 1.25  # Budgets are recorded this much above the measured figures,
+MIN_BUDGET = 256 * 1024  # and no lower than this (or 2 bytes per user), to absorb allocator noise.
+BURST = 1000  # Requests per burst test.
+
+
+@unittest.skipUnless(MODE, 'set MEMORY_TESTS=1 to run the memory regression suite')
+class TestMemoryBudgets(unittest.TestCase):
+    """
+    Memory regression suite for the code paths whose cost grows with the number of users.
+
+    The users table of a temporary SQLite database is seeded with MEMORY_TEST_USERS users
+    (100,000 by default; budgets are per user where a path is expected to scale with the
+    table, so they also hold at 1M). Each path is run once to warm SQLAlchemy's caches and
+    then measured with tracemalloc: `peak` is the highest traced memory while it runs and
+    `retained` what is still allocated after its result is dropped. A path that exceeds
+    its budget in tests/memory_budgets.json fails and prints its top allocation sites.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp_dir = tempfile.TemporaryDirectory()
+        app = Flask(__name__)
+        app.config['SECRET_KEY'] = 'test_secret_key'
+        app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(cls.tmp_dir.name, 'users.sqlite3')}"
+        app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+        app.config['TESTING'] = True
+        app.config['PASSWORD_HASH_ITERATIONS'] = TEST_PASSWORD_HASH_ITERATIONS
+        app.register_blueprint(auth_bp, url_prefix='/auth')
+        app.register_blueprint(admin_bp, url_prefix='/admin')
+        db.init_app(app)
+        cls.app = app
+
+        with app.app_context():
+            db.create_all()
+            password_hash, salt = PasswordUtils.hash_password('Password1!', 'a' * 32)
+            start = datetime(2024, 1, 1)
+            for first in range(1, USERS + 1, 50_000):
+                db.session.execute(insert(User.__table__), [
+                    {'id': i, 'username': f'user{i:07d}', 'password_hash': password_hash, 'salt': salt,
+                     'is_admin': i == 1, 'last_login': start + timedelta(seconds=i) if i % 3 else None}
+                    for i in range(first, min(first + 50_000, USERS + 1))
+                ])
+            db.session.commit()
+            db.session.remove()
+            cls.headers = {'Authorization': f'Bearer {generate_jwt(1)}'}
+
+        cls.client = app.test_client()
+        with open(BUDGETS_PATH) as f:
+            cls.budgets = json.load(f)
+        cls.measured = {}
+
+    @classmethod
+    def tearDownClass(cls):
+        if MODE == 'record' and cls.measured:
+            budgets = {**cls.budgets, **cls.measured}
+            with open(BUDGETS_PATH, 'w') as f:
+                json.dump(budgets, f, indent=2, sort_keys=True)
+                f.write('\n')
+        with cls.app.app_context():
+            db.engine.dispose()
+        cls.tmp_dir.cleanup()
+
+    def measure(self, name, operation, per_user):
+        """
+        Runs `operation` under tracemalloc and checks its peak and retained memory.
+
+        Parameters:
+        -----------
+        name : str
+            The path's key in the budgets file.
+        operation : callable
+            Runs the path and returns whatever it produced.
+        per_user : bool
+            Whether the budget is per seeded user instead of absolute.
+        """
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')  # Recorded warnings would count as retained memory.
+            operation()  # Warm-up: statement caches and lazy imports are not regressions.
+            gc.collect()
+            tracemalloc.start(10)
+            baseline = tracemalloc.take_snapshot()
+            result = operation()
+            _, peak = tracemalloc.get_traced_memory()
+            held = tracemalloc.take_snapshot()
+            del result
+            gc.collect()
+            retained, _ = tracemalloc.get_traced_memory()
+            after = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+
+        scale = USERS if per_user else 1
+        figures = {'peak': peak / scale, 'retained': max(retained, 0) / scale}
+        if MODE == 'record':
+            floor = 2 if per_user else MIN_BUDGET
+            self.measured[name] = {'per_user': per_user,
+                                   **{key: round(max(value * HEADROOM, floor), 1) for key, value in figures.items()}}
+            return
+        budget = self.budgets[name]
+        self.assertEqual(budget['per_user'], per_user)
+        for key, snapshot in (('peak', held), ('retained', after)):
+            if figures[key] > budget[key]:
+                unit = ' per user' if per_user else ''
+                self.fail(f'{name}: {key} {figures[key]:,.1f} B{unit} exceeds the budget of {budget[key]:,.1f} B{unit}\n'
+                          + top_allocations(snapshot, baseline))
+
+    def test_list_all_users(self):
+        self.measure('list_all_users', lambda: self.client.get('/admin/users', headers=self.headers), per_user=True)
+
+    def test_list_users_page(self):
+        url = f'/admin/users?page={USERS // 2000}&per_page=1000'
+        self.measure('list_users_page', lambda: self.client.get(url, headers=self.headers), per_user=False)
+
+    def test_export_users(self):
+        """
+        Walking every user with keyset pages, as an export client would, keeps one page in memory.
+        """
+        def export():
+            count, after_id = 0, 0
+            while True:
+                page = self.client.get(f'/admin/users?after_id={after_id}&per_page=1000', headers=self.headers).json
+                if not page:
+                    return count
+                count += len(page)
+                after_id = page[-1]['id']
+
+        self.measure('export_users', export, per_user=False)
+
+    def test_bulk_registration(self):
+        batches = iter(range(1_000_000))
+
+        def register():
+            batch = next(batches)
+            for i in range(BURST):
+                response = self.client.post('/admin/register', headers=self.headers,
+                                            json={'username': f'bulk{batch}_{i}', 'password': 'Password1!'})
+                self.assertEqual(response.status_code, 201)
+
+        self.measure('bulk_registration', register, per_user=False)
+
+    def login_burst(self):
+        for i in range(BURST):
+            password = 'Password1!' if i % 2 else 'Wrong1!'
+            self.client.post('/auth/login', json={'username': f'user{i * 37 % USERS + 1:07d}', 'password': password})
+
+    def test_login_burst(self):
+        self.measure('login_burst', self.login_burst, per_user=False)
+
+    def test_login_burst_with_credential_directory(self):
+        def warm():
+            directory = CredentialDirectory(self.app)
+            directory.warm()
+            return directory
+
+        # The directory is meant to stay resident: its size shows up as the warm-up's peak.
+        self.measure('credential_directory_warm', warm, per_user=True)
+        self.app.extensions['credential_directory'] = warm()
+        try:
+            self.measure('login_burst_directory', self.login_burst, per_user=False)
+        finally:
+            del self.app.extensions['credential_directory']
+
+
+def top_allocations(snapshot, baseline, limit=10):
+    """
+    Formats the allocation sites that grew the most between two snapshots.
+    """
+    lines = ['Top allocation sites:']
+    for stat in snapshot.compare_to(baseline, 'traceback')[:limit]:
+        lines.append(f'  {stat.size_diff / 1024:10,.1f} KiB  {stat.count_diff:8,} blocks')
+        lines.extend(f'      {frame.filename}:{frame.lineno}' for frame in reversed(stat.traceback[-4:]))
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    unittest.main()
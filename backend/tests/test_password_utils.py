@@ -0,0 +1,33 @@
+import unittest
+from flask import Flask
+from src.utils.password_utils import PasswordUtils, PBKDF2_ITERATIONS, check_password_hash_config
+
+
+class TestPasswordHashCost(unittest.TestCase):
+
+    def make_app(self, testing):
+        app = Flask(__name__)
+        app.config['TESTING'] = testing
+        app.config['PASSWORD_HASH_ITERATIONS'] = 1
+        return app
+
+    def test_reduced_cost_only_applies_when_testing(self):
+        """
+        PASSWORD_HASH_ITERATIONS is ignored outside of test applications.
+        """
+        with self.make_app(testing=True).app_context():
+            self.assertEqual(PasswordUtils.iterations(), 1)
+            cheap = PasswordUtils.hash_password('Password1!', 'salt')[0]
+        with self.make_app(testing=False).app_context():
+            self.assertEqual(PasswordUtils.iterations(), PBKDF2_ITERATIONS)
+            self.assertNotEqual(PasswordUtils.hash_password('Password1!', 'salt')[0], cheap)
+        self.assertEqual(PasswordUtils.iterations(), PBKDF2_ITERATIONS)
+
+    def test_startup_check_rejects_reduced_cost(self):
+        check_password_hash_config(self.make_app(testing=True))
+        with self.assertRaises(RuntimeError):
+            check_password_hash_config(self.make_app(testing=False))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+import os
+import tempfile
+import unittest
+from flask import Flask
+from tests.base import DatabaseTestCase
+from src.models import db, User
+from src.routes.auth import auth_bp
+from src.replicas import init_read_replicas
+from src.utils.jwt_utils import generate_jwt
+from tests.replica_harness import LaggedReplica
+
+
+class TestReadReplicas(DatabaseTestCase):
+
+    transactional = False  # The harness copies committed data to the replica file.
+
+    def make_app(self):
+        """
+        Set up a Flask application backed by a file database and a lagging replica of it.
+        """
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        primary = os.path.join(self.tmp_dir.name, 'primary.sqlite3')
+        replica = os.path.join(self.tmp_dir.name, 'replica.sqlite3')
+        self.harness = LaggedReplica(primary, replica)
+
+        app = Flask(__name__)
+        app.config['SECRET_KEY'] = 'test_secret_key'
+        app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{primary}'
+        app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+        app.config['READ_REPLICAS'] = {'default': [f'sqlite:///{replica}']}
+        app.register_blueprint(auth_bp)
+        db.init_app(app)
+        init_read_replicas(app)
+        return app
+
+    def setUp(self):
+        db.create_all()
+        self.user = User(username='testuser', password='Test1234!')
+        db.session.add(self.user)
+        db.session.commit()
+        self.harness.sync()
+        self.router = self.app.extensions['read_replicas']
+        self.router._sticky[:] = [0.0] * len(self.router._sticky)
+        self.user_id = self.user.id
+        self.headers = {'Authorization': f'Bearer {generate_jwt(self.user_id)}'}
+
+    def tearDown(self):
+        self.app.extensions['read_replicas'].stop()
+        db.session.remove()
+        db.drop_all()
+        db.engine.dispose()
+        self.tmp_dir.cleanup()
+
+    def promote_user(self):
+        self.user.is_admin = True
+        db.session.commit()
+        db.session.remove()
+
+    def test_reads_follow_replica_lag(self):
+        """
+        Once the sticky window is over, read-only routes see the replica's stale data until it syncs.
+        """
+        self.promote_user()
+        self.router._sticky[:] = [0.0] * len(self.router._sticky)
+        self.assertFalse(self.client.get('/user-info', headers=self.headers).json['isAdmin'])
+
+        self.harness.sync()
+        self.assertTrue(self.client.get('/user-info', headers=self.headers).json['isAdmin'])
+
+    def test_read_your_writes(self):
+        """
+        A user whose row was just written reads from the primary.
+        """
+        self.promote_user()
+        self.assertTrue(self.router.is_sticky(self.user_id))
+        self.assertTrue(self.client.get('/user-info', headers=self.headers).json['isAdmin'])
+
+    @unittest.skipUnless(hasattr(os, 'fork'), 'requires fork()')
+    def test_read_your_writes_across_workers(self):
+        """
+        A write handled by one worker process pins the user to the primary in the others.
+        """
+        self.router._sticky[:] = [0.0] * len(self.router._sticky)
+        pid = os.fork()
+        if pid == 0:
+            self.router.mark_written([self.user_id])
+            os._exit(0)
+        os.waitpid(pid, 0)
+        self.assertTrue(self.router.is_sticky(self.user_id))
+
+    def test_unhealthy_replica_falls_back_to_primary(self):
+        """
+        A replica that failed its last background health check is skipped.
+        """
+        self.router.stop()
+        self.app.config['READ_REPLICAS'] = {'default': ['sqlite:////nonexistent/dir/replica.sqlite3']}
+        init_read_replicas(self.app)
+        router = self.app.extensions['read_replicas']
+        router.flush()
+        self.assertFalse(router.replicas['default'][0].healthy)
+        self.promote_user()
+        router._sticky[:] = [0.0] * len(router._sticky)
+        self.assertTrue(self.client.get('/user-info', headers=self.headers).json['isAdmin'])
+
+
+if __name__ == '__main__':
+    unittest.main()
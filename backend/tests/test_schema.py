@@ -0,0 +1,76 @@
+import os
+import tempfile
+import unittest
+from flask import Flask
+from sqlalchemy import inspect, text
+from src.models import db, User
+from src.schema import ensure_schema
+from src.stats import init_login_stats
+from tests.base import DatabaseTestCase
+
+# The users table as created before any of the later features existed.
+BASELINE_USER_TABLE = """
+CREATE TABLE user (
+    id INTEGER NOT NULL,
+    username VARCHAR(150) NOT NULL,
+    password_hash VARCHAR(255) NOT NULL,
+    salt VARCHAR(64) NOT NULL,
+    last_login DATETIME,
+    is_admin BOOLEAN,
+    PRIMARY KEY (id),
+    UNIQUE (username)
+)
+"""
+
+
+class TestEnsureSchema(DatabaseTestCase):
+
+    transactional = False  # The test starts from a database created outside the models.
+
+    def make_app(self):
+        """
+        Set up a Flask application whose file database only has the original users table.
+        """
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        app = Flask(__name__)
+        app.config['SECRET_KEY'] = 'test_secret_key'
+        app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(self.tmp_dir.name, 'db.sqlite3')}"
+        app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+        db.init_app(app)
+        return app
+
+    def setUp(self):
+        with db.engine.begin() as conn:
+            conn.execute(text(BASELINE_USER_TABLE))
+            conn.execute(text("INSERT INTO user VALUES (1, 'legacy', 'ab', 'cd', NULL, 0)"))
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        db.engine.dispose()
+        self.tmp_dir.cleanup()
+
+    def test_creates_missing_tables(self):
+        ensure_schema(self.app)
+        tables = set(inspect(db.engine).get_table_names())
+        self.assertTrue({'user', 'auth_events', 'api_keys', 'credential_changes'} <= tables)
+
+    def test_upgrades_users_table(self):
+        """
+        A users table from before soft deletes gets the column and indexes, keeps its
+        rows, and the startup queries work on it.
+        """
+        ensure_schema(self.app)
+        columns = {column['name'] for column in inspect(db.engine).get_columns('user')}
+        indexes = {index['name'] for index in inspect(db.engine).get_indexes('user')}
+        self.assertIn('deleted_at', columns)
+        self.assertTrue({'ix_user_active', 'ix_user_deleted'} <= indexes)
+
+        with self.app.app_context():
+            self.assertEqual(User.get_active(1).username, 'legacy')
+        self.assertEqual(init_login_stats(self.app).snapshot()['total_users'], 1)
+        ensure_schema(self.app)  # Nothing left to do the second time.
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,193 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime
+from flask import Flask
+from tests.base import DatabaseTestCase
+from sqlalchemy import create_engine, insert, not_, or_, select
+from src.models import db, User, ApiKey, AuthEvent
+from src.sharding import (init_user_shards, list_users, count_users,
+                          rebalance_users, username_bucket, id_bucket, jump_hash)
+
+
+class TestShardedUsers(DatabaseTestCase):
+
+    transactional = False  # Users live on the shard engines, outside the test transaction.
+
+    def make_app(self):
+        """
+        Set up a Flask application whose users are spread over three in-memory shards.
+        """
+        app = Flask(__name__)
+        app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+        app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+        app.config['USER_SHARDS'] = ['sqlite:///:memory:'] * 3
+        db.init_app(app)
+        init_user_shards(app)
+        return app
+
+    def setUp(self):
+        db.create_all()
+        self.usernames = [f'user{i}' for i in range(12)]
+        db.session.add_all([User(username=name, password='Password1!') for name in self.usernames])
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        for engine in self.app.extensions['user_shards'].engines.values():
+            User.__table__.drop(engine)
+
+    def shard_rows(self, key):
+        with self.app.extensions['user_shards'].engines[key].connect() as conn:
+            return conn.execute(select(User.__table__.c.id, User.__table__.c.username)).all()
+
+    def test_users_stored_on_their_shard(self):
+        """
+        Every user lands on exactly one shard, with an ID inside their username's bucket.
+        """
+        shard_map = self.app.extensions['user_shards']
+        seen = []
+        for key in shard_map.keys:
+            for user_id, username in self.shard_rows(key):
+                self.assertEqual(shard_map.for_username(username), key)
+                self.assertEqual(id_bucket(user_id), username_bucket(username))
+                seen.append(username)
+        self.assertEqual(sorted(seen), sorted(self.usernames))
+        self.assertEqual(count_users(), 12)
+
+    def test_lookup_update_and_delete_are_routed(self):
+        """
+        Lookups by username and ID, updates and deletes reach the user's shard.
+        """
+        user = User.query.filter_by(username='user3').first()
+        user_id = user.id
+        db.session.remove()
+
+        user = User.query.get(user_id)
+        self.assertEqual(user.username, 'user3')
+        user.is_admin = True
+        db.session.commit()
+        db.session.remove()
+        self.assertTrue(User.query.get(user_id).is_admin)
+
+        db.session.delete(User.query.get(user_id))
+        db.session.commit()
+        self.assertIsNone(User.query.filter_by(username='user3').first())
+        self.assertEqual(count_users(), 11)
+
+    def test_list_users_merges_pages(self):
+        """
+        Fan-out pagination returns the same pages as sorting every user by ID.
+        """
+        expected = sorted(user_id for key in self.app.extensions['user_shards'].keys
+                          for user_id, _ in self.shard_rows(key))
+        pages = [[row.id for row in list_users([User.id], page=page, per_page=7)] for page in range(1, 6)]
+        self.assertEqual(sum(pages, []), expected)
+        after = [row.id for row in list_users([User.id], page=1, per_page=3, after_id=expected[5])]
+        self.assertEqual(after, expected[6:9])
+
+    def test_or_and_not_are_not_routed(self):
+        """
+        Only comparisons every row must satisfy pick a shard; OR and NOT terms fan out.
+        """
+        users = User.query.filter(or_(User.username == 'user1', User.username == 'user2')).all()
+        self.assertEqual(sorted(user.username for user in users), ['user1', 'user2'])
+        self.assertEqual(len(User.query.filter(not_(User.username == 'user1')).all()), 11)
+        user = User.query.filter(User.username == 'user4', or_(User.is_admin.is_(False), User.id == 0)).one()
+        self.assertEqual(user.username, 'user4')
+
+    def add_legacy_user(self, username, user_id=1, password_hash='x'):
+        with db.engines[None].begin() as conn:
+            conn.execute(insert(User.__table__), [
+                {'id': user_id, 'username': username, 'password_hash': password_hash, 'salt': 'y', 'is_admin': False},
+            ])
+            conn.execute(insert(AuthEvent.__table__), [
+                {'user_id': user_id, 'username': username, 'outcome': 'success', 'created_at': datetime.now()},
+            ])
+
+    def event_user_ids(self):
+        with db.engines[None].connect() as conn:
+            return conn.execute(select(AuthEvent.__table__.c.user_id)).scalars().all()
+
+    def test_rebalance_moves_legacy_users(self):
+        """
+        Users left in the unsharded database are moved to their shard with a new ID, and
+        their login events and API keys follow.
+        """
+        self.add_legacy_user('legacy')
+        with db.engines[None].begin() as conn:
+            conn.execute(insert(ApiKey.__table__), [
+                {'key_id': 'k1', 'key_hash': 'h', 'user_id': 1, 'name': 'sync', 'scopes': 'read', 'created_at': datetime.now()},
+            ])
+        counts = rebalance_users(self.app, log=lambda message: None)
+        self.assertEqual(counts['moved'], 1)
+        self.assertEqual(counts['renumbered'], 1)
+        user = User.query.filter_by(username='legacy').first()
+        self.assertEqual(id_bucket(user.id), username_bucket('legacy'))
+        self.assertEqual(count_users(), 13)
+        self.assertEqual(self.event_user_ids(), [user.id])
+        with db.engines[None].connect() as conn:
+            self.assertEqual(conn.execute(select(ApiKey.__table__.c.user_id)).scalar(), user.id)
+
+    def test_rebalance_finishes_interrupted_move(self):
+        """
+        A user already copied to their shard by an interrupted run is removed from the source.
+        """
+        self.add_legacy_user('legacy')
+        copy_id = (username_bucket('legacy') << 40) + 1
+        shard = self.app.extensions['user_shards'].for_username('legacy')
+        with self.app.extensions['user_shards'].engines[shard].begin() as conn:
+            conn.execute(insert(User.__table__), [
+                {'id': copy_id, 'username': 'legacy', 'password_hash': 'x', 'salt': 'y', 'is_admin': False},
+            ])
+        counts = rebalance_users(self.app, log=lambda message: None)
+        self.assertEqual((counts['moved'], counts['conflicts']), (1, 0))
+        self.assertEqual(count_users(), 13)
+        self.assertEqual(self.event_user_ids(), [copy_id])
+
+    def test_rebalance_keeps_conflicting_users(self):
+        """
+        A legacy user whose username belongs to a different user on the shard is not deleted.
+        """
+        self.add_legacy_user('user3', password_hash='legacy admin hash')
+        messages = []
+        counts = rebalance_users(self.app, log=messages.append)
+        self.assertEqual((counts['moved'], counts['conflicts']), (0, 1))
+        self.assertTrue(any("kept user 1 ('user3')" in message for message in messages))
+        with db.engines[None].connect() as conn:
+            self.assertEqual(conn.execute(select(User.__table__.c.password_hash)).scalars().all(), ['legacy admin hash'])
+        self.assertEqual(self.event_user_ids(), [1])
+
+    def test_rebalance_drains_extra_sources(self):
+        """
+        Users in a database given as an extra source are moved to their shard.
+        """
+        with tempfile.TemporaryDirectory() as tmp:
+            uri = 'sqlite:///' + os.path.join(tmp, 'legacy.db')
+            source = create_engine(uri)
+            User.__table__.create(source)
+            with source.begin() as conn:
+                conn.execute(insert(User.__table__), [
+                    {'id': 7, 'username': 'legacy', 'password_hash': 'x', 'salt': 'y', 'is_admin': False},
+                ])
+            counts = rebalance_users(self.app, extra_sources=[uri], log=lambda message: None)
+            self.assertEqual((counts['moved'], counts['renumbered']), (1, 1))
+            with source.connect() as conn:
+                self.assertEqual(conn.execute(select(User.__table__.c.id)).all(), [])
+            source.dispose()
+        user = User.query.filter_by(username='legacy').first()
+        self.assertEqual(id_bucket(user.id), username_bucket('legacy'))
+        self.assertEqual(count_users(), 13)
+
+    def test_jump_hash_moves_few_buckets(self):
+        """
+        Adding a fourth shard only reassigns buckets to the new shard.
+        """
+        moved = [bucket for bucket in range(256) if jump_hash(bucket, 3) != jump_hash(bucket, 4)]
+        self.assertTrue(all(jump_hash(bucket, 4) == 3 for bucket in moved))
+        self.assertLess(len(moved), 256 // 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,133 @@
+import os
+import unittest
+from unittest import mock
+from datetime import datetime, timedelta
+from flask import Flask
+from tests.base import DatabaseTestCase
+from src.models import db, User
+from src.stats import LoginStats
+from src.utils.hll import HyperLogLog
+
+
+class TestHyperLogLog(unittest.TestCase):
+
+    def test_estimate_within_error(self):
+        """
+        Estimates stay within a few percent of the true distinct count.
+        """
+        sketch = HyperLogLog()
+        for i in range(50_000):
+            sketch.add(i)
+            sketch.add(i)  # Duplicates must not change the estimate.
+        self.assertAlmostEqual(sketch.count(), 50_000, delta=50_000 * 0.05)
+
+    def test_union(self):
+        """
+        The union of overlapping sketches counts the shared values once.
+        """
+        first, second = HyperLogLog(), HyperLogLog()
+        for i in range(1000):
+            first.add(i)
+            second.add(i + 500)
+        self.assertAlmostEqual(HyperLogLog.union([first, second]).count(), 1500, delta=1500 * 0.05)
+
+    def test_copy_is_independent(self):
+        sketch = HyperLogLog()
+        sketch.add('a')
+        copy = sketch.copy()
+        sketch.add('b')
+        self.assertEqual((sketch.count(), copy.count()), (2, 1))
+
+
+class TestLoginStats(DatabaseTestCase):
+
+    def make_app(self):
+        """
+        Set up a bare Flask application with an in-memory database.
+        """
+        app = Flask(__name__)
+        app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+        app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+        db.init_app(app)
+        return app
+
+    def test_warm_and_update(self):
+        """
+        Figures are rebuilt from the database and then kept up to date incrementally.
+        """
+        active = User(username='active', password='Password1!')
+        active.last_login = datetime.now() - timedelta(days=2)
+        db.session.add_all([active, User(username='idle', password='Password1!')])
+        db.session.commit()
+
+        stats = LoginStats(self.app)
+        stats.warm()
+        snapshot = stats.snapshot()
+        self.assertEqual(snapshot['total_users'], 2)
+        self.assertEqual(snapshot['never_logged_in'], 1)
+        self.assertEqual(snapshot['active_users']['today'], 0)
+        self.assertEqual(snapshot['active_users']['last_7_days'], 1)
+
+        stats.login(2, success=True, first_login=True)
+        stats.login(2, success=False)
+        stats.user_registered()
+        snapshot = stats.snapshot()
+        self.assertEqual(snapshot['total_users'], 3)
+        self.assertEqual(snapshot['never_logged_in'], 1)
+        self.assertEqual(snapshot['active_users']['today'], 1)
+        self.assertEqual(snapshot['active_users']['last_7_days'], 2)
+        self.assertEqual(snapshot['logins']['last_24_hours'], {'success': 1, 'failure': 1})
+        self.assertEqual(len(snapshot['logins']['daily']), 30)
+
+    @unittest.skipUnless(hasattr(os, 'fork'), 'requires fork()')
+    def test_figures_shared_with_forked_workers(self):
+        """
+        Figures updated by a forked worker process are reported by every process.
+        """
+        stats = LoginStats(self.app)
+        stats.warm()
+        pid = os.fork()
+        if pid == 0:
+            stats.user_registered()
+            stats.login(7, success=True, first_login=True)
+            os._exit(0)
+        os.waitpid(pid, 0)
+
+        snapshot = stats.snapshot()
+        self.assertEqual((snapshot['total_users'], snapshot['never_logged_in']), (1, 0))
+        self.assertEqual(snapshot['active_users']['today'], 1)
+        self.assertEqual(snapshot['logins']['last_24_hours'], {'success': 1, 'failure': 0})
+
+    def test_old_slots_are_reused(self):
+        """
+        A day's slot is cleared when the ring comes back to it a month later.
+        """
+        stats = LoginStats(self.app)
+        old_day = datetime.now().date() - timedelta(days=31)
+        slot = stats._day_slot(old_day)
+        stats._day_counts[2 * slot] = 5
+        stats._sketch(slot).add(1)
+        stats.login(2, success=True)
+        snapshot = stats.snapshot()
+        self.assertEqual(sum(day['success'] for day in snapshot['logins']['daily']), 1)
+        self.assertEqual(snapshot['active_users']['last_30_days'], 1)
+
+    def test_snapshot_estimates_outside_lock(self):
+        """
+        Logins are not blocked while a snapshot computes its estimates.
+        """
+        stats = LoginStats(self.app)
+        stats.login(1, success=True)
+        count = HyperLogLog.count
+
+        def unlocked_count(sketch):
+            self.assertTrue(stats._lock._lock.acquire(block=False))
+            stats._lock._lock.release()
+            return count(sketch)
+
+        with mock.patch.object(HyperLogLog, 'count', unlocked_count):
+            self.assertEqual(stats.snapshot()['active_users']['today'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,10 @@
+"""
+WSGI entry point for production servers. `app.py` remains the development server.
+
+    gunicorn -c gunicorn.conf.py
+
+See gunicorn.conf.py for the worker settings.
+"""
+from app import create_app
+
+app = create_app()
@@ -76,3 +76,20 @@ export async function registerUser(username: string, password: string) {
     }
   }
 }
+
+// El navegador no puede enviar la cabecera Authorization con EventSource:
+// se pide un token de corta duración que solo abre /admin/events.
+export async function getEventStreamUrl() {
+  try {
+    const headers = await getAuthHeaders()
+    const response = await apiClient.post('/admin/events/token', {}, { headers })
+    const token = encodeURIComponent(response.data.token)
+    return { success: true, url: `${process.env.NEXT_PUBLIC_API_BASE_URL}/admin/events?token=${token}` }
+  } catch (error: any) {
+    console.error('Error al abrir el stream de eventos:', error)
+    return { 
+      success: false, 
+      message: error.response?.data?.message || 'Error al abrir el stream de eventos'
+    }
+  }
+}
@@ -8,13 +8,13 @@ import { Alert, AlertDescription } from "@/components/ui/alert"
 import { Table, TableBody, TableCell, TableHead, TableHeader, TableRow } from "@/components/ui/table"
 import { Dialog, DialogContent, DialogHeader, DialogTitle, DialogTrigger } from "@/components/ui/dialog"
 import { Label } from "@/components/ui/label"
-import { getUsers, deleteUser, changeUserPassword, resetUserPassword, registerUser } from '../actions/admin'
+import { getUsers, deleteUser, changeUserPassword, resetUserPassword, registerUser, getEventStreamUrl } from '../actions/admin'
 import { Loader2, UserPlus, Key, Trash2 } from 'lucide-react'
 
 interface User {
   id: number
   username: string
-  last_login: string
+  last_login: string | null
   isDialogOpen: boolean;
 }
 
@@ -28,7 +28,52 @@ export default function AdminDashboard() {
   const [isLoading, setIsLoading] = useState(false)
 
   useEffect(() => {
-    fetchUsers()
+    // Cambios en vivo desde /admin/events. La lista se (re)carga cada vez que el stream
+    // se abre, así no se pierde ningún cambio entre la carga y el primer evento.
+    let source: EventSource | null = null
+    let retry: ReturnType<typeof setTimeout> | undefined
+    let closed = false
+
+    const reconnect = () => {
+      source?.close()
+      if (!closed) {
+        retry = setTimeout(connect, 5000)  // Con un token nuevo: el anterior caduca en un minuto
+      }
+    }
+
+    const connect = async () => {
+      const result = await getEventStreamUrl()
+      if (closed) return
+      if (!result.success || !result.url) {
+        fetchUsers()  // Sin stream (p. ej. desactivado): solo la carga inicial
+        return
+      }
+      source = new EventSource(result.url)
+      source.onopen = () => fetchUsers()
+      source.onerror = reconnect
+      source.addEventListener('resync', reconnect)
+      source.addEventListener('user.registered', (event) => {
+        const data = JSON.parse((event as MessageEvent).data)
+        setUsers(prev => prev.some(u => u.id === data.id)
+          ? prev
+          : [...prev, { id: data.id, username: data.username, last_login: null, isDialogOpen: false }])
+      })
+      source.addEventListener('user.deleted', (event) => {
+        const data = JSON.parse((event as MessageEvent).data)
+        setUsers(prev => prev.filter(u => u.id !== data.id))
+      })
+      source.addEventListener('user.login', (event) => {
+        const data = JSON.parse((event as MessageEvent).data)
+        setUsers(prev => prev.map(u => u.id === data.id ? { ...u, last_login: data.last_login } : u))
+      })
+    }
+
+    connect()
+    return () => {
+      closed = true
+      clearTimeout(retry)
+      source?.close()
+    }
   }, [])
 
   const fetchUsers = async () => {
@@ -110,7 +155,7 @@ export default function AdminDashboard() {
                 {users.map((user) => (
                   <TableRow key={user.id}>
                     <TableCell className="font-medium">{user.username}</TableCell>
-                    <TableCell>{new Date(user.last_login).toLocaleString()}</TableCell>
+                    <TableCell>{user.last_login ? new Date(user.last_login).toLocaleString() : 'Nunca'}</TableCell>
                     <TableCell>
                       <div className="flex space-x-2">
                         <Dialog 